@@ -0,0 +1,134 @@
+# encoding: UTF-8
+
+"""
+对比CRR二叉树模型的原有实现和向量化实现。
+
+原有实现使用双重循环生成完整的二叉树，每个希腊值都通过重新生成多棵树的数值差分计算
+（计算一次全部希腊值需要生成13棵树）；向量化实现每一步倒推对所有节点和所有期权同时计算，
+delta、gamma、theta从同一棵树上读取，vega的两棵树和原始树在一次批量倒推中完成。
+
+1. 精度：相同高度下两种实现的价格应当一致，同时给出不同高度相对于高精度结果的误差
+2. 速度：计算整个期权链的价格和希腊值的耗时
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import time
+from math import exp, sqrt
+
+import numpy as np
+
+from vnpy.pricing import crr
+
+
+F = 3.0
+R = 0.03
+T = 0.2
+V = 0.25
+
+STRIKE_COUNT = 21
+BENCH_STEPS = 2000      # 作为精确值的二叉树高度
+
+
+#----------------------------------------------------------------------
+def legacyGenerateTree(f, k, r, t, v, cp, n):
+    """原有实现：双重循环生成二叉树"""
+    dt = t / n
+    u = exp(v * sqrt(dt))
+    d = 1 / u
+    a = 1
+    uTree = np.zeros((n+1,n+1))
+    oTree = np.zeros((n+1,n+1))
+
+    p = (a - d) / (u - d)
+    p1 = p / a
+    p2 = (1 - p) / a
+
+    uTree[0, 0] = f
+
+    for i in range(1, n+1):
+        uTree[0, i] = uTree[0, i-1] * u
+        for j in range(1, i+1):
+            uTree[j, i] = uTree[j-1, i-1] * d
+
+    for j in range(n+1):
+        oTree[j, n] = max(0, cp * (uTree[j, n]-k))
+
+    for i in range(n-1,-1,-1):
+        for j in range(i+1):
+            oTree[j, i] = max((p1 * oTree[j, i+1] + p2 * oTree[j+1, i+1]),
+                               cp * (uTree[j, i] - k))
+
+    return oTree, uTree
+
+#----------------------------------------------------------------------
+def legacyPrice(f, k, r, t, v, cp, n):
+    """原有实现：计算价格"""
+    return legacyGenerateTree(f, k, r, t, v, cp, n)[0][0, 0]
+
+#----------------------------------------------------------------------
+def legacyGreeks(f, k, r, t, v, cp, n):
+    """原有实现：通过数值差分计算价格和希腊值，共生成13棵树"""
+    price = legacyPrice(f, k, r, t, v, cp, n)
+
+    def delta(f):
+        return (legacyPrice(f*crr.STEP_UP, k, r, t, v, cp, n) -
+                legacyPrice(f*crr.STEP_DOWN, k, r, t, v, cp, n)) / (f * crr.STEP_DIFF)
+
+    d = delta(f) * f * 0.01
+    gamma = (delta(f*crr.STEP_UP) - delta(f*crr.STEP_DOWN)) / (f * crr.STEP_DIFF) * f * f * 0.0001
+    theta = -(legacyPrice(f, k, r, t*crr.STEP_UP, v, cp, n) -
+              legacyPrice(f, k, r, t*crr.STEP_DOWN, v, cp, n)) / (t * crr.STEP_DIFF * 240)
+    vega = (legacyPrice(f, k, r, t, v*crr.STEP_UP, cp, n) -
+            legacyPrice(f, k, r, t, v*crr.STEP_DOWN, cp, n)) / (v * crr.STEP_DIFF) / 100
+
+    return price, d, gamma, theta, vega
+
+#----------------------------------------------------------------------
+def createChain():
+    """创建期权链的行权价和类型数组，虚值一侧使用看跌期权"""
+    kArray = np.linspace(F * 0.8, F * 1.2, STRIKE_COUNT)
+    cpArray = np.where(kArray >= F, 1, -1)
+    return kArray, cpArray
+
+#----------------------------------------------------------------------
+def runAccuracy(stepsList):
+    """测试精度"""
+    kArray, cpArray = createChain()
+    benchPrice = crr.calculateGreeksBatch(F, kArray, R, T, V, cpArray, BENCH_STEPS)[0]
+
+    for n in stepsList:
+        price = crr.calculateGreeksBatch(F, kArray, R, T, V, cpArray, n)[0]
+        legacy = np.array([legacyPrice(F, k, R, T, V, cp, n) for k, cp in zip(kArray, cpArray)])
+
+        print(u'高度%5d：和原有实现最大差异%.2e，相对高度%d的最大误差%.2e'
+              %(n, np.abs(price - legacy).max(), BENCH_STEPS, np.abs(price - benchPrice).max()))
+
+#----------------------------------------------------------------------
+def runSpeed(stepsList):
+    """测试速度"""
+    kArray, cpArray = createChain()
+
+    for n in stepsList:
+        start = time.time()
+        for k, cp in zip(kArray, cpArray):
+            legacyGreeks(F, k, R, T, V, cp, n)
+        legacyTime = (time.time() - start) * 1000
+
+        start = time.time()
+        for k, cp in zip(kArray, cpArray):
+            crr.calculateGreeks(F, k, R, T, V, cp, n)
+        scalarTime = (time.time() - start) * 1000
+
+        start = time.time()
+        crr.calculateGreeksBatch(F, kArray, R, T, V, cpArray, n)
+        batchTime = (time.time() - start) * 1000
+
+        print(u'高度%5d，%d个期权：原有实现%9.2f毫秒，逐个计算%7.2f毫秒，批量计算%6.2f毫秒'
+              %(n, STRIKE_COUNT, legacyTime, scalarTime, batchTime))
+
+
+if __name__ == '__main__':
+    runAccuracy([15, 50, 100, 200])
+    runSpeed([15, 50, 100, 200])
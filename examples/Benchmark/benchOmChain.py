@@ -0,0 +1,88 @@
+# encoding: UTF-8
+
+"""
+测试期权链在标的行情更新时的计算耗时。
+
+使用bsAnalytic模型，对比逐个期权调用标量定价函数和对整条期权链进行向量化计算的耗时，
+两种方式的计算结果一致。
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import timeit
+
+from vnpy.trader.vtObject import VtContractData, VtTickData
+from vnpy.trader.vtConstant import (PRODUCT_EQUITY, OPTION_CALL, OPTION_PUT)
+from vnpy.trader.app.optionMaster.omBase import OmUnderlying, OmOption, OmChain
+from vnpy.pricing import bsAnalytic
+
+
+UNDERLYING_PRICE = 3.0
+
+
+#----------------------------------------------------------------------
+def createChain(strikeCount):
+    """创建期权链，每个行权价包含一个看涨和一个看跌期权"""
+    contract = VtContractData()
+    contract.symbol = contract.vtSymbol = '510050'
+    contract.size = 1
+    contract.productClass = PRODUCT_EQUITY
+    underlying = OmUnderlying(contract, None)
+    
+    callList = []
+    putList = []
+    
+    for i in range(strikeCount):
+        for optionType, l in [(OPTION_CALL, callList), (OPTION_PUT, putList)]:
+            contract = VtContractData()
+            contract.symbol = contract.vtSymbol = '%s%s' %(optionType, i)
+            contract.size = 10000
+            contract.strikePrice = 2.0 + i * 0.02
+            contract.optionType = optionType
+            contract.expiryDate = '20991231'
+            
+            option = OmOption(contract, None, underlying, bsAnalytic, 0.03)
+            option.t = 0.2
+            option.pricingImpv = 0.25
+            l.append(option)
+    
+    chain = OmChain('510050-bench', callList, putList)
+    underlying.addChain(chain)
+    
+    # 推送期权行情
+    for option in chain.optionList:
+        price = bsAnalytic.calculatePrice(UNDERLYING_PRICE, option.k, option.r, option.t, 0.25, option.cp)
+        tick = VtTickData()
+        tick.symbol = option.symbol
+        tick.bidPrice1 = max(price - 0.001, 0.0001)
+        tick.askPrice1 = price + 0.001
+        chain.newTick(tick)
+    
+    return underlying, chain
+
+#----------------------------------------------------------------------
+def runBenchmark(strikeCount, number):
+    """在指定行权价数量下测试"""
+    underlying, chain = createChain(strikeCount)
+    
+    tick = VtTickData()
+    tick.bidPrice1 = UNDERLYING_PRICE - 0.001
+    tick.askPrice1 = UNDERLYING_PRICE + 0.001
+    
+    def runTick():
+        underlying.newTick(tick)
+    
+    chain.batchMode = False
+    scalarTime = timeit.timeit(runTick, number=1) * 1000
+    
+    chain.batchMode = True
+    batchTime = timeit.timeit(runTick, number=number) / number * 1000
+    
+    print(u'期权数量%4d：逐个期权计算%10.2f毫秒，整链向量化计算%6.2f毫秒'
+          %(len(chain.optionList), scalarTime, batchTime))
+
+
+if __name__ == '__main__':
+    for strikeCount in [10, 50, 100]:
+        runBenchmark(strikeCount, 100)
@@ -0,0 +1,54 @@
+# encoding: UTF-8
+
+"""
+测试持仓组合情景分析在不同网格大小下的耗时，期权链的创建复用benchOmChain。
+
+使用支持批量计算的bsAnalytic模型，不支持批量计算的模型（如bs）会逐个期权计算，耗时高出几个数量级。
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import timeit
+
+from vnpy.trader.vtObject import VtTickData
+from vnpy.trader.app.optionMaster.omBase import OmPortfolio
+from vnpy.trader.app.optionMaster.omAnalysis import OmScenarioAnalysis, generateChangeArray
+from vnpy.pricing import bsAnalytic
+
+from benchOmChain import createChain, UNDERLYING_PRICE
+
+
+#----------------------------------------------------------------------
+def createAnalysis(strikeCount):
+    """创建所有期权都有持仓的组合"""
+    underlying, chain = createChain(strikeCount)
+    
+    for n, option in enumerate(chain.optionList):
+        option.netPos = n % 5 - 2 or 1
+    
+    tick = VtTickData()
+    tick.bidPrice1 = UNDERLYING_PRICE - 0.001
+    tick.askPrice1 = UNDERLYING_PRICE + 0.001
+    underlying.newTick(tick)
+    
+    portfolio = OmPortfolio('bench', bsAnalytic, [underlying], [chain])
+    return OmScenarioAnalysis(portfolio)
+
+#----------------------------------------------------------------------
+def runBenchmark(analysis, gridCount, number):
+    """在指定网格大小下测试"""
+    priceChangeArray = generateChangeArray(0.1, gridCount)
+    impvChangeArray = generateChangeArray(0.3, gridCount)
+    
+    def run():
+        analysis.run(priceChangeArray, impvChangeArray)
+    
+    cost = timeit.timeit(run, number=number) / number * 1000
+    print(u'期权数量%4d，网格%3dx%-3d：%8.2f毫秒' %(analysis.posSize.size, gridCount, gridCount, cost))
+
+
+if __name__ == '__main__':
+    analysis = createAnalysis(200)
+    for gridCount in [11, 25, 50]:
+        runBenchmark(analysis, gridCount, 5)
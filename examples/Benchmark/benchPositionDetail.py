@@ -0,0 +1,220 @@
+# encoding: UTF-8
+
+"""
+测试持仓细节在不同活动委托数量下，每次委托更新时计算冻结量的耗时。
+
+原有实现每次委托更新都清空冻结量并遍历所有活动委托重新统计，耗时随活动委托数量线性增长；
+增量实现只根据该委托剩余数量的变化调整冻结量，耗时应当和活动委托数量无关。
+
+测试前先开启consistencyCheck，在普通、上期所和平今惩罚模式下运行随机的发单、委托更新、
+撤单和成交序列，每一步都检查增量计算的冻结量和全量重新计算的结果一致。
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import timeit
+import random
+from copy import copy
+
+from vnpy.trader.vtEngine import PositionDetail
+from vnpy.trader.vtObject import VtOrderData, VtOrderReq, VtTradeData
+from vnpy.trader.vtConstant import (DIRECTION_LONG, DIRECTION_SHORT,
+                                    OFFSET_OPEN, OFFSET_CLOSE, OFFSET_CLOSETODAY,
+                                    STATUS_NOTTRADED, STATUS_PARTTRADED,
+                                    STATUS_ALLTRADED, STATUS_CANCELLED,
+                                    EXCHANGE_SHFE)
+
+
+#----------------------------------------------------------------------
+def legacyCalculateFrozen(detail):
+    """原有实现：遍历所有活动委托重新统计冻结量"""
+    detail.longPosFrozen = 0
+    detail.longYdFrozen = 0
+    detail.longTdFrozen = 0
+    detail.shortPosFrozen = 0
+    detail.shortYdFrozen = 0
+    detail.shortTdFrozen = 0
+
+    for order in detail.workingOrderDict.values():
+        frozenVolume = order.totalVolume - order.tradedVolume
+
+        if order.direction is DIRECTION_LONG:
+            if order.offset is OFFSET_CLOSETODAY:
+                detail.shortTdFrozen += frozenVolume
+            elif order.offset is OFFSET_CLOSE:
+                detail.shortTdFrozen += frozenVolume
+
+                if detail.shortTdFrozen > detail.shortTd:
+                    detail.shortYdFrozen += (detail.shortTdFrozen - detail.shortTd)
+                    detail.shortTdFrozen = detail.shortTd
+        elif order.direction is DIRECTION_SHORT:
+            if order.offset is OFFSET_CLOSETODAY:
+                detail.longTdFrozen += frozenVolume
+            elif order.offset is OFFSET_CLOSE:
+                detail.longTdFrozen += frozenVolume
+
+                if detail.longTdFrozen > detail.longTd:
+                    detail.longYdFrozen += (detail.longTdFrozen - detail.longTd)
+                    detail.longTdFrozen = detail.longTd
+
+        detail.longPosFrozen = detail.longYdFrozen + detail.longTdFrozen
+        detail.shortPosFrozen = detail.shortYdFrozen + detail.shortTdFrozen
+
+#----------------------------------------------------------------------
+def createDetail(orderCount):
+    """创建持仓细节，并挂上指定数量的平仓委托"""
+    detail = PositionDetail('rb1805.SHFE')
+    detail.longTd = detail.shortTd = orderCount
+    detail.longYd = detail.shortYd = orderCount
+    detail.calculatePosition()
+
+    for n in range(orderCount):
+        order = VtOrderData()
+        order.vtOrderID = 'CTP.%s' %n
+        order.direction = DIRECTION_LONG if n % 2 else DIRECTION_SHORT
+        order.offset = OFFSET_CLOSE if n % 3 else OFFSET_CLOSETODAY
+        order.totalVolume = 2
+        order.status = STATUS_NOTTRADED
+        detail.updateOrder(order)
+
+    return detail
+
+#----------------------------------------------------------------------
+def sendOrder(detail, orderDict, direction, offset, volume):
+    """模拟发单，返回发出的委托编号列表"""
+    req = VtOrderReq()
+    req.vtSymbol = detail.vtSymbol
+    req.direction = direction
+    req.offset = offset
+    req.volume = volume
+
+    vtOrderIDList = []
+    for req in detail.convertOrderReq(req):
+        vtOrderID = 'CTP.%s' %len(orderDict)
+        detail.updateOrderReq(req, vtOrderID)
+
+        # 委托回报使用新的对象，和实际接口一致
+        order = VtOrderData()
+        order.vtOrderID = vtOrderID
+        order.direction = req.direction
+        order.offset = req.offset
+        order.totalVolume = req.volume
+        order.status = STATUS_NOTTRADED
+        orderDict[vtOrderID] = order
+        vtOrderIDList.append(vtOrderID)
+
+        if random.random() < 0.8:
+            detail.updateOrder(copy(order))
+
+    return vtOrderIDList
+
+#----------------------------------------------------------------------
+def tradeOrder(detail, order):
+    """模拟成交，成交推送和委托回报的先后顺序随机"""
+    trade = VtTradeData()
+    trade.vtOrderID = order.vtOrderID
+    trade.direction = order.direction
+    trade.offset = order.offset
+    trade.price = 3800.0
+    trade.volume = random.randint(1, order.totalVolume - order.tradedVolume)
+
+    order.tradedVolume += trade.volume
+    if order.tradedVolume == order.totalVolume:
+        order.status = STATUS_ALLTRADED
+    else:
+        order.status = STATUS_PARTTRADED
+
+    if random.random() < 0.5:
+        detail.updateTrade(trade)
+        detail.updateOrder(copy(order))
+    else:
+        detail.updateOrder(copy(order))
+        detail.updateTrade(trade)
+
+#----------------------------------------------------------------------
+def checkConsistency(mode, exchange, steps, seed=0):
+    """在指定模式下运行随机的委托和成交序列，检查冻结量的增量计算结果"""
+    random.seed(seed)
+
+    detail = PositionDetail('rb1805.SHFE')
+    detail.consistencyCheck = True
+    detail.mode = mode
+    detail.exchange = exchange
+    detail.longYd = detail.shortYd = 20
+    detail.calculatePosition()
+
+    orderDict = {}
+    workingList = []
+    orderCount = tradeCount = 0
+
+    for i in range(steps):
+        n = random.random()
+
+        # 发单，平仓数量不超过可用持仓
+        if n < 0.4 or not workingList:
+            direction = random.choice([DIRECTION_LONG, DIRECTION_SHORT])
+            if direction is DIRECTION_LONG:
+                available = detail.shortPos - detail.shortPosFrozen
+            else:
+                available = detail.longPos - detail.longPosFrozen
+
+            if available > 0 and random.random() < 0.6:
+                offset = OFFSET_CLOSE
+                volume = random.randint(1, min(available, 5))
+            else:
+                offset = OFFSET_OPEN
+                volume = random.randint(1, 5)
+
+            vtOrderIDList = sendOrder(detail, orderDict, direction, offset, volume)
+            workingList.extend(vtOrderIDList)
+            orderCount += len(vtOrderIDList)
+        # 成交
+        elif n < 0.8:
+            order = orderDict[random.choice(workingList)]
+            tradeOrder(detail, order)
+            tradeCount += 1
+        # 撤单
+        else:
+            order = orderDict[random.choice(workingList)]
+            order.status = STATUS_CANCELLED
+            detail.updateOrder(copy(order))
+
+        workingList = [vtOrderID for vtOrderID in workingList
+                       if orderDict[vtOrderID].status not in (STATUS_ALLTRADED, STATUS_CANCELLED)]
+
+        # 成交和持仓变化不经过updateFrozen，这里额外检查
+        assert detail.checkFrozen(), u'第%d步冻结量不一致' %i
+        assert detail.longPos >= 0 and detail.shortPos >= 0
+
+    print(u'%-10s 一致性检查通过：%d步，%d笔委托，%d笔成交' %(mode, steps, orderCount, tradeCount))
+
+#----------------------------------------------------------------------
+def runBenchmark(orderCount, number):
+    """在指定活动委托数量下测试"""
+    detail = createDetail(orderCount)
+    order = detail.workingOrderDict['CTP.0']
+    order.status = STATUS_PARTTRADED
+
+    def oldUpdate():
+        order.tradedVolume = 1 - order.tradedVolume
+        legacyCalculateFrozen(detail)
+
+    def newUpdate():
+        order.tradedVolume = 1 - order.tradedVolume
+        detail.updateOrder(order)
+
+    oldTime = timeit.timeit(oldUpdate, number=number) / number * 1000000
+    newTime = timeit.timeit(newUpdate, number=number) / number * 1000000
+
+    print(u'活动委托%5d笔：原有实现%8.2f微秒，增量计算%6.2f微秒' %(orderCount, oldTime, newTime))
+
+
+if __name__ == '__main__':
+    for mode, exchange in [(PositionDetail.MODE_NORMAL, ''),
+                           (PositionDetail.MODE_SHFE, EXCHANGE_SHFE),
+                           (PositionDetail.MODE_TDPENALTY, EXCHANGE_SHFE)]:
+        checkConsistency(mode, exchange, 2000)
+
+    for orderCount in [10, 100, 1000]:
+        runBenchmark(orderCount, 10000)
@@ -0,0 +1,81 @@
+# encoding: UTF-8
+
+"""
+对比数值差分定价模型（bs、black）和解析解定价模型（bsAnalytic、blackAnalytic）
+计算整条期权链的希腊值和隐含波动率的耗时，以及两者希腊值结果的最大差异。
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import time
+
+import numpy as np
+
+from vnpy.pricing import bs, black, bsAnalytic, blackAnalytic
+
+
+S = 3.0
+R = 0.04
+T = 0.3
+V = 0.25
+
+STRIKE_COUNT = 200
+
+
+#----------------------------------------------------------------------
+def createChain():
+    """创建期权链的行权价和类型数组，虚值一侧使用看跌期权"""
+    kArray = np.linspace(S * 0.7, S * 1.3, STRIKE_COUNT)
+    cpArray = np.where(kArray >= S, 1, -1)
+    return kArray, cpArray
+
+#----------------------------------------------------------------------
+def runBenchmark(name, numModel, analyticModel):
+    """测试一组模型"""
+    kArray, cpArray = createChain()
+    optionList = list(zip(kArray, cpArray.astype(int)))
+
+    start = time.time()
+    numGreeks = [numModel.calculateGreeks(S, k, R, T, V, cp) for k, cp in optionList]
+    numGreeksTime = (time.time() - start) * 1000
+
+    start = time.time()
+    analyticGreeks = [analyticModel.calculateGreeks(S, k, R, T, V, cp) for k, cp in optionList]
+    analyticGreeksTime = (time.time() - start) * 1000
+
+    start = time.time()
+    analyticModel.calculateGreeksBatch(S, kArray, R, T, V, cpArray)
+    batchGreeksTime = (time.time() - start) * 1000
+
+    priceArray = np.array([greeks[0] for greeks in analyticGreeks])
+
+    start = time.time()
+    for price, (k, cp) in zip(priceArray, optionList):
+        numModel.calculateImpv(price, S, k, R, T, cp)
+    numImpvTime = (time.time() - start) * 1000
+
+    start = time.time()
+    for price, (k, cp) in zip(priceArray, optionList):
+        analyticModel.calculateImpv(price, S, k, R, T, cp)
+    analyticImpvTime = (time.time() - start) * 1000
+
+    start = time.time()
+    analyticModel.calculateImpvBatch(priceArray, S, kArray, R, T, cpArray)
+    batchImpvTime = (time.time() - start) * 1000
+
+    # 数值差分模型的gamma对已经按百分比缩放的delta再次差分，定义不同，因此不参与比较
+    diff = np.abs(np.array(numGreeks) - np.array(analyticGreeks)).max(axis=0)
+
+    print(u'%s，%d个期权' %(name, STRIKE_COUNT))
+    print(u'希腊值：数值差分%8.2f毫秒，解析解%6.2f毫秒，批量%5.2f毫秒'
+          %(numGreeksTime, analyticGreeksTime, batchGreeksTime))
+    print(u'隐含波动率：数值差分%8.2f毫秒，解析解%6.2f毫秒，批量%5.2f毫秒'
+          %(numImpvTime, analyticImpvTime, batchImpvTime))
+    print(u'最大差异：price %.1e，delta %.1e，theta %.1e，vega %.1e'
+          %(diff[0], diff[1], diff[3], diff[4]))
+
+
+if __name__ == '__main__':
+    runBenchmark('bs', bs, bsAnalytic)
+    runBenchmark('black', black, blackAnalytic)
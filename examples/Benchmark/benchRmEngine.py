@@ -0,0 +1,102 @@
+# encoding: UTF-8
+
+"""
+测试风控引擎checkRisk在不同活动委托数量下的耗时。
+
+原有实现每次检查都通过getAllWorkingOrders生成活动委托列表，耗时随活动委托数量线性增长，
+增量计数实现的耗时应当和活动委托数量无关。
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import timeit
+
+from vnpy.event import EventEngine2
+from vnpy.trader.vtObject import VtOrderReq
+from vnpy.trader.vtConstant import DIRECTION_LONG, OFFSET_OPEN
+from vnpy.trader.app.riskManager import RmEngine
+
+
+GATEWAY_NAME = 'CTP'
+
+
+########################################################################
+class BenchMainEngine(object):
+    """只提供风控引擎所需接口的主引擎"""
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.rmEngine = None
+        self.workingOrderDict = {}
+
+    #----------------------------------------------------------------------
+    def getAllWorkingOrders(self):
+        """查询所有活动委托（Python 2下values返回列表）"""
+        return list(self.workingOrderDict.values())
+
+
+#----------------------------------------------------------------------
+def createEngine():
+    """创建风控引擎，放开所有数量限制"""
+    mainEngine = BenchMainEngine()
+    rmEngine = RmEngine(mainEngine, EventEngine2())
+
+    rmEngine.active = True
+    rmEngine.orderFlowLimit = 10**9
+    rmEngine.orderFlowClear = 1
+    rmEngine.orderSizeLimit = 100
+    rmEngine.tradeLimit = 10**9
+    rmEngine.workingOrderLimit = 10**9
+    rmEngine.gatewayWorkingOrderLimit = 10**9
+    rmEngine.symbolWorkingOrderLimit = 10**9
+    rmEngine.orderCancelLimit = 10**9
+    rmEngine.marginRatioLimit = 1
+    rmEngine.setStrategyLimit('bench', {'orderFlowLimit': 10**9,
+                                        'orderSizeLimit': 100,
+                                        'workingOrderLimit': 10**9})
+
+    return mainEngine, rmEngine
+
+#----------------------------------------------------------------------
+def createOrderReq():
+    """创建委托请求"""
+    req = VtOrderReq()
+    req.symbol = 'rb1810'
+    req.exchange = 'SHFE'
+    req.vtSymbol = 'rb1810.SHFE'
+    req.price = 3800.0
+    req.volume = 1
+    req.direction = DIRECTION_LONG
+    req.offset = OFFSET_OPEN
+    req.strategyName = 'bench'
+    return req
+
+#----------------------------------------------------------------------
+def runBenchmark(workingCount, number):
+    """在指定活动委托数量下测试"""
+    mainEngine, rmEngine = createEngine()
+    req = createOrderReq()
+
+    for i in range(workingCount):
+        vtOrderID = '%s.%s' %(GATEWAY_NAME, i)
+        mainEngine.workingOrderDict[vtOrderID] = None
+        rmEngine.updateOrderSent(req, GATEWAY_NAME, vtOrderID)
+
+    def oldCount():
+        len(mainEngine.getAllWorkingOrders())
+
+    def newCheck():
+        rmEngine.checkRisk(req, GATEWAY_NAME)
+
+    oldTime = timeit.timeit(oldCount, number=number) / number * 1000000
+    newTime = timeit.timeit(newCheck, number=number) / number * 1000000
+
+    print(u'活动委托%6d：原始活动委托计数%8.2f微秒，增量checkRisk整体%6.2f微秒'
+          %(workingCount, oldTime, newTime))
+
+
+if __name__ == '__main__':
+    for workingCount in [0, 100, 1000, 10000]:
+        runBenchmark(workingCount, 20000)
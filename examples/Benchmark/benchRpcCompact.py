@@ -0,0 +1,91 @@
+# encoding: UTF-8
+
+"""
+检查RPC紧凑格式序列化的往返结果，并对比紧凑格式和cPickle的数据大小和耗时。
+
+vnrpc只能运行在Python 2下，因此本脚本也需要使用Python 2运行。检查内容：
+1. 注册过的数据类（包括Event）使用紧凑格式打包，而不是整体回退到cPickle
+2. 解包后的对象类型和字段值与原对象完全一致
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import timeit
+from datetime import datetime
+
+from vnpy.event import Event
+from vnpy.rpc.vnrpc import RpcObject, compactDefault, COMPACT_OBJECT_KEY
+from vnpy.trader.vtEvent import EVENT_TICK
+from vnpy.trader.vtObject import VtTickData
+from vnpy.trader.app.rpcService.rsBase import COMPACT_CLASS_LIST, registerCompactClasses
+
+
+#----------------------------------------------------------------------
+def createTickEvent():
+    """创建行情事件"""
+    tick = VtTickData()
+    tick.gatewayName = 'CTP'
+    tick.symbol = 'rb1805'
+    tick.exchange = 'SHFE'
+    tick.vtSymbol = 'rb1805.SHFE'
+    tick.lastPrice = 3850.0
+    tick.volume = 123456
+    tick.datetime = datetime(2018, 1, 2, 9, 30, 0, 500000)
+    tick.date = tick.datetime.strftime('%Y%m%d')
+    tick.time = tick.datetime.strftime('%H:%M:%S.%f')
+    tick.bidPrice1 = 3849.0
+    tick.askPrice1 = 3851.0
+    tick.bidVolume1 = 10
+    tick.askVolume1 = 20
+
+    event = Event(EVENT_TICK + tick.vtSymbol)
+    event.dict_['data'] = tick
+    return event
+
+#----------------------------------------------------------------------
+def checkRoundTrip(rpc, event):
+    """检查紧凑格式打包和往返结果"""
+    # 所有注册的数据类都必须使用紧凑格式，而不是回退到cPickle
+    for cls in COMPACT_CLASS_LIST:
+        packed = compactDefault(cls())
+        assert isinstance(packed, dict) and COMPACT_OBJECT_KEY in packed, \
+            u'%s没有使用紧凑格式打包' %cls.__name__
+
+    result = rpc.unpack(rpc.pack(event))
+
+    assert result.__class__ is Event
+    assert result.type_ == event.type_
+    assert result.key_ == event.key_
+
+    tick = event.dict_['data']
+    resultTick = result.dict_['data']
+    assert resultTick.__class__ is VtTickData
+    assert resultTick.__dict__ == tick.__dict__
+
+    print(u'往返检查通过，共%d个紧凑格式数据类' %len(COMPACT_CLASS_LIST))
+
+#----------------------------------------------------------------------
+def runBenchmark(number):
+    """对比紧凑格式和cPickle"""
+    event = createTickEvent()
+
+    compactRpc = RpcObject()
+    compactRpc.useCompact()
+    checkRoundTrip(compactRpc, event)
+
+    pickleRpc = RpcObject()
+    pickleRpc.usePickle()
+
+    for name, rpc in [('compact', compactRpc), ('cPickle', pickleRpc)]:
+        data = rpc.pack(event)
+
+        packTime = timeit.timeit(lambda: rpc.pack(event), number=number) / number * 1000000
+        unpackTime = timeit.timeit(lambda: rpc.unpack(data), number=number) / number * 1000000
+
+        print(u'%-8s 大小%5d字节，打包%6.2f微秒，解包%6.2f微秒' %(name, len(data), packTime, unpackTime))
+
+
+if __name__ == '__main__':
+    registerCompactClasses()
+    runBenchmark(10000)
@@ -0,0 +1,103 @@
+# encoding: UTF-8
+
+"""
+测试价差在不同腿数量下，每个腿行情更新时计算价差价格的耗时。
+
+原有实现每次都清空并遍历所有腿重新计算，且每次都格式化时间字符串；
+增量实现只重新计算发生变化的腿的贡献，时间字符串在读取时才格式化。
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import timeit
+from math import floor
+from datetime import datetime
+
+from vnpy.trader.app.spreadTrading.stBase import StLeg, StSpread
+
+
+#----------------------------------------------------------------------
+def legacyCalculatePrice(spread):
+    """原有实现：遍历所有腿计算价格"""
+    spread.bidPrice = 0
+    spread.askPrice = 0
+    spread.askVolume = 0
+    spread.bidVolume = 0
+
+    for n, leg in enumerate(spread.allLegs):
+        if not leg.bidVolume or not leg.askVolume:
+            spread.bidPrice = 0
+            spread.askPrice = 0
+            spread.askVolume = 0
+            spread.bidVolume = 0
+            return
+
+        if leg.multiplier > 0:
+            spread.bidPrice += leg.bidPrice * leg.multiplier
+            spread.askPrice += leg.askPrice * leg.multiplier
+        else:
+            spread.bidPrice += leg.askPrice * leg.multiplier
+            spread.askPrice += leg.bidPrice * leg.multiplier
+
+        if leg.ratio > 0:
+            legAdjustedBidVolume = floor(leg.bidVolume / leg.ratio)
+            legAdjustedAskVolume = floor(leg.askVolume / leg.ratio)
+        else:
+            legAdjustedBidVolume = floor(leg.askVolume / abs(leg.ratio))
+            legAdjustedAskVolume = floor(leg.bidVolume / abs(leg.ratio))
+
+        if n == 0:
+            spread.bidVolume = legAdjustedBidVolume
+            spread.askVolume = legAdjustedAskVolume
+        else:
+            spread.bidVolume = min(spread.bidVolume, legAdjustedBidVolume)
+            spread.askVolume = min(spread.askVolume, legAdjustedAskVolume)
+
+    return datetime.now().strftime('%H:%M:%S.%f')[:-3]
+
+#----------------------------------------------------------------------
+def createSpread(legCount):
+    """创建价差，所有腿都已有行情"""
+    spread = StSpread()
+
+    for n in range(legCount):
+        leg = StLeg()
+        leg.vtSymbol = 'leg%s' %n
+        leg.ratio = 1 if n % 2 else -1
+        leg.multiplier = float(leg.ratio)
+        leg.bidPrice = 100.0
+        leg.askPrice = 100.2
+        leg.bidVolume = 10
+        leg.askVolume = 10
+
+        if not n:
+            spread.addActiveLeg(leg)
+        else:
+            spread.addPassiveLeg(leg)
+
+    spread.initSpread()
+    spread.calculatePrice()
+    return spread
+
+#----------------------------------------------------------------------
+def runBenchmark(legCount, number):
+    """在指定腿数量下测试"""
+    spread = createSpread(legCount)
+    leg = spread.allLegs[-1]
+
+    def oldUpdate():
+        legacyCalculatePrice(spread)
+
+    def newUpdate():
+        spread.calculateLegPrice(leg)
+
+    oldTime = timeit.timeit(oldUpdate, number=number) / number * 1000000
+    newTime = timeit.timeit(newUpdate, number=number) / number * 1000000
+
+    print(u'腿数量%3d：原有实现%6.2f微秒，增量计算%6.2f微秒' %(legCount, oldTime, newTime))
+
+
+if __name__ == '__main__':
+    for legCount in [2, 4, 8]:
+        runBenchmark(legCount, 100000)
@@ -0,0 +1,84 @@
+# encoding: UTF-8
+
+"""
+对比VtTickData/VtBarData和紧凑型数据类的创建速度以及内存占用。
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import sys
+import timeit
+from datetime import datetime
+
+from vnpy.trader.vtObject import (VtTickData, VtBarData, 
+                                  VtCompactTickData, VtCompactBarData)
+
+
+#----------------------------------------------------------------------
+def getObjectSize(obj):
+    """计算对象本身以及其__dict__（如果有）占用的内存"""
+    size = sys.getsizeof(obj)
+    
+    if not hasattr(type(obj), '__slots__'):
+        size += sys.getsizeof(obj.__dict__)
+    
+    return size
+
+#----------------------------------------------------------------------
+def runBenchmark(name, oldClass, newClass, d, number):
+    """运行单个数据类的测试"""
+    def oldFromDict():
+        data = oldClass()
+        data.__dict__ = d               # 和原有回测引擎的数据加载方式一致
+    
+    def newFromDict():
+        newClass.fromDict(d)
+    
+    t = newClass.fromDict(d).toTuple()
+    
+    result = [
+        (u'创建空对象', timeit.timeit(oldClass, number=number), 
+                       timeit.timeit(newClass, number=number)),
+        (u'从字典创建', timeit.timeit(oldFromDict, number=number),
+                       timeit.timeit(newFromDict, number=number)),
+        (u'从元组创建', None, 
+                       timeit.timeit(lambda: newClass.fromTuple(t), number=number))
+    ]
+    
+    print(u'%s，循环次数：%s' %(name, number))
+    for item, oldTime, newTime in result:
+        if oldTime:
+            print(u'  %s：原始%.3f秒，紧凑%.3f秒，加速%.1f倍' %(item, oldTime, newTime, oldTime/newTime))
+        else:
+            print(u'  %s：紧凑%.3f秒' %(item, newTime))
+    
+    oldSize = getObjectSize(oldClass())
+    newSize = getObjectSize(newClass())
+    print(u'  空对象内存：原始%s字节，紧凑%s字节，比例%.2f' %(oldSize, newSize, newSize/oldSize))
+    
+    # 从数据库加载时，原始对象直接使用读取到的字典（不共享键），内存占用和空对象不同
+    oldData = oldClass()
+    oldData.__dict__ = dict(d)
+    oldSize = getObjectSize(oldData)
+    newSize = getObjectSize(newClass.fromDict(d))
+    print(u'  从字典创建的对象内存：原始%s字节，紧凑%s字节，比例%.2f' %(oldSize, newSize, newSize/oldSize))
+    print('')
+
+
+if __name__ == '__main__':
+    number = 200000
+    
+    tick = VtTickData()
+    tick.symbol = 'rb1810'
+    tick.exchange = 'SHFE'
+    tick.vtSymbol = 'rb1810.SHFE'
+    tick.lastPrice = 3800.0
+    tick.datetime = datetime.now()
+    runBenchmark('Tick', VtTickData, VtCompactTickData, tick.__dict__, number)
+    
+    bar = VtBarData()
+    bar.vtSymbol = 'rb1810.SHFE'
+    bar.close = 3800.0
+    bar.datetime = datetime.now()
+    runBenchmark('Bar', VtBarData, VtCompactBarData, bar.__dict__, number)
@@ -0,0 +1,182 @@
+# encoding: UTF-8
+
+'''
+Web服务器的Socket.IO推送层
+
+事件引擎线程中只保存数据，由后台任务按照固定帧率推送：
+1. 有状态的数据（行情、委托、持仓、资金等）按键合并，每帧只推送和上一次推送相比发生变化的字段
+2. 流水类的数据（成交、日志、错误）每帧批量推送
+每个事件类型每帧最多推送一条消息，内容为数据列表，因此推送带宽只和帧率以及数据的键数量有关，
+和行情的频率无关。新连接的客户端先通过快照获取当前完整数据，再根据增量推送更新。
+'''
+
+from threading import Lock
+from datetime import datetime, date
+
+from vnpy.trader.vtEvent import (EVENT_TICK, EVENT_ORDER, EVENT_TRADE,
+                                 EVENT_ACCOUNT, EVENT_POSITION, EVENT_LOG,
+                                 EVENT_ERROR, EVENT_CONTRACT)
+from vnpy.trader.app.ctaStrategy.ctaBase import EVENT_CTA_LOG, EVENT_CTA_STRATEGY
+
+
+# 有状态数据的事件类型，value为合并数据用的键
+KEY_FIELD_DICT = {
+    EVENT_TICK: 'vtSymbol',
+    EVENT_ORDER: 'vtOrderID',
+    EVENT_POSITION: 'vtPositionName',
+    EVENT_ACCOUNT: 'vtAccountID',
+    EVENT_CONTRACT: 'vtSymbol',
+    EVENT_CTA_STRATEGY: 'name'
+}
+
+# 流水数据的事件类型
+STREAM_EVENT_LIST = [EVENT_TRADE, EVENT_LOG, EVENT_ERROR, EVENT_CTA_LOG]
+
+
+#----------------------------------------------------------------------
+def convertData(data):
+    """将事件数据转换为可以json打包的字典"""
+    if not isinstance(data, dict):
+        data = data.__dict__
+
+    d = {}
+    for k, v in data.items():
+        if k == 'rawData':
+            continue
+
+        if isinstance(v, (datetime, date)):
+            v = str(v)
+
+        d[k] = v
+
+    return d
+
+
+########################################################################
+class WebPusher(object):
+    """Socket.IO推送"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, socketio, interval=0.2):
+        """
+        Constructor
+        interval：推送间隔（秒）
+        """
+        self.socketio = socketio
+        self.interval = interval
+
+        self.lock = Lock()
+        self.pendingDict = {}       # 事件类型:{键:最新数据}，上一帧之后有更新的数据
+        self.streamDict = {}        # 事件类型:[数据]，上一帧之后的流水数据
+
+        self.sentDict = {}          # 事件类型:{键:已推送的数据字典}，用于计算增量和提供快照
+        for eventType in KEY_FIELD_DICT.keys():
+            self.sentDict[eventType] = {}
+        self.sentLock = Lock()
+
+        self.started = False
+
+    #----------------------------------------------------------------------
+    def register(self, eventEngine):
+        """注册事件监听"""
+        for eventType in KEY_FIELD_DICT.keys():
+            eventEngine.register(eventType, self.processKeyEvent)
+
+        for eventType in STREAM_EVENT_LIST:
+            eventEngine.register(eventType, self.processStreamEvent)
+
+    #----------------------------------------------------------------------
+    def start(self):
+        """启动推送后台任务，需要在Socket.IO服务启动时调用"""
+        if not self.started:
+            self.started = True
+            self.socketio.start_background_task(self.run)
+
+    #----------------------------------------------------------------------
+    def processKeyEvent(self, event):
+        """处理有状态数据的事件，只保存最新数据"""
+        data = event.dict_['data']
+        keyField = KEY_FIELD_DICT[event.type_]
+
+        if isinstance(data, dict):
+            key = data[keyField]
+        else:
+            key = getattr(data, keyField)
+
+        with self.lock:
+            self.pendingDict.setdefault(event.type_, {})[key] = data
+
+    #----------------------------------------------------------------------
+    def processStreamEvent(self, event):
+        """处理流水数据的事件"""
+        with self.lock:
+            self.streamDict.setdefault(event.type_, []).append(event.dict_['data'])
+
+    #----------------------------------------------------------------------
+    def run(self):
+        """后台任务运行函数"""
+        while True:
+            self.socketio.sleep(self.interval)
+            self.flush()
+
+    #----------------------------------------------------------------------
+    def flush(self):
+        """推送一帧数据"""
+        with self.lock:
+            pendingDict = self.pendingDict
+            streamDict = self.streamDict
+            self.pendingDict = {}
+            self.streamDict = {}
+
+        for eventType, dataDict in pendingDict.items():
+            with self.sentLock:
+                deltaList = self.calculateDelta(eventType, dataDict)
+
+            if deltaList:
+                self.socketio.emit(eventType, deltaList)
+
+        for eventType, dataList in streamDict.items():
+            self.socketio.emit(eventType, [convertData(data) for data in dataList])
+
+    #----------------------------------------------------------------------
+    def calculateDelta(self, eventType, dataDict):
+        """计算增量数据，每条增量数据中都包含键"""
+        keyField = KEY_FIELD_DICT[eventType]
+        sentDict = self.sentDict[eventType]
+        deltaList = []
+
+        for key, data in dataDict.items():
+            d = convertData(data)
+            sent = sentDict.get(key)
+
+            if sent is None:
+                delta = d
+            else:
+                delta = {}
+                for k, v in d.items():
+                    if sent.get(k) != v:
+                        delta[k] = v
+
+                if not delta:
+                    continue
+                delta[keyField] = key
+
+            sentDict[key] = d
+            deltaList.append(delta)
+
+        return deltaList
+
+    #----------------------------------------------------------------------
+    def getSnapshot(self, eventType=None):
+        """
+        获取已推送的完整数据快照，返回字典，key为事件类型，value为数据列表
+        eventType：只获取该事件类型的数据，为空则获取全部
+        """
+        snapshot = {}
+
+        with self.sentLock:
+            for type_, sentDict in self.sentDict.items():
+                if not eventType or type_ == eventType:
+                    snapshot[type_] = list(sentDict.values())
+
+        return snapshot
@@ -11,19 +11,19 @@ except NameError:
 
 # 创建主引擎代理对象
 from vnpy.event import EventEngine2
-from vnpy.trader.vtEvent import (EVENT_TICK, EVENT_ORDER, EVENT_TRADE,
-                                 EVENT_ACCOUNT, EVENT_POSITION, EVENT_LOG,
-                                 EVENT_ERROR, EVENT_CONTRACT)
+from vnpy.trader.vtEvent import EVENT_LOG
 from vnpy.trader.vtObject import VtSubscribeReq, VtOrderReq, VtCancelOrderReq
 from vnpy.trader.app.rpcService.rsClient import MainEngineProxy
-from vnpy.trader.app.ctaStrategy.ctaBase import EVENT_CTA_LOG, EVENT_CTA_STRATEGY
+
+from webPush import WebPusher, KEY_FIELD_DICT, STREAM_EVENT_LIST
 
 reqAddress = 'tcp://localhost:6688'
 subAddress = 'tcp://localhost:8866'    
 
 ee = EventEngine2()
 me = MainEngineProxy(ee)
-me.init(reqAddress, subAddress)
+# 只精确订阅需要推送的通用事件，不会收到按合约、委托号等细分的重复事件
+me.init(reqAddress, subAddress, list(KEY_FIELD_DICT.keys()) + STREAM_EVENT_LIST)
 
 #----------------------------------------------------------------------
 def printLog(event):
@@ -45,6 +45,7 @@ with open("WEB_setting.json") as f:
     setting = json.load(f)
     USERNAME = setting['username']
     PASSWORD = setting['password']
+    PUSH_INTERVAL = setting.get('pushInterval', 0.2)
     TOKEN = base64.encodestring(TODAY+PASSWORD).replace('\n','')
 
 
@@ -614,6 +615,30 @@ class CtaStrategyVar(Resource):
         return {'result_code':'success','data':l}
 
       
+########################################################################
+class Snapshot(Resource):
+    """推送数据快照，新连接的客户端用于初始化，之后根据增量推送更新"""
+    
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """初始化"""
+        self.parser = reqparse.RequestParser()
+        self.parser.add_argument('eventType')
+        self.parser.add_argument('token')
+        super(Snapshot, self).__init__()    
+
+    #----------------------------------------------------------------------
+    def get(self):
+        """查询"""
+        args = self.parser.parse_args()
+        token = args['token']
+        if token != TOKEN:
+            return {'result_code':'error','message':'token error'}
+        
+        d = pusher.getSnapshot(args['eventType'])
+        return {'result_code':'success','data':d}
+
+      
 ########################################################################
 @app.route('/')
 def index_html():
@@ -632,6 +657,7 @@ api.add_resource(Contract, '/contract')
 api.add_resource(Log, '/log')
 api.add_resource(Error, '/error')
 api.add_resource(Tick, '/tick')
+api.add_resource(Snapshot, '/snapshot')
 
 api.add_resource(CtaStrategyLoad, '/ctastrategy/load')
 api.add_resource(CtaStrategyInit, '/ctastrategy/init')
@@ -642,38 +668,15 @@ api.add_resource(CtaStrategyVar, '/ctastrategy/var')
 api.add_resource(CtaStrategyName, '/ctastrategy/name')
 
 
-# SocketIO
-#----------------------------------------------------------------------
-def handleEvent(event):
-    """处理事件"""
-    eventType = event.type_
-
-    eventData = event.dict_['data']
-
-    if not isinstance(eventData, dict):
-        eventData = eventData.__dict__
-
-    if eventType == 'eTick.':
-        del eventData['datetime']
-
-    socketio.emit(eventType, eventData)
-
-
-ee.register(EVENT_TICK, handleEvent)
-ee.register(EVENT_ORDER, handleEvent)
-ee.register(EVENT_TRADE, handleEvent)
-ee.register(EVENT_ACCOUNT, handleEvent)
-ee.register(EVENT_POSITION, handleEvent)
-ee.register(EVENT_CONTRACT, handleEvent)
-ee.register(EVENT_LOG, handleEvent)
-ee.register(EVENT_ERROR, handleEvent)
-ee.register(EVENT_CTA_LOG, handleEvent)
-ee.register(EVENT_CTA_STRATEGY, handleEvent)
+# SocketIO，按固定帧率推送合并后的增量数据
+pusher = WebPusher(socketio, PUSH_INTERVAL)
+pusher.register(ee)
     
 
 #----------------------------------------------------------------------
 def run():
     """启动Web服务"""
+    pusher.start()
     socketio.run(app, 
                  debug=True,
                  host='0.0.0.0',
@@ -1,3 +1,3 @@
 # encoding: UTF-8
 
-from .eventEngine import EventEngine, EventEngine2, Event, EVENT_TIMER
\ No newline at end of file
+from .eventEngine import EventEngine, EventEngine2, ShardedEventEngine, Event, EVENT_TIMER, EVENT_SLOW_HANDLER
\ No newline at end of file
@@ -3,9 +3,15 @@
 # 系统模块
 from __future__ import print_function
 from queue import Queue, Empty
-from threading import Thread
+from threading import Thread, Lock
 from time import sleep
-from collections import defaultdict
+from collections import defaultdict, deque
+from zlib import crc32
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import clock as perf_counter          # Python 2
 
 # 第三方模块
 from qtpy.QtCore import QTimer
@@ -14,6 +20,10 @@ from qtpy.QtCore import QTimer
 from .eventType import *
 
 
+# 同一个处理函数两次慢处理警告之间的最小间隔（秒）
+SLOW_WARNING_INTERVAL = 1.0
+
+
 ########################################################################
 class EventEngine(object):
     """
@@ -38,6 +48,9 @@ class EventEngine(object):
     register：公共方法，向引擎中注册监听函数
     unregister：公共方法，向引擎中注销监听函数
     put：公共方法，向事件队列中存入新的事件
+    putLatest：公共方法，向事件队列中存入可合并的事件
+    registerConflated：公共方法，向引擎中注册只接收最新事件的监听函数
+    unregisterConflated：公共方法，向引擎中注销只接收最新事件的监听函数
     
     事件监听函数必须定义为输入参数仅为一个event对象，即：
     
@@ -74,6 +87,13 @@ class EventEngine(object):
         # __generalHandlers是一个列表，用来保存通用回调函数（所有事件均调用）
         self.__generalHandlers = []
         
+        # __conflatedHandlers保存可合并推送的处理函数，对同一个键的连续事件只接收最新的一个
+        self.__conflatedHandlers = defaultdict(list)
+        
+        # 合并推送的最新事件槽位，键为(事件类型, 合并键)
+        self.__slots = {}
+        self.__slotLock = Lock()
+        
     #----------------------------------------------------------------------
     def __run(self):
         """引擎运行"""
@@ -99,6 +119,24 @@ class EventEngine(object):
         # 调用通用处理函数进行处理
         if self.__generalHandlers:
             [handler(event) for handler in self.__generalHandlers]
+        
+        # 对于合并推送的事件，只把槽位中最新的事件推送给可合并的处理函数，
+        # 通过put推送的事件没有合并键，直接推送给可合并的处理函数
+        if event.type_ in self.__conflatedHandlers:
+            latest = self.__popLatest(event)
+            if latest:
+                [handler(latest) for handler in self.__conflatedHandlers[event.type_]]
+        elif event.key_ is not None:
+            self.__popLatest(event)
+    
+    #----------------------------------------------------------------------
+    def __popLatest(self, event):
+        """取出事件对应槽位中的最新事件，若已被之前的事件取出则返回None"""
+        if event.key_ is None:
+            return event
+        
+        with self.__slotLock:
+            return self.__slots.pop((event.type_, event.key_), None)
                
     #----------------------------------------------------------------------
     def __onTimer(self):
@@ -163,7 +201,11 @@ class EventEngine(object):
             
     #----------------------------------------------------------------------
     def put(self, event):
-        """向事件队列中存入事件"""
+        """向事件队列中存入事件，可合并的处理函数也会收到该事件"""
+        # 清除合并键（如RPC客户端收到的服务端事件），避免事件到达时找不到对应的槽位被丢弃
+        if event.key_ is not None:
+            event.key_ = None
+        
         self.__queue.put(event)
         
     #----------------------------------------------------------------------
@@ -177,17 +219,65 @@ class EventEngine(object):
         """注销通用事件处理函数监听"""
         if handler in self.__generalHandlers:
             self.__generalHandlers.remove(handler)
+            
+    #----------------------------------------------------------------------
+    def putLatest(self, event, key):
+        """
+        向事件队列中存入可合并的事件
+        key：合并键（如vtSymbol），同一事件类型和键只保留最新的事件推送给可合并的处理函数
+        """
+        event.key_ = key
+        slotKey = (event.type_, key)
+        
+        with self.__slotLock:
+            pending = slotKey in self.__slots
+            self.__slots[slotKey] = event
+        
+        # 若之前的事件仍在队列中等待处理，且没有需要接收每个事件的处理函数，则无需再次入队
+        if pending and event.type_ not in self.__handlers and not self.__generalHandlers:
+            return
+        
+        self.__queue.put(event)
+        
+    #----------------------------------------------------------------------
+    def registerConflated(self, type_, handler):
+        """注册可合并推送的事件处理函数监听，通过putLatest推送的事件只接收最新的一个"""
+        handlerList = self.__conflatedHandlers[type_]
+        
+        if handler not in handlerList:
+            handlerList.append(handler)
+            
+    #----------------------------------------------------------------------
+    def unregisterConflated(self, type_, handler):
+        """注销可合并推送的事件处理函数监听"""
+        handlerList = self.__conflatedHandlers[type_]
+        
+        if handler in handlerList:
+            handlerList.remove(handler)
+        
+        if not handlerList:
+            del self.__conflatedHandlers[type_]
         
 
 
 ########################################################################
 class EventEngine2(object):
     """
-    计时器使用python线程的事件驱动引擎        
+    计时器使用python线程的事件驱动引擎
+    
+    batchMode：批量模式开关，开启后事件处理线程每次获取锁时会取出队列中
+    所有待处理的事件，并在一个紧凑循环中完成推送，适用于行情高峰时段
+    单线程处理跟不上事件产生速度的情况
+    
+    通过setProfiling开启性能分析模式后，会统计每个(事件类型, 处理函数)的
+    调用次数、累计耗时和最大耗时，单次耗时超过预算时推送EVENT_SLOW_HANDLER事件
+    
+    warningPut：推送慢处理警告事件的函数，默认推送到本引擎，
+    ShardedEventEngine的工作线程使用控制线程的put，使警告能被MainEngine收到
     """
 
     #----------------------------------------------------------------------
-    def __init__(self):
+    def __init__(self, batchMode=False, warningPut=None):
         """初始化事件引擎"""
         # 事件队列
         self.__queue = Queue()
@@ -195,8 +285,14 @@ class EventEngine2(object):
         # 事件引擎开关
         self.__active = False
         
+        # 批量处理模式
+        self.__batchMode = batchMode
+        
         # 事件处理线程
-        self.__thread = Thread(target = self.__run)
+        if batchMode:
+            self.__thread = Thread(target = self.__runBatch)
+        else:
+            self.__thread = Thread(target = self.__run)
         
         # 计时器，用于触发计时器事件
         self.__timer = Thread(target = self.__runTimer)
@@ -210,6 +306,35 @@ class EventEngine2(object):
         # __generalHandlers是一个列表，用来保存通用回调函数（所有事件均调用）
         self.__generalHandlers = []        
         
+        # __conflatedHandlers保存可合并推送的处理函数，对同一个键的连续事件只接收最新的一个
+        self.__conflatedHandlers = defaultdict(list)
+        
+        # 推送时使用的处理函数元组，仅在注册/注销时重建，
+        # 处理线程中只读取不修改，避免每个事件都创建临时列表
+        self.__handlerTuples = {}
+        self.__generalHandlerTuple = ()
+        self.__conflatedHandlerTuples = {}
+        
+        # 合并推送的最新事件槽位，键为(事件类型, 合并键)
+        self.__slots = {}
+        self.__slotLock = Lock()
+        
+        # 批量模式下的运行统计
+        self.__batchCount = 0                           # 已处理批次数
+        self.__eventCount = 0                           # 已处理事件数
+        self.__lastBatchSize = 0                        # 最近一批事件数
+        self.__maxBatchSize = 0                         # 最大单批事件数
+        self.__lastDispatchTime = 0.0                   # 最近一批推送耗时（秒）
+        self.__maxDispatchTime = 0.0                    # 最大单批推送耗时（秒）
+        self.__totalDispatchTime = 0.0                  # 累计推送耗时（秒）
+        
+        # 性能分析模式
+        self.__profiling = False                        # 性能分析开关
+        self.__slowBudget = 0.01                        # 单次处理耗时预算（秒）
+        self.__warningPut = warningPut or self.put      # 慢处理警告事件的推送函数
+        self.__profile = {}                             # key为(事件类型, 处理函数)，value为[次数, 累计耗时, 最大耗时]
+        self.__slowWarningTime = {}                     # 每个处理函数上一次推送慢处理警告的时间
+        
     #----------------------------------------------------------------------
     def __run(self):
         """引擎运行"""
@@ -220,21 +345,171 @@ class EventEngine2(object):
             except Empty:
                 pass
             
+    #----------------------------------------------------------------------
+    def __runBatch(self):
+        """引擎运行（批量模式）"""
+        handlerTuples = self.__handlerTuples
+        
+        while self.__active == True:
+            events = self.__drain()
+            if not events:
+                continue
+            
+            start = perf_counter()
+            
+            if self.__profiling:
+                for event in events:
+                    self.__processProfiled(event)
+            else:
+                # 注意这里每个事件都重新读取元组，保证注册/注销后立即生效
+                for event in events:
+                    handlers = handlerTuples.get(event.type_)
+                    if handlers:
+                        for handler in handlers:
+                            handler(event)
+                    
+                    generalHandlers = self.__generalHandlerTuple
+                    if generalHandlers:
+                        for handler in generalHandlers:
+                            handler(event)
+                    
+                    if event.key_ is not None or event.type_ in self.__conflatedHandlerTuples:
+                        self.__processLatest(event)
+            
+            self.__updateStats(len(events), perf_counter() - start)
+            
+    #----------------------------------------------------------------------
+    def __drain(self):
+        """一次加锁取出队列中所有待处理的事件，队列为空时最多等待1秒"""
+        queue = self.__queue
+        
+        with queue.not_empty:
+            if not queue.queue:
+                queue.not_empty.wait(1)
+            
+            events = queue.queue
+            if events:
+                queue.queue = deque()
+        
+        return events
+    
+    #----------------------------------------------------------------------
+    def __updateStats(self, batchSize, dispatchTime):
+        """更新批量推送统计"""
+        self.__batchCount += 1
+        self.__eventCount += batchSize
+        self.__lastBatchSize = batchSize
+        self.__lastDispatchTime = dispatchTime
+        self.__totalDispatchTime += dispatchTime
+        
+        if batchSize > self.__maxBatchSize:
+            self.__maxBatchSize = batchSize
+        
+        if dispatchTime > self.__maxDispatchTime:
+            self.__maxDispatchTime = dispatchTime
+            
     #----------------------------------------------------------------------
     def __process(self, event):
         """处理事件"""
-        # 检查是否存在对该事件进行监听的处理函数
-        if event.type_ in self.__handlers:
-            # 若存在，则按顺序将事件传递给处理函数执行
-            [handler(event) for handler in self.__handlers[event.type_]]
-            
-            # 以上语句为Python列表解析方式的写法，对应的常规循环写法为：
-            #for handler in self.__handlers[event.type_]:
-                #handler(event) 
+        if self.__profiling:
+            self.__processProfiled(event)
+            return
+        
+        # 检查是否存在对该事件进行监听的处理函数，若存在则按顺序传递给处理函数执行
+        handlers = self.__handlerTuples.get(event.type_)
+        if handlers:
+            for handler in handlers:
+                handler(event)
                 
         # 调用通用处理函数进行处理
-        if self.__generalHandlers:
-            [handler(event) for handler in self.__generalHandlers]        
+        generalHandlers = self.__generalHandlerTuple
+        if generalHandlers:
+            for handler in generalHandlers:
+                handler(event)
+        
+        # 对于合并推送的事件，只把槽位中最新的事件推送给可合并的处理函数
+        if event.key_ is not None or event.type_ in self.__conflatedHandlerTuples:
+            self.__processLatest(event)
+            
+    #----------------------------------------------------------------------
+    def __processLatest(self, event):
+        """处理合并推送的事件"""
+        # 通过put推送的事件没有合并键，直接推送给可合并的处理函数
+        if event.key_ is None:
+            latest = event
+        else:
+            with self.__slotLock:
+                latest = self.__slots.pop((event.type_, event.key_), None)
+            
+            # 为None说明该槽位已经被之前出队的事件取走，最新数据已推送过
+            if latest is None:
+                return
+        
+        handlers = self.__conflatedHandlerTuples.get(event.type_)
+        if handlers:
+            if self.__profiling:
+                for handler in handlers:
+                    self.__callProfiled(handler, latest)
+            else:
+                for handler in handlers:
+                    handler(latest)
+    
+    #----------------------------------------------------------------------
+    def __processProfiled(self, event):
+        """处理事件（性能分析模式）"""
+        handlers = self.__handlerTuples.get(event.type_)
+        if handlers:
+            for handler in handlers:
+                self.__callProfiled(handler, event)
+        
+        generalHandlers = self.__generalHandlerTuple
+        if generalHandlers:
+            for handler in generalHandlers:
+                self.__callProfiled(handler, event)
+        
+        if event.key_ is not None or event.type_ in self.__conflatedHandlerTuples:
+            self.__processLatest(event)
+    
+    #----------------------------------------------------------------------
+    def __callProfiled(self, handler, event):
+        """调用处理函数并统计耗时"""
+        start = perf_counter()
+        handler(event)
+        cost = perf_counter() - start
+        
+        key = (event.type_, handler)
+        record = self.__profile.get(key)
+        if record is None:
+            record = [0, 0.0, 0.0]
+            self.__profile[key] = record
+        
+        record[0] += 1
+        record[1] += cost
+        if cost > record[2]:
+            record[2] = cost
+        
+        # 超过预算则推送警告，慢处理警告事件本身不再检查，避免循环
+        if cost > self.__slowBudget and event.type_ != EVENT_SLOW_HANDLER:
+            self.__putSlowWarning(key, cost)
+    
+    #----------------------------------------------------------------------
+    def __putSlowWarning(self, key, cost):
+        """推送慢处理警告事件，同一个处理函数每秒最多推送一次"""
+        now = perf_counter()
+        if now - self.__slowWarningTime.get(key, -SLOW_WARNING_INTERVAL) < SLOW_WARNING_INTERVAL:
+            return
+        self.__slowWarningTime[key] = now
+        
+        type_, handler = key
+        
+        event = Event(type_=EVENT_SLOW_HANDLER)
+        event.dict_['data'] = {
+            'type': type_,
+            'handler': getHandlerName(handler),
+            'cost': cost,
+            'budget': self.__slowBudget
+        }
+        self.__warningPut(event)
                
     #----------------------------------------------------------------------
     def __runTimer(self):
@@ -273,8 +548,9 @@ class EventEngine2(object):
         self.__active = False
         
         # 停止计时器
-        self.__timerActive = False
-        self.__timer.join()
+        if self.__timerActive:
+            self.__timerActive = False
+            self.__timer.join()
         
         # 等待事件处理线程退出
         self.__thread.join()
@@ -288,6 +564,7 @@ class EventEngine2(object):
         # 若要注册的处理器不在该事件的处理器列表中，则注册该事件
         if handler not in handlerList:
             handlerList.append(handler)
+            self.__handlerTuples[type_] = tuple(handlerList)
             
     #----------------------------------------------------------------------
     def unregister(self, type_, handler):
@@ -302,10 +579,17 @@ class EventEngine2(object):
         # 如果函数列表为空，则从引擎中移除该事件类型
         if not handlerList:
             del self.__handlers[type_]  
+            self.__handlerTuples.pop(type_, None)
+        else:
+            self.__handlerTuples[type_] = tuple(handlerList)
         
     #----------------------------------------------------------------------
     def put(self, event):
-        """向事件队列中存入事件"""
+        """向事件队列中存入事件，可合并的处理函数也会收到该事件"""
+        # 清除合并键（如RPC客户端收到的服务端事件），避免事件到达时找不到对应的槽位被丢弃
+        if event.key_ is not None:
+            event.key_ = None
+        
         self.__queue.put(event)
 
     #----------------------------------------------------------------------
@@ -313,16 +597,389 @@ class EventEngine2(object):
         """注册通用事件处理函数监听"""
         if handler not in self.__generalHandlers:
             self.__generalHandlers.append(handler)
+            self.__generalHandlerTuple = tuple(self.__generalHandlers)
             
     #----------------------------------------------------------------------
     def unregisterGeneralHandler(self, handler):
         """注销通用事件处理函数监听"""
         if handler in self.__generalHandlers:
             self.__generalHandlers.remove(handler)
+            self.__generalHandlerTuple = tuple(self.__generalHandlers)
+            
+    #----------------------------------------------------------------------
+    def putLatest(self, event, key):
+        """
+        向事件队列中存入可合并的事件
+        key：合并键（如vtSymbol），同一事件类型和键只保留最新的事件推送给可合并的处理函数
+        """
+        event.key_ = key
+        slotKey = (event.type_, key)
+        
+        with self.__slotLock:
+            pending = slotKey in self.__slots
+            self.__slots[slotKey] = event
+        
+        # 若之前的事件仍在队列中等待处理，且没有需要接收每个事件的处理函数，则无需再次入队
+        if pending and event.type_ not in self.__handlerTuples and not self.__generalHandlerTuple:
+            return
+        
+        self.__queue.put(event)
+        
+    #----------------------------------------------------------------------
+    def registerConflated(self, type_, handler):
+        """注册可合并推送的事件处理函数监听，通过putLatest推送的事件只接收最新的一个"""
+        handlerList = self.__conflatedHandlers[type_]
+        
+        if handler not in handlerList:
+            handlerList.append(handler)
+            self.__conflatedHandlerTuples[type_] = tuple(handlerList)
+            
+    #----------------------------------------------------------------------
+    def unregisterConflated(self, type_, handler):
+        """注销可合并推送的事件处理函数监听"""
+        handlerList = self.__conflatedHandlers[type_]
+        
+        if handler in handlerList:
+            handlerList.remove(handler)
+        
+        if not handlerList:
+            del self.__conflatedHandlers[type_]
+            self.__conflatedHandlerTuples.pop(type_, None)
+        else:
+            self.__conflatedHandlerTuples[type_] = tuple(handlerList)
+            
+    #----------------------------------------------------------------------
+    def hasHandler(self, type_, handler):
+        """检查处理函数是否已注册"""
+        return handler in self.__handlerTuples.get(type_, ())
+    
+    #----------------------------------------------------------------------
+    def hasConflatedHandler(self, type_, handler):
+        """检查可合并推送的处理函数是否已注册"""
+        return handler in self.__conflatedHandlerTuples.get(type_, ())
+            
+    #----------------------------------------------------------------------
+    def getQueueSize(self):
+        """获取当前队列中待处理的事件数量"""
+        return self.__queue.qsize()
+    
+    #----------------------------------------------------------------------
+    def getStats(self):
+        """获取批量推送的统计数据（时间单位为秒）"""
+        if self.__batchCount:
+            avgBatchSize = float(self.__eventCount) / self.__batchCount
+            avgDispatchTime = self.__totalDispatchTime / self.__batchCount
+        else:
+            avgBatchSize = 0
+            avgDispatchTime = 0
+        
+        d = {
+            'batchMode': self.__batchMode,
+            'queueSize': self.__queue.qsize(),
+            'batchCount': self.__batchCount,
+            'eventCount': self.__eventCount,
+            'lastBatchSize': self.__lastBatchSize,
+            'maxBatchSize': self.__maxBatchSize,
+            'avgBatchSize': avgBatchSize,
+            'lastDispatchTime': self.__lastDispatchTime,
+            'maxDispatchTime': self.__maxDispatchTime,
+            'avgDispatchTime': avgDispatchTime
+        }
+        return d
+    
+    #----------------------------------------------------------------------
+    def setProfiling(self, profiling, slowBudget=None):
+        """
+        开启或关闭性能分析模式
+        slowBudget：单次处理耗时预算（秒），超过则推送EVENT_SLOW_HANDLER事件
+        """
+        if slowBudget is not None:
+            self.__slowBudget = slowBudget
+        self.__profiling = profiling
+    
+    #----------------------------------------------------------------------
+    def getProfile(self):
+        """
+        获取性能分析数据，返回按累计耗时从大到小排序的字典列表，时间单位为秒
+        """
+        l = []
+        
+        for (type_, handler), (count, totalTime, maxTime) in list(self.__profile.items()):
+            d = {
+                'type': type_,
+                'handler': getHandlerName(handler),
+                'count': count,
+                'totalTime': totalTime,
+                'avgTime': totalTime / count,
+                'maxTime': maxTime
+            }
+            l.append(d)
+        
+        l.sort(key=lambda d: d['totalTime'], reverse=True)
+        return l
+    
+    #----------------------------------------------------------------------
+    def resetProfile(self):
+        """清空性能分析数据"""
+        self.__profile = {}
+        self.__slowWarningTime = {}
+
+
+########################################################################
+class ShardedEventEngine(object):
+    """
+    按合约分片的多线程事件驱动引擎
+    
+    每个线程内部都是一个EventEngine2。通过register等常规接口注册的处理函数
+    只在控制线程中运行，所有事件（包括Tick、成交、委托）都会推送到控制线程，
+    因此这些处理函数的线程安全和事件顺序与EventEngine2完全相同。
+    
+    只有通过registerSharded、registerShardedConflated主动声明支持分片的处理函数
+    才会被添加到工作线程中：事件类型以shardPrefixes中的前缀开头（默认为Tick、
+    成交、委托），且事件数据带有vtSymbol时，该事件会同时根据vtSymbol的稳定
+    哈希值分配到固定的工作线程处理，保证同一合约的事件按顺序处理，不同合约
+    之间互不阻塞。这类处理函数可能在多个线程中被同时调用（不同合约），
+    只能修改按合约区分的数据。
+    
+    对外接口和EventEngine2保持一致，可以直接传入MainEngine使用。
+    """
+    
+    SHARD_PREFIXES = ('eTick.', 'eTrade.', 'eOrder.')
+
+    #----------------------------------------------------------------------
+    def __init__(self, shardCount=4, shardPrefixes=SHARD_PREFIXES, batchMode=False):
+        """Constructor"""
+        # 控制线程，处理全局事件
+        self.__control = EventEngine2(batchMode)
+        
+        # 工作线程，处理按合约分片的事件，慢处理警告推送到控制线程
+        self.__workers = [EventEngine2(batchMode, self.__control.put) for i in range(shardCount)]
+        self.__engines = [self.__control] + self.__workers
+        
+        # 需要分片的事件类型前缀
+        self.__shardPrefixes = tuple(shardPrefixes)
+        
+        # vtSymbol到工作线程的映射缓存
+        self.__shardDict = {}
+        
+        # 注册了分片处理函数的事件类型，key为事件类型，value为处理函数数量
+        self.__shardedTypes = defaultdict(int)
+        
+        # 计时器，用于触发计时器事件
+        self.__timer = Thread(target = self.__runTimer)
+        self.__timerActive = False                      # 计时器工作状态
+        self.__timerSleep = 1                           # 计时器触发间隔（默认1秒）
+        
+    #----------------------------------------------------------------------
+    def __route(self, event):
+        """获取处理该事件的工作线程引擎，没有注册分片处理函数时返回None"""
+        type_ = event.type_
+        
+        if type_ not in self.__shardedTypes:
+            return None
+        
+        if type_.startswith(self.__shardPrefixes):
+            vtSymbol = getattr(event.dict_.get('data'), 'vtSymbol', None)
+            
+            if vtSymbol:
+                engine = self.__shardDict.get(vtSymbol)
+                
+                if engine is None:
+                    engine = self.getShard(vtSymbol)
+                    self.__shardDict[vtSymbol] = engine
+                    
+                return engine
+        
+        # 无法按合约分片的事件由第一个工作线程处理
+        return self.__workers[0]
+    
+    #----------------------------------------------------------------------
+    def __runTimer(self):
+        """运行在计时器线程中的循环函数"""
+        while self.__timerActive:
+            # 创建计时器事件
+            event = Event(type_=EVENT_TIMER)
+        
+            # 向控制线程中存入计时器事件
+            self.__control.put(event)
+            
+            # 等待
+            sleep(self.__timerSleep)
+    
+    #----------------------------------------------------------------------
+    def getShard(self, vtSymbol):
+        """获取合约对应的工作线程引擎，使用crc32保证不同进程间的分配结果一致"""
+        n = crc32(vtSymbol.encode('utf-8')) & 0xffffffff
+        return self.__workers[n % len(self.__workers)]
+        
+    #----------------------------------------------------------------------
+    def start(self, timer=True):
+        """
+        引擎启动
+        timer：是否要启动计时器
+        """
+        for engine in self.__engines:
+            engine.start(timer=False)
+        
+        if timer:
+            self.__timerActive = True
+            self.__timer.start()
+            
+    #----------------------------------------------------------------------
+    def stop(self):
+        """停止引擎"""
+        if self.__timerActive:
+            self.__timerActive = False
+            self.__timer.join()
+        
+        for engine in self.__engines:
+            engine.stop()
+    
+    #----------------------------------------------------------------------
+    def register(self, type_, handler):
+        """注册事件处理函数监听（在控制线程中运行）"""
+        self.__control.register(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def unregister(self, type_, handler):
+        """注销事件处理函数监听"""
+        self.__control.unregister(type_, handler)
+            
+    #----------------------------------------------------------------------
+    def registerConflated(self, type_, handler):
+        """注册可合并推送的事件处理函数监听（在控制线程中运行）"""
+        self.__control.registerConflated(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def unregisterConflated(self, type_, handler):
+        """注销可合并推送的事件处理函数监听"""
+        self.__control.unregisterConflated(type_, handler)
+            
+    #----------------------------------------------------------------------
+    def registerGeneralHandler(self, handler):
+        """注册通用事件处理函数监听（在控制线程中运行）"""
+        self.__control.registerGeneralHandler(handler)
+            
+    #----------------------------------------------------------------------
+    def unregisterGeneralHandler(self, handler):
+        """注销通用事件处理函数监听"""
+        self.__control.unregisterGeneralHandler(handler)
+    
+    #----------------------------------------------------------------------
+    def registerSharded(self, type_, handler):
+        """
+        注册支持分片的事件处理函数监听（在工作线程中运行）
+        处理函数会在多个工作线程中被同时调用，只能修改按合约区分的数据
+        """
+        if self.__addSharded(type_, handler, self.__workers[0].hasHandler):
+            for engine in self.__workers:
+                engine.register(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def unregisterSharded(self, type_, handler):
+        """注销支持分片的事件处理函数监听"""
+        if self.__removeSharded(type_, handler, self.__workers[0].hasHandler):
+            for engine in self.__workers:
+                engine.unregister(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def registerShardedConflated(self, type_, handler):
+        """注册支持分片的可合并推送的事件处理函数监听（在工作线程中运行）"""
+        if self.__addSharded(type_, handler, self.__workers[0].hasConflatedHandler):
+            for engine in self.__workers:
+                engine.registerConflated(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def unregisterShardedConflated(self, type_, handler):
+        """注销支持分片的可合并推送的事件处理函数监听"""
+        if self.__removeSharded(type_, handler, self.__workers[0].hasConflatedHandler):
+            for engine in self.__workers:
+                engine.unregisterConflated(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def __addSharded(self, type_, handler, hasHandler):
+        """记录分片处理函数，返回是否需要注册"""
+        if hasHandler(type_, handler):
+            return False
+        
+        self.__shardedTypes[type_] += 1
+        return True
+    
+    #----------------------------------------------------------------------
+    def __removeSharded(self, type_, handler, hasHandler):
+        """移除分片处理函数记录，返回是否需要注销"""
+        if not hasHandler(type_, handler):
+            return False
+        
+        self.__shardedTypes[type_] -= 1
+        if not self.__shardedTypes[type_]:
+            del self.__shardedTypes[type_]
+        return True
+    
+    #----------------------------------------------------------------------
+    def put(self, event):
+        """向事件队列中存入事件"""
+        self.__control.put(event)
+        
+        engine = self.__route(event)
+        if engine:
+            engine.put(event)
+        
+    #----------------------------------------------------------------------
+    def putLatest(self, event, key):
+        """向事件队列中存入可合并的事件"""
+        self.__control.putLatest(event, key)
+        
+        engine = self.__route(event)
+        if engine:
+            engine.putLatest(event, key)
+        
+    #----------------------------------------------------------------------
+    def getQueueSize(self):
+        """获取当前所有队列中待处理的事件数量"""
+        return sum([engine.getQueueSize() for engine in self.__engines])
+    
+    #----------------------------------------------------------------------
+    def getStats(self):
+        """获取各线程的统计数据，第一个为控制线程"""
+        return [engine.getStats() for engine in self.__engines]
+    
+    #----------------------------------------------------------------------
+    def setProfiling(self, profiling, slowBudget=None):
+        """开启或关闭所有线程的性能分析模式"""
+        for engine in self.__engines:
+            engine.setProfiling(profiling, slowBudget)
+    
+    #----------------------------------------------------------------------
+    def getProfile(self):
+        """获取各线程的性能分析数据，第一个为控制线程"""
+        return [engine.getProfile() for engine in self.__engines]
+    
+    #----------------------------------------------------------------------
+    def resetProfile(self):
+        """清空所有线程的性能分析数据"""
+        for engine in self.__engines:
+            engine.resetProfile()
+
+
+#----------------------------------------------------------------------
+def getHandlerName(handler):
+    """获取处理函数的可读名称，绑定方法显示为类名.方法名"""
+    name = getattr(handler, '__name__', repr(handler))
+    obj = getattr(handler, '__self__', None)
+    
+    if obj is None:
+        return name
+    
+    # Qt信号的emit方法，类名无法区分具体的信号，使用信号对象的描述
+    if name == 'emit':
+        return repr(obj)
+    
+    return '%s.%s' %(obj.__class__.__name__, name)
 
 
 ########################################################################
-class Event:
+class Event(object):
     """事件对象"""
 
     #----------------------------------------------------------------------
@@ -330,6 +987,7 @@ class Event:
         """Constructor"""
         self.type_ = type_      # 事件类型
         self.dict_ = {}         # 字典用于保存具体的事件数据
+        self.key_ = None        # 合并推送使用的键（通过putLatest推送时设置）
 
 
 #----------------------------------------------------------------------
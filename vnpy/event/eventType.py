@@ -14,6 +14,7 @@ from __future__ import print_function
 
 
 EVENT_TIMER = 'eTimer'                  # 计时器事件，每隔1秒发送一次
+EVENT_SLOW_HANDLER = 'eSlowHandler'     # 事件处理函数耗时超过预算的警告事件
  
 
 
@@ -15,6 +15,9 @@ price：期权价格
 出于开发演示的目的，本文件中的希腊值计算基于简单数值差分法，
 运算效率一般，实盘中建议使用更高速的算法。
 
+本文件不提供批量计算接口：数值差分的gamma是对已按百分比缩放的delta再次差分，
+和解析解的gamma定义不同，需要对整条期权链批量计算时请使用blackAnalytic模块。
+
 本文件中的希腊值计算结果没有采用传统的模型价格数值，而是采用
 了实盘交易中更为实用的百分比变动数值，具体定义如下
 delta：当f变动1%时，price的变动
@@ -150,4 +153,3 @@ def calculateImpv(price, f, k, r, t, cp):
     v = round(v, 4)
     
     return v
-    
\ No newline at end of file
@@ -0,0 +1,323 @@
+# encoding: UTF-8
+
+'''
+Black-76期权定价模型（解析解版本），主要用于标的物为期货的欧式期权的定价
+
+变量说明
+f：标的物期货价格
+k：行权价
+r：无风险利率
+t：剩余到期时间（年）
+v：隐含波动率
+cp：期权类型，+1/-1对应call/put
+price：期权价格
+
+和black模块使用相同的接口，希腊值基于解析公式计算，计算全部希腊值时d1、d2等
+中间结果只计算一次。隐含波动率使用解析vega的Newton Raphson方法，当迭代结果
+超出当前的波动率区间或者vega接近0时改用二分法，保证计算收敛。
+calculateGreeksBatch和calculateImpvBatch使用numpy数组一次性计算多个期权（如整条期权链）。
+
+本文件中的希腊值计算结果没有采用传统的模型价格数值，而是采用
+了实盘交易中更为实用的百分比变动数值，具体定义如下
+delta：当f变动1%时，price的变动
+gamma：当f变动1%时，delta的变动
+theta：当t变动1天时，price的变动（国内交易日每年240天）
+vega：当v涨跌1个点时，price的变动（如从16%涨到17%）
+'''
+
+from __future__ import division
+
+import numpy as np
+from scipy.special import ndtr
+from math import (log, sqrt, exp, pi, erf)
+
+
+# 计算隐含波动率时用的参数
+DX_TARGET = 0.00001
+MAX_ITERATION = 50
+
+VOL_MIN = 0             # 隐含波动率区间下限
+VOL_MAX = 5             # 隐含波动率区间上限
+
+INV_SQRT_2PI = 1 / sqrt(2 * pi)
+SQRT_2 = sqrt(2)
+
+
+#----------------------------------------------------------------------
+def cdf(x):
+    """标准正态分布的累积分布函数"""
+    return 0.5 * (1 + erf(x / SQRT_2))
+
+#----------------------------------------------------------------------
+def pdf(x):
+    """标准正态分布的概率密度函数"""
+    return exp(-0.5 * x * x) * INV_SQRT_2PI
+
+#----------------------------------------------------------------------
+def calculateD1(f, k, t, v):
+    """计算d1"""
+    return (log(f / k) + 0.5 * v * v * t) / (v * sqrt(t))
+
+#----------------------------------------------------------------------
+def calculatePrice(f, k, r, t, v, cp):
+    """计算期权价格"""
+    # 如果波动率或者剩余时间为0，则直接返回期权空间价值
+    if v <= 0 or t <= 0:
+        return max(0, cp * (f - k))
+
+    d1 = calculateD1(f, k, t, v)
+    d2 = d1 - v * sqrt(t)
+    price = cp * (f * cdf(cp * d1) - k * cdf(cp * d2)) * exp(-r * t)
+    return price
+
+#----------------------------------------------------------------------
+def calculateDelta(f, k, r, t, v, cp):
+    """计算Delta值"""
+    if v <= 0 or t <= 0:
+        return 0
+
+    d1 = calculateD1(f, k, t, v)
+    delta = cp * cdf(cp * d1) * exp(-r * t)
+    delta = delta * f * 0.01
+    return delta
+
+#----------------------------------------------------------------------
+def calculateGamma(f, k, r, t, v, cp):
+    """计算Gamma值"""
+    if v <= 0 or t <= 0:
+        return 0
+
+    d1 = calculateD1(f, k, t, v)
+    gamma = exp(-r * t) * pdf(d1) / (f * v * sqrt(t))
+    gamma = gamma * f * f * 0.0001
+    return gamma
+
+#----------------------------------------------------------------------
+def calculateTheta(f, k, r, t, v, cp):
+    """计算Theta值"""
+    if v <= 0 or t <= 0:
+        return 0
+
+    d1 = calculateD1(f, k, t, v)
+    d2 = d1 - v * sqrt(t)
+    discount = exp(-r * t)
+    price = cp * (f * cdf(cp * d1) - k * cdf(cp * d2)) * discount
+    theta = -0.5 * discount * f * pdf(d1) * v / sqrt(t) + r * price
+    theta = theta / 240
+    return theta
+
+#----------------------------------------------------------------------
+def calculateVega(f, k, r, t, v, cp):
+    """计算Vega值"""
+    vega = calculateOriginalVega(f, k, r, t, v, cp) / 100
+    return vega
+
+#----------------------------------------------------------------------
+def calculateOriginalVega(f, k, r, t, v, cp):
+    """计算原始vega值"""
+    if v <= 0 or t <= 0:
+        return 0
+
+    d1 = calculateD1(f, k, t, v)
+    vega = exp(-r * t) * f * pdf(d1) * sqrt(t)
+    return vega
+
+#----------------------------------------------------------------------
+def calculateGreeks(f, k, r, t, v, cp):
+    """计算期权的价格和希腊值"""
+    if v <= 0 or t <= 0:
+        return max(0, cp * (f - k)), 0, 0, 0, 0
+
+    sqrtT = sqrt(t)
+    vt = v * sqrtT
+    d1 = (log(f / k) + 0.5 * v * v * t) / vt
+    d2 = d1 - vt
+    discount = exp(-r * t)
+    pdf1 = pdf(d1)
+    cdf1 = cdf(cp * d1)
+    cdf2 = cdf(cp * d2)
+
+    price = cp * (f * cdf1 - k * cdf2) * discount
+    delta = cp * cdf1 * discount * f * 0.01
+    gamma = discount * pdf1 / (f * vt) * f * f * 0.0001
+    theta = (-0.5 * discount * f * pdf1 * v / sqrtT + r * price) / 240
+    vega = discount * f * pdf1 * sqrtT / 100
+    return price, delta, gamma, theta, vega
+
+#----------------------------------------------------------------------
+def calculateImpv(price, f, k, r, t, cp):
+    """计算隐含波动率"""
+    # 检查期权价格必须为正数
+    if price <= 0 or t <= 0:
+        return 0
+
+    # 检查期权价格是否满足最小价值（即到期行权价值）
+    meet = False
+
+    if cp == 1 and (price > (f - k) * exp(-r * t)):
+        meet = True
+    elif cp == -1 and (price > k - f):
+        meet = True
+
+    # 若不满足最小价值，则直接返回0
+    if not meet:
+        return 0
+
+    # 采用Newton Raphson方法计算隐含波动率，期权价格随波动率单调递增，
+    # 因此每次迭代后可以缩小波动率所在的区间
+    v = 0.3     # 初始波动率猜测
+    lower = VOL_MIN
+    upper = VOL_MAX
+
+    for i in range(MAX_ITERATION):
+        # 计算当前猜测波动率对应的期权价格和vega值
+        p = calculatePrice(f, k, r, t, v, cp)
+        vega = calculateOriginalVega(f, k, r, t, v, cp)
+
+        # 更新波动率区间
+        if p < price:
+            lower = v
+        else:
+            upper = v
+
+        # 检查误差是否满足要求，若满足则跳出循环
+        if vega:
+            dx = (price - p) / vega
+            if abs(dx) < DX_TARGET:
+                break
+
+        if upper - lower < DX_TARGET:
+            break
+
+        # 计算新一轮猜测的波动率，如果vega为0或者超出区间，则改用二分法
+        if vega and lower < v + dx < upper:
+            v += dx
+        else:
+            v = (lower + upper) / 2
+
+    # 检查波动率计算结果非负
+    if v <= 0:
+        return 0
+
+    # 保留4位小数
+    v = round(v, 4)
+
+    return v
+
+#----------------------------------------------------------------------
+def calculateGreeksBatch(f, k, r, t, v, cp):
+    """
+    批量计算期权的价格和希腊值
+    参数可以是数值或者numpy数组（需要能够互相广播），返回price, delta, gamma, theta, vega数组
+    """
+    f, k, r, t, v, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                              for x in (f, k, r, t, v, cp)])
+
+    # 波动率或者剩余时间为0的期权，价格为空间价值，希腊值为0
+    valid = (v > 0) & (t > 0)
+
+    with np.errstate(all='ignore'):
+        sqrtT = np.sqrt(t)
+        vt = v * sqrtT
+        d1 = (np.log(f / k) + 0.5 * v * v * t) / vt
+        d2 = d1 - vt
+        discount = np.exp(-r * t)
+        pdf1 = np.exp(-0.5 * d1 * d1) * INV_SQRT_2PI
+        cdf1 = ndtr(cp * d1)
+        cdf2 = ndtr(cp * d2)
+
+        price = cp * (f * cdf1 - k * cdf2) * discount
+        delta = cp * cdf1 * discount * f * 0.01
+        gamma = discount * pdf1 / (f * vt) * f * f * 0.0001
+        theta = (-0.5 * discount * f * pdf1 * v / sqrtT + r * price) / 240
+        vega = discount * f * pdf1 * sqrtT / 100
+
+    price = np.where(valid, price, np.maximum(0, cp * (f - k)))
+    delta = np.where(valid, delta, 0)
+    gamma = np.where(valid, gamma, 0)
+    theta = np.where(valid, theta, 0)
+    vega = np.where(valid, vega, 0)
+
+    return price, delta, gamma, theta, vega
+
+#----------------------------------------------------------------------
+def calculateImpvBatch(price, f, k, r, t, cp):
+    """
+    批量计算隐含波动率
+    参数可以是数值或者numpy数组（需要能够互相广播），返回隐含波动率数组，
+    计算方法和结果与calculateImpv一致
+    """
+    price, f, k, r, t, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                                  for x in (price, f, k, r, t, cp)])
+    impv = np.zeros(price.shape)
+
+    # 检查期权价格必须为正数，且满足最小价值（即到期行权价值）
+    with np.errstate(all='ignore'):
+        discount = np.exp(-r * t)
+        meet = ((price > 0) & (t > 0) &
+                np.where(cp == 1, price > (f - k) * discount, price > k - f))
+
+    # 只对需要计算的期权进行迭代，已完成的期权从数组中移除
+    index = np.flatnonzero(meet)
+    price = price.ravel()[index]
+    f = f.ravel()[index]
+    k = k.ravel()[index]
+    t = t.ravel()[index]
+    cp = cp.ravel()[index]
+    discount = discount.ravel()[index]
+    sqrtT = np.sqrt(t)
+
+    # 采用Newton Raphson方法计算隐含波动率，超出区间时改用二分法
+    v = np.full(index.size, 0.3)     # 初始波动率猜测
+    lower = np.full(index.size, float(VOL_MIN))
+    upper = np.full(index.size, float(VOL_MAX))
+
+    with np.errstate(all='ignore'):
+        for i in range(MAX_ITERATION):
+            if not index.size:
+                break
+
+            # 计算当前猜测波动率对应的期权价格和vega值
+            vt = v * sqrtT
+            d1 = (np.log(f / k) + 0.5 * v * v * t) / vt
+            p = cp * (f * ndtr(cp * d1) - k * ndtr(cp * (d1 - vt))) * discount
+            vega = discount * f * np.exp(-0.5 * d1 * d1) * INV_SQRT_2PI * sqrtT
+
+            # 更新波动率区间
+            below = p < price
+            lower = np.where(below, v, lower)
+            upper = np.where(below, upper, v)
+
+            # 计算误差，误差满足要求或者区间足够小的期权完成计算
+            dx = (price - p) / vega
+            finished = (np.abs(dx) < DX_TARGET) | (upper - lower < DX_TARGET)
+
+            if finished.any():
+                impv.ravel()[index[finished]] = v[finished]
+
+                left = ~finished
+                index = index[left]
+                price = price[left]
+                f = f[left]
+                k = k[left]
+                t = t[left]
+                cp = cp[left]
+                discount = discount[left]
+                sqrtT = sqrtT[left]
+                v = v[left]
+                dx = dx[left]
+                lower = lower[left]
+                upper = upper[left]
+
+            # 计算新一轮猜测的波动率，超出区间（或者vega为0）时改用二分法
+            newV = v + dx
+            inside = (newV > lower) & (newV < upper)
+            v = np.where(inside, newV, (lower + upper) / 2)
+
+    impv.ravel()[index] = v
+
+    # 检查波动率计算结果非负，并保留4位小数
+    impv[~(impv > 0)] = 0
+    impv = np.round(impv, 4)
+
+    return impv
@@ -12,11 +12,12 @@ r：无风险利率
 t：剩余到期时间（年）
 v：隐含波动率
 cp：期权类型，+1/-1对应call/put
-n: 二叉树高度
+n: 二叉树高度，不传入时使用STEPS（可以通过setSteps修改）
 price：期权价格
 
-出于开发演示的目的，本文件中的希腊值计算基于简单数值差分法，
-运算效率一般，实盘中建议使用更高速的算法。
+二叉树倒推时只保存当前一层的节点数组，每一步对所有节点（以及批量计算时的
+所有期权）进行向量化计算。delta、gamma、theta直接从同一棵树的前两层节点读取，
+vega通过波动率上下变动的两棵树计算，这两棵树和原始树在同一次批量倒推中完成。
 
 本文件中的希腊值计算结果没有采用传统的模型价格数值，而是采用
 了实盘交易中更为实用的百分比变动数值，具体定义如下
@@ -27,7 +28,6 @@ vega：当v涨跌1个点时，price的变动（如从16%涨到17%）
 '''
 
 import numpy as np
-from math import (isnan, exp, sqrt, pow)
 
 
 # 计算希腊值和隐含波动率时用的参数
@@ -38,144 +38,318 @@ STEP_DIFF = STEP_CHANGE * 2
 
 DX_TARGET = 0.00001
 
+# 二叉树高度，计算gamma和theta至少需要2层
+STEPS = 15
+MIN_STEPS = 2
 
 
 #----------------------------------------------------------------------
-def generateTree(f, k, r, t, v, cp, n):
-    """生成二叉树"""
-    dt = t / n 
-    u = exp(v * sqrt(dt))
+def setSteps(n):
+    """设置默认的二叉树高度"""
+    global STEPS
+    STEPS = max(int(n), MIN_STEPS)
+
+#----------------------------------------------------------------------
+def calculateTree(f, k, t, v, cp, n=None):
+    """
+    批量倒推二叉树，参数为长度相同的一维数组
+    返回期权价格，以及从树上读取的原始delta、gamma和theta（每年）数组
+    """
+    n = max(n or STEPS, MIN_STEPS)
+
+    # 剩余时间或者波动率为0的期权无法建树，价格为空间价值，希腊值为0
+    valid = (t > 0) & (v > 0)
+    if not valid.all():
+        t = np.where(valid, t, 1)
+        v = np.where(valid, v, 1)
+
+    dt = t / n
+    u = np.exp(v * np.sqrt(dt))
+    d = 1 / u
+
+    # 计算风险平价概率（针对期货期权a为1）
+    p = (1 - d) / (u - d)
+
+    u = u[:, None]
+    d = d[:, None]
+    p1 = p[:, None]
+    p2 = 1 - p1
+    k = k[:, None]
+    cp = cp[:, None]
+
+    # 到期时的标的价格和期权价值，第j个节点为f * u^(n-j) * d^j
+    uArray = f[:, None] * u ** (n - 2 * np.arange(n+1))
+    oArray = np.maximum(cp * (uArray - k), 0)
+
+    # 二叉树高度为2时，到期层即为第2层，倒推循环中不会经过
+    if n == 2:
+        u2 = uArray
+        o2 = oArray
+
+    # 向前倒推，每一层的标的价格等于下一层对应节点乘以d
+    for i in range(n-1, -1, -1):
+        uArray = uArray[:, :i+1] * d
+        oArray = np.maximum(p1 * oArray[:, :i+1] + p2 * oArray[:, 1:i+2],     # 美式期权存续价值
+                            cp * (uArray - k))                                # 美式期权行权价值
+
+        if i == 2:
+            u2 = uArray
+            o2 = oArray
+        elif i == 1:
+            u1 = uArray
+            o1 = oArray
+
+    price = oArray[:, 0]
+
+    # 第1层计算delta，第2层计算gamma，第2层中间节点（标的价格不变）计算theta
+    delta = (o1[:, 0] - o1[:, 1]) / (u1[:, 0] - u1[:, 1])
+
+    deltaUp = (o2[:, 0] - o2[:, 1]) / (u2[:, 0] - u2[:, 1])
+    deltaDown = (o2[:, 1] - o2[:, 2]) / (u2[:, 1] - u2[:, 2])
+    gamma = (deltaUp - deltaDown) / ((u2[:, 0] - u2[:, 2]) / 2)
+
+    theta = (o2[:, 1] - price) / (2 * dt)
+
+    if not valid.all():
+        price = np.where(valid, price, np.maximum(cp[:, 0] * (f - k[:, 0]), 0))
+        delta = np.where(valid, delta, 0)
+        gamma = np.where(valid, gamma, 0)
+        theta = np.where(valid, theta, 0)
+
+    return price, delta, gamma, theta
+
+#----------------------------------------------------------------------
+def generateTree(f, k, r, t, v, cp, n=None):
+    """生成完整的二叉树，返回期权树和标的物树（第j行第i列为第i层的第j个节点）"""
+    n = n or STEPS
+    dt = t / n
+    u = np.exp(v * np.sqrt(dt))
     d = 1 / u
-    a = 1                       # 针对期货期权a应当设为1
-    uTree = np.zeros((n+1,n+1))
-    oTree = np.zeros((n+1,n+1))
-
-    # 计算风险平价概率
-    p = (a - d) / (u - d)
-    p1 = p / a
-    p2 = (1 - p) / a
-    
-    # 计算标的树
-    uTree[0, 0] = f
-
-    for i in range(1, n+1):
-        uTree[0, i] = uTree[0, i-1] * u
-        for j in range(1, i+1):
-            uTree[j, i] = uTree[j-1, i-1] * d
+    p1 = (1 - d) / (u - d)
+    p2 = 1 - p1
+
+    # 计算标的树，第i层第j个节点为f * u^(i-j) * d^j
+    i = np.arange(n+1)
+    j = i[:, None]
+    uTree = np.where(j <= i, f * u ** (i - 2 * j), 0)
+    oTree = np.zeros((n+1, n+1))
 
     # 计算期权树
-    for j in range(n+1):
-        oTree[j, n] = max(0, cp * (uTree[j, n]-k))
+    oTree[:, n] = np.maximum(cp * (uTree[:, n] - k), 0)
 
-    for i in range(n-1,-1,-1):
-        for j in range(i+1):
-            oTree[j, i] = max((p1 * oTree[j, i+1] + p2 * oTree[j+1, i+1]),    # 美式期权存续价值
-                               cp * (uTree[j, i] - k))                        # 美式期权行权价值
+    for i in range(n-1, -1, -1):
+        oTree[:i+1, i] = np.maximum(p1 * oTree[:i+1, i+1] + p2 * oTree[1:i+2, i+1],
+                                    cp * (uTree[:i+1, i] - k))
 
     # 返回期权树和标的物树结果
     return oTree, uTree
-    
+
 #----------------------------------------------------------------------
-def calculatePrice(f, k, r, t, v, cp, n=15):
+def calculatePrice(f, k, r, t, v, cp, n=None):
     """计算期权价格"""
-    oTree, uTree = generateTree(f, k, r, t, v, cp, n)
-    return oTree[0, 0]
+    price, delta, gamma, theta = calculateTree(np.array([f], dtype=float),
+                                               np.array([k], dtype=float),
+                                               np.array([t], dtype=float),
+                                               np.array([v], dtype=float),
+                                               np.array([cp], dtype=float), n)
+    return float(price[0])
 
 #----------------------------------------------------------------------
-def calculateDelta(f, k, r, t, v, cp, n=15):
+def calculateTreeGreeks(f, k, r, t, v, cp, n=None):
+    """计算期权价格以及从树上读取的delta、gamma和theta（百分比变动数值）"""
+    price, delta, gamma, theta = calculateTree(np.array([f], dtype=float),
+                                               np.array([k], dtype=float),
+                                               np.array([t], dtype=float),
+                                               np.array([v], dtype=float),
+                                               np.array([cp], dtype=float), n)
+
+    delta = float(delta[0]) * f * 0.01
+    gamma = float(gamma[0]) * pow(f, 2) * 0.0001
+    theta = float(theta[0]) / 240
+    return float(price[0]), delta, gamma, theta
+
+#----------------------------------------------------------------------
+def calculateDelta(f, k, r, t, v, cp, n=None):
     """计算Delta值"""
-    price1 = calculatePrice(f*STEP_UP, k, r, t, v, cp, n)
-    price2 = calculatePrice(f*STEP_DOWN, k, r, t, v, cp, n)
-    delta = (price1 - price2) / (f * STEP_DIFF) * (f * 0.01)
-    return delta
+    return calculateTreeGreeks(f, k, r, t, v, cp, n)[1]
 
 #----------------------------------------------------------------------
-def calculateGamma(f, k, r, t, v, cp, n=15):
+def calculateGamma(f, k, r, t, v, cp, n=None):
     """计算Gamma值"""
-    delta1 = calculateDelta(f*STEP_UP, k, r, t, v, cp, n)
-    delta2 = calculateDelta(f*STEP_DOWN, k, r, t, v, cp, n)
-    gamma = (delta1 - delta2) / (f * STEP_DIFF) * pow(f, 2) * 0.0001
-    return gamma
+    return calculateTreeGreeks(f, k, r, t, v, cp, n)[2]
 
 #----------------------------------------------------------------------
-def calculateTheta(f, k, r, t, v, cp, n=15):
+def calculateTheta(f, k, r, t, v, cp, n=None):
     """计算Theta值"""
-    price1 = calculatePrice(f, k, r, t*STEP_UP, v, cp, n)
-    price2 = calculatePrice(f, k, r, t*STEP_DOWN, v, cp, n)
-    theta = -(price1 - price2) / (t * STEP_DIFF * 240)
-    return theta
+    return calculateTreeGreeks(f, k, r, t, v, cp, n)[3]
 
 #----------------------------------------------------------------------
-def calculateVega(f, k, r, t, v, cp, n=15):
+def calculateVega(f, k, r, t, v, cp, n=None):
     """计算Vega值"""
     vega = calculateOriginalVega(f, k, r, t, v, cp, n) / 100
     return vega
 
 #----------------------------------------------------------------------
-def calculateOriginalVega(f, k, r, t, v, cp, n=15):
-    """计算原始vega值"""    
-    price1 = calculatePrice(f, k, r, t, v*STEP_UP, cp, n)
-    price2 = calculatePrice(f, k, r, t, v*STEP_DOWN, cp, n)
-    vega = (price1 - price2) / (v * STEP_DIFF)
-    return vega
+def calculateOriginalVega(f, k, r, t, v, cp, n=None):
+    """计算原始vega值"""
+    price, delta, gamma, theta = calculateTree(np.array([f, f], dtype=float),
+                                               np.array([k, k], dtype=float),
+                                               np.array([t, t], dtype=float),
+                                               np.array([v*STEP_UP, v*STEP_DOWN], dtype=float),
+                                               np.array([cp, cp], dtype=float), n)
+    vega = (price[0] - price[1]) / (v * STEP_DIFF)
+    return float(vega)
 
 #----------------------------------------------------------------------
-def calculateGreeks(f, k, r, t, v, cp, n=15):
+def calculateGreeks(f, k, r, t, v, cp, n=None):
     """计算期权的价格和希腊值"""
-    price = calculatePrice(f, k, r, t, v, cp, n)
-    delta = calculateDelta(f, k, r, t, v, cp, n)
-    gamma = calculateGamma(f, k, r, t, v, cp, n)
-    theta = calculateTheta(f, k, r, t, v, cp, n)
-    vega = calculateVega(f, k, r, t, v, cp, n)
+    price, delta, gamma, theta, vega = calculateGreeksBatch(f, k, r, t, v, cp, n)
+    return float(price), float(delta), float(gamma), float(theta), float(vega)
+
+#----------------------------------------------------------------------
+def calculateGreeksBatch(f, k, r, t, v, cp, n=None):
+    """
+    批量计算期权的价格和希腊值
+    参数可以是数值或者numpy数组（需要能够互相广播），返回price, delta, gamma, theta, vega数组
+    """
+    f, k, r, t, v, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                              for x in (f, k, r, t, v, cp)])
+    shape = f.shape
+    f, k, t, v, cp = [x.ravel() for x in (f, k, t, v, cp)]
+
+    # 原始树和波动率上下变动的两棵树一起倒推
+    price, delta, gamma, theta = calculateTree(np.tile(f, 3),
+                                               np.tile(k, 3),
+                                               np.tile(t, 3),
+                                               np.concatenate([v, v*STEP_UP, v*STEP_DOWN]),
+                                               np.tile(cp, 3), n)
+
+    m = f.size
+    with np.errstate(all='ignore'):
+        vega = np.where(v > 0, (price[m:2*m] - price[2*m:]) / (v * STEP_DIFF) / 100, 0)
+
+    price = price[:m].reshape(shape)
+    delta = (delta[:m] * f * 0.01).reshape(shape)
+    gamma = (gamma[:m] * f * f * 0.0001).reshape(shape)
+    theta = (theta[:m] / 240).reshape(shape)
+    vega = vega.reshape(shape)
+
     return price, delta, gamma, theta, vega
 
 #----------------------------------------------------------------------
-def calculateImpv(price, f, k, r, t, cp, n=15):
+def calculateImpv(price, f, k, r, t, cp, n=None):
     """计算隐含波动率"""
-    # 检查期权价格必须为正数
-    if price <= 0:
+    # 检查期权价格必须为正数，且期权尚未到期（和批量计算一致）
+    if price <= 0 or t <= 0:
         return 0
-    
+
     # 检查期权价格是否满足最小价值（即到期行权价值）
     meet = False
-    
+
     if cp == 1 and price > (f - k):
         meet = True
     elif cp == -1 and price > (k - f):
         meet = True
-    
+
     # 若不满足最小价值，则直接返回0
     if not meet:
         return 0
-    
+
     # 采用Newton Raphson方法计算隐含波动率
     v = 0.3     # 初始波动率猜测
-    
+
     for i in range(50):
         # 计算当前猜测波动率对应的期权价格和vega值
         p = calculatePrice(f, k, r, t, v, cp, n)
-        
+
         vega = calculateOriginalVega(f, k, r, t, v, cp, n)
-        
+
         # 如果vega过小接近0，则直接返回
         if not vega:
             break
-        
+
         # 计算误差
         dx = (price - p) / vega
-        
+
         # 检查误差是否满足要求，若满足则跳出循环
         if abs(dx) < DX_TARGET:
             break
-        
+
         # 计算新一轮猜测的波动率
         v += dx
-        
+
     # 检查波动率计算结果非负
     if v <= 0:
         return 0
-    
+
     # 保留4位小数
     v = round(v, 4)
-    
+
     return v
+
+#----------------------------------------------------------------------
+def calculateImpvBatch(price, f, k, r, t, cp, n=None):
+    """
+    批量计算隐含波动率
+    参数可以是数值或者numpy数组（需要能够互相广播），返回隐含波动率数组，
+    计算方法和结果与calculateImpv一致
+    """
+    price, f, k, r, t, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                                  for x in (price, f, k, r, t, cp)])
+    impv = np.zeros(price.shape)
+
+    # 检查期权价格必须为正数，且满足最小价值（即到期行权价值）
+    meet = (price > 0) & (t > 0) & (price > cp * (f - k))
+
+    # 只对需要计算的期权进行迭代，已完成的期权从数组中移除
+    index = np.flatnonzero(meet)
+    price = price.ravel()[index]
+    f = f.ravel()[index]
+    k = k.ravel()[index]
+    t = t.ravel()[index]
+    cp = cp.ravel()[index]
+
+    # 采用Newton Raphson方法计算隐含波动率
+    v = np.full(index.size, 0.3)     # 初始波动率猜测
+
+    with np.errstate(all='ignore'):
+        for i in range(50):
+            if not index.size:
+                break
+
+            # 计算当前猜测波动率以及上下变动后对应的期权价格，从而得到vega值
+            m = index.size
+            p, delta, gamma, theta = calculateTree(np.tile(f, 3),
+                                                   np.tile(k, 3),
+                                                   np.tile(t, 3),
+                                                   np.concatenate([v, v*STEP_UP, v*STEP_DOWN]),
+                                                   np.tile(cp, 3), n)
+            vega = (p[m:2*m] - p[2*m:]) / (v * STEP_DIFF)
+
+            # 计算误差，vega过小接近0或者误差满足要求的期权完成计算
+            dx = (price - p[:m]) / vega
+            finished = (vega == 0) | ~(np.abs(dx) >= DX_TARGET)
+
+            if finished.any():
+                impv.ravel()[index[finished]] = v[finished]
+
+                left = ~finished
+                index = index[left]
+                price = price[left]
+                f = f[left]
+                k = k[left]
+                t = t[left]
+                cp = cp[left]
+                v = v[left]
+                dx = dx[left]
+
+            # 计算新一轮猜测的波动率
+            v += dx
+
+    impv.ravel()[index] = v
+
+    # 检查波动率计算结果非负，并保留4位小数
+    impv[~(impv > 0)] = 0
+    impv = np.round(impv, 4)
+
+    return impv
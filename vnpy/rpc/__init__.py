@@ -1,3 +1,4 @@
 # encoding: UTF-8
 
-from .vnrpc import RpcServer, RpcClient, RemoteException
\ No newline at end of file
+from .vnrpc import (RpcServer, RpcClient, RpcFuture, RemoteException, RemoteTimeoutException,
+                    registerCompactClass)
\ No newline at end of file
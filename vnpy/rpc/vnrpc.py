@@ -3,10 +3,16 @@
 import threading
 import traceback
 import signal
+from Queue import Queue, Empty
+from itertools import count
+from heapq import heappush, heappop
+from timeit import default_timer
 
 import zmq
-from msgpack import packb, unpackb
+from msgpack import packb, unpackb, ExtType
 from json import dumps, loads
+from datetime import datetime, date
+from struct import Struct
 
 import cPickle
 pDumps = cPickle.dumps
@@ -17,6 +23,92 @@ pLoads = cPickle.loads
 signal.signal(signal.SIGINT, signal.SIG_DFL)
 
 
+# 紧凑格式中使用的msgpack扩展类型
+EXT_PICKLE = 0          # 无法直接打包的对象，使用cPickle
+EXT_DATETIME = 2        # datetime
+EXT_DATE = 3            # date
+
+datetimeStruct = Struct('>HBBBBBI')
+dateStruct = Struct('>HBB')
+
+# 紧凑格式中数据类对象打包为只有该键的字典，值为[类名, 字段值列表]
+COMPACT_OBJECT_KEY = '__compact__'
+
+# 紧凑格式注册的数据类，key是类名，value是(类, 字段名列表)
+compactClassDict = {}
+
+
+#----------------------------------------------------------------------
+def registerCompactClass(cls):
+    """
+    注册紧凑格式下只传送字段值的数据类
+    
+    字段名列表根据无参数创建的对象确定，因此收发双方使用的类定义必须一致，
+    只支持新式类（Python 2中需要继承object）
+    """
+    if not isinstance(cls, type):
+        raise TypeError(u'%s不是新式类，无法注册为紧凑格式数据类' %cls.__name__)
+    
+    fields = sorted(cls().__dict__.keys())
+    compactClassDict[cls.__name__] = (cls, fields)
+
+#----------------------------------------------------------------------
+def compactDefault(obj):
+    """
+    紧凑格式打包msgpack无法处理的对象
+    
+    返回的对象由msgpack继续打包，避免在打包过程中嵌套调用packb（开销较大）
+    """
+    # 注册过的数据类只打包字段值，存在额外属性的对象使用cPickle保证数据完整
+    name = obj.__class__.__name__
+    if name in compactClassDict:
+        cls, fields = compactClassDict[name]
+        d = obj.__dict__
+        
+        if obj.__class__ is cls and len(d) == len(fields):
+            return {COMPACT_OBJECT_KEY: [name, [d[field] for field in fields]]}
+    
+    if isinstance(obj, datetime):
+        data = datetimeStruct.pack(obj.year, obj.month, obj.day, obj.hour, 
+                                   obj.minute, obj.second, obj.microsecond)
+        return ExtType(EXT_DATETIME, data)
+    
+    if isinstance(obj, date):
+        return ExtType(EXT_DATE, dateStruct.pack(obj.year, obj.month, obj.day))
+    
+    return ExtType(EXT_PICKLE, pDumps(obj, 2))
+
+#----------------------------------------------------------------------
+def compactObjectHook(d):
+    """紧凑格式解包字典，还原数据类对象"""
+    if COMPACT_OBJECT_KEY not in d or len(d) != 1:
+        return d
+    
+    name, values = d[COMPACT_OBJECT_KEY]
+    cls, fields = compactClassDict[name]
+    
+    if len(values) != len(fields):
+        raise ValueError(u'%s字段数量%s和本地定义%s不一致' %(name, len(values), len(fields)))
+    
+    obj = cls.__new__(cls)
+    obj.__dict__ = dict(zip(fields, values))
+    return obj
+
+#----------------------------------------------------------------------
+def compactExtHook(code, data):
+    """紧凑格式解包扩展类型"""
+    if code == EXT_DATETIME:
+        return datetime(*datetimeStruct.unpack(data))
+    
+    if code == EXT_DATE:
+        return date(*dateStruct.unpack(data))
+    
+    if code == EXT_PICKLE:
+        return pLoads(data)
+    
+    return ExtType(code, data)
+
+
 ########################################################################
 class RpcObject(object):
     """
@@ -27,6 +119,8 @@ class RpcObject(object):
     msgpack：性能更高，但通常需要安装msgpack相关工具；
     json：性能略低但通用性更好，大部分编程语言都内置了相关的库。
     cPickle：性能一般且仅能用于Python，但是可以直接传送Python对象，非常方便。
+    compact：基于msgpack，通过registerCompactClass注册的数据类只传送字段值，
+    其他对象使用cPickle，仅能用于Python，用于传送大量的数据类对象（如行情）。
 
     因此建议尽量使用msgpack，如果要和某些语言通讯没有提供msgpack时再使用json，
     当传送的数据包含很多自定义的Python对象时建议使用cPickle。
@@ -81,6 +175,16 @@ class RpcObject(object):
         """使用cPickle解包"""
         return pLoads(data)
 
+    #----------------------------------------------------------------------
+    def __compactPack(self, data):
+        """使用紧凑格式打包"""
+        return packb(data, default=compactDefault, use_bin_type=True)
+
+    #----------------------------------------------------------------------
+    def __compactUnpack(self, data):
+        """使用紧凑格式解包"""
+        return unpackb(data, object_hook=compactObjectHook, ext_hook=compactExtHook, raw=False)
+
     #----------------------------------------------------------------------
     def useJson(self):
         """使用json作为序列化工具"""
@@ -99,13 +203,28 @@ class RpcObject(object):
         self.pack = self.__picklePack
         self.unpack = self.__pickleUnpack
 
+    #----------------------------------------------------------------------
+    def useCompact(self):
+        """使用紧凑格式作为序列化工具"""
+        self.pack = self.__compactPack
+        self.unpack = self.__compactUnpack
+
 
 ########################################################################
 class RpcServer(RpcObject):
-    """RPC服务器"""
+    """
+    RPC服务器
+
+    使用ROUTER socket接收请求，请求放入队列后由工作线程池执行，执行结果通过
+    inproc socket交回服务器线程发出，因此一个耗时的调用不会阻塞其他客户端的请求。
+    同时兼容使用REQ socket的客户端。
+
+    workerCount为工作线程数量，默认为1（所有请求依次执行，和原有行为一致），
+    只有在注册的函数都是线程安全的情况下才能设置为大于1。
+    """
 
     #----------------------------------------------------------------------
-    def __init__(self, repAddress, pubAddress):
+    def __init__(self, repAddress, pubAddress, workerCount=1):
         """Constructor"""
         super(RpcServer, self).__init__()
 
@@ -115,15 +234,26 @@ class RpcServer(RpcObject):
         # zmq端口相关
         self.__context = zmq.Context()
 
-        self.__socketREP = self.__context.socket(zmq.REP)   # 请求回应socket
-        self.__socketREP.bind(repAddress)
+        self.__socketROUTER = self.__context.socket(zmq.ROUTER)     # 请求回应socket
+        self.__socketROUTER.bind(repAddress)
 
-        self.__socketPUB = self.__context.socket(zmq.PUB)   # 数据广播socket
+        self.__socketPUB = self.__context.socket(zmq.XPUB)          # 数据广播socket，可以收到订阅消息
         self.__socketPUB.bind(pubAddress)
+        self.__publishLock = threading.Lock()                       # 广播socket的线程锁
+
+        self.__subscriptionSet = set()      # 客户端订阅的主题前缀
+        self.__subscriberDict = {}          # 主题:是否有客户端订阅，订阅变化时清空
+
+        self.__backendAddress = 'inproc://rpcBackend%s' %id(self)   # 工作线程返回结果的地址
+        self.__socketBackend = self.__context.socket(zmq.PULL)
+        self.__socketBackend.bind(self.__backendAddress)
 
         # 工作线程相关
         self.__active = False                             # 服务器的工作状态
-        self.__thread = threading.Thread(target=self.run) # 服务器的工作线程
+        self.__thread = threading.Thread(target=self.run) # 服务器的收发线程
+        self.__queue = Queue()                            # 待执行的请求队列
+        self.__workers = [threading.Thread(target=self.runWorker)
+                          for i in range(max(workerCount, 1))]     # 工作线程池
 
     #----------------------------------------------------------------------
     def start(self):
@@ -135,6 +265,10 @@ class RpcServer(RpcObject):
         if not self.__thread.isAlive():
             self.__thread.start()
 
+        for worker in self.__workers:
+            if not worker.isAlive():
+                worker.start()
+
     #----------------------------------------------------------------------
     def stop(self, join=False):
         """停止服务器"""
@@ -142,39 +276,75 @@ class RpcServer(RpcObject):
         self.__active = False
 
         # 等待工作线程退出
-        if join and self.__thread.isAlive():
-            self.__thread.join()
+        if join:
+            for thread in [self.__thread] + self.__workers:
+                if thread.isAlive():
+                    thread.join()
 
     #----------------------------------------------------------------------
     def run(self):
-        """服务器运行函数"""
+        """服务器运行函数，负责收取请求和发出调用结果"""
+        poller = zmq.Poller()
+        poller.register(self.__socketROUTER, zmq.POLLIN)
+        poller.register(self.__socketBackend, zmq.POLLIN)
+
         while self.__active:
             # 使用poll来等待事件到达，等待1秒（1000毫秒）
-            if not self.__socketREP.poll(1000):
-                continue
+            events = dict(poller.poll(1000))
+
+            # 收到的请求（包括客户端地址信封）放入队列，由工作线程执行
+            if self.__socketROUTER in events:
+                frames = self.__socketROUTER.recv_multipart()
+                self.__queue.put(frames)
+
+            # 工作线程的执行结果，通过ROUTER发回对应的客户端
+            if self.__socketBackend in events:
+                frames = self.__socketBackend.recv_multipart()
+                self.__socketROUTER.send_multipart(frames)
+
+    #----------------------------------------------------------------------
+    def runWorker(self):
+        """工作线程运行函数，负责执行调用"""
+        # zmq的socket不是线程安全的，每个工作线程使用独立的socket返回结果
+        socket = self.__context.socket(zmq.PUSH)
+        socket.connect(self.__backendAddress)
 
-            # 从请求响应socket收取请求数据
-            reqb = self.__socketREP.recv()
+        while self.__active:
+            try:
+                frames = self.__queue.get(timeout=1)
+            except Empty:
+                continue
 
-            # 序列化解包
-            req = self.unpack(reqb)
+            # 最后一帧为请求数据，之前为客户端地址信封
+            envelope = frames[:-1]
+            reqb = frames[-1]
 
-            # 获取函数名和参数
-            name, args, kwargs = req
+            # 获取函数名、参数以及请求编号（REQ客户端的请求没有编号），执行调用，
+            # 如果有异常则捕捉后返回
+            reqID = None
 
-            # 获取引擎中对应的函数对象，并执行调用，如果有异常则捕捉后返回
             try:
+                req = self.unpack(reqb)
+                name, args, kwargs = req[:3]
+                if len(req) > 3:
+                    reqID = req[3]
+
                 func = self.__functions[name]
                 r = func(*args, **kwargs)
                 rep = [True, r]
             except Exception as e:
                 rep = [False, traceback.format_exc()]
 
+            if reqID is not None:
+                rep.append(reqID)
+
             # 序列化打包
             repb = self.pack(rep)
 
-            # 通过请求响应socket返回调用结果
-            self.__socketREP.send(repb)
+            # 交由收发线程返回调用结果
+            socket.send_multipart(envelope + [repb])
+
+        socket.close()
 
     #----------------------------------------------------------------------
     def publish(self, topic, data):
@@ -187,7 +357,58 @@ class RpcServer(RpcObject):
         datab = self.pack(data)
 
         # 通过广播socket发送数据
-        self.__socketPUB.send_multipart([topic, datab])
+        with self.__publishLock:
+            self.__socketPUB.send_multipart([topic, datab])
+
+    #----------------------------------------------------------------------
+    def publishMultipart(self, topic, dataList):
+        """
+        将同一主题的多个数据作为一条多帧消息推送，客户端对每个数据分别调用回调函数
+        topic：主题内容（注意必须是ascii编码）
+        dataList：数据列表
+        """
+        frames = [topic]
+        frames.extend([self.pack(data) for data in dataList])
+
+        with self.__publishLock:
+            self.__socketPUB.send_multipart(frames)
+
+    #----------------------------------------------------------------------
+    def hasSubscriber(self, topic):
+        """
+        检查是否有客户端订阅了该主题，用于在打包数据之前跳过没有订阅的主题
+        
+        zmq会在广播socket中过滤没有订阅的主题，该函数只是为了节省序列化的开销
+        """
+        with self.__publishLock:
+            self.updateSubscription()
+
+            subscribed = self.__subscriberDict.get(topic)
+            if subscribed is None:
+                subscribed = any(topic.startswith(prefix) for prefix in self.__subscriptionSet)
+                self.__subscriberDict[topic] = subscribed
+
+        return subscribed
+
+    #----------------------------------------------------------------------
+    def updateSubscription(self):
+        """
+        处理广播socket收到的订阅消息，首字节为1表示订阅，0表示取消订阅，之后为主题前缀
+
+        zmq只在第一个客户端订阅和最后一个客户端取消订阅（包括断开连接）时发出消息
+        """
+        socket = self.__socketPUB
+
+        while socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            msg = socket.recv()
+            prefix = msg[1:]
+
+            if msg[:1] == b'\x01':
+                self.__subscriptionSet.add(prefix)
+            else:
+                self.__subscriptionSet.discard(prefix)
+
+            self.__subscriberDict.clear()
 
     #----------------------------------------------------------------------
     def register(self, func):
@@ -195,12 +416,66 @@ class RpcServer(RpcObject):
         self.__functions[func.__name__] = func
 
 
+########################################################################
+class RpcFuture(object):
+    """远程调用的结果对象"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, reqID, name):
+        """Constructor"""
+        self.reqID = reqID          # 请求编号
+        self.name = name            # 调用的函数名
+
+        self.__event = threading.Event()
+        self.__result = None
+        self.__exception = None
+
+    #----------------------------------------------------------------------
+    def setResult(self, result):
+        """设置调用结果"""
+        self.__result = result
+        self.__event.set()
+
+    #----------------------------------------------------------------------
+    def setException(self, exception):
+        """设置调用异常"""
+        self.__exception = exception
+        self.__event.set()
+
+    #----------------------------------------------------------------------
+    def done(self):
+        """是否已经完成"""
+        return self.__event.is_set()
+
+    #----------------------------------------------------------------------
+    def result(self, timeout=None):
+        """
+        等待并返回调用结果，调用失败则触发异常
+        timeout：最长等待时间（秒），为空则等待到调用完成或者超时
+        """
+        if not self.__event.wait(timeout):
+            raise RemoteTimeoutException(u'等待调用%s结果超时' %self.name)
+
+        if self.__exception:
+            raise self.__exception
+
+        return self.__result
+
+
 ########################################################################
 class RpcClient(RpcObject):
-    """RPC客户端"""
+    """
+    RPC客户端
+
+    使用DEALER socket发出请求，每个请求带有编号，可以同时发出多个请求而不必等待前一个返回。
+    callAsync返回RpcFuture对象，直接调用远程函数（如client.add(1, 3)）则会阻塞等待结果。
+
+    timeout为调用超时时间（秒），为空则一直等待。调用超时后RpcFuture触发RemoteTimeoutException，
+    并在没有其他未完成的调用时重建DEALER socket，丢弃服务器断线期间积压的请求。
+    """
 
     #----------------------------------------------------------------------
-    def __init__(self, reqAddress, subAddress):
+    def __init__(self, reqAddress, subAddress, timeout=None):
         """Constructor"""
         super(RpcClient, self).__init__()
 
@@ -209,45 +484,68 @@ class RpcClient(RpcObject):
         self.__subAddress = subAddress
 
         self.__context = zmq.Context()
-        self.__socketREQ = self.__context.socket(zmq.REQ)   # 请求发出socket
+        self.__socketDEALER = None                          # 请求发出socket，由请求线程创建
         self.__socketSUB = self.__context.socket(zmq.SUB)   # 广播订阅socket
 
-        # 工作线程相关，用于处理服务器推送的数据
+        # 各个线程发出的请求通过inproc socket交给请求线程发送
+        self.__requestAddress = 'inproc://rpcRequest%s' %id(self)
+        self.__socketPULL = self.__context.socket(zmq.PULL)
+        self.__socketPULL.bind(self.__requestAddress)
+        self.__socketPUSH = self.__context.socket(zmq.PUSH)
+        self.__socketPUSH.connect(self.__requestAddress)
+
+        # 请求相关
+        self.__timeout = timeout                # 调用超时时间（秒）
+        self.__reqCount = count(1)              # 请求编号
+        self.__futureDict = {}                  # 请求编号:RpcFuture
+        self.__deadlineHeap = []                # (超时时间, 请求编号)的最小堆
+        self.__timeoutOccurred = False          # 是否有请求超时，用于判断是否需要重建请求socket
+        self.__requestLock = threading.Lock()   # 请求发出相关的线程锁
+
+        # 工作线程相关
         self.__active = False                                   # 客户端的工作状态
-        self.__thread = threading.Thread(target=self.run)       # 客户端的工作线程
+        self.__thread = threading.Thread(target=self.run)       # 处理服务器推送数据的线程
+        self.__rpcThread = threading.Thread(target=self.runRpc) # 处理请求和回应的线程
 
     #----------------------------------------------------------------------
     def __getattr__(self, name):
         """实现远程调用功能"""
-        # 执行远程调用任务
+        # 执行远程调用任务，阻塞等待结果
         def dorpc(*args, **kwargs):
-            # 生成请求
-            req = [name, args, kwargs]
+            future = self.callAsync(name, *args, **kwargs)
+            return future.result()
 
-            # 序列化打包请求
-            reqb = self.pack(req)
+        return dorpc
 
-            # 发送请求并等待回应
-            self.__socketREQ.send(reqb)
-            repb = self.__socketREQ.recv()
+    #----------------------------------------------------------------------
+    def callAsync(self, name, *args, **kwargs):
+        """发出远程调用请求，不等待结果，返回RpcFuture对象"""
+        with self.__requestLock:
+            reqID = next(self.__reqCount)
 
-            # 序列化解包回应
-            rep = self.unpack(repb)
+            future = RpcFuture(reqID, name)
+            self.__futureDict[reqID] = future
 
-            # 若正常则返回结果，调用失败则触发异常
-            if rep[0]:
-                return rep[1]
-            else:
-                raise RemoteException(rep[1])
+            if self.__timeout:
+                heappush(self.__deadlineHeap, (default_timer() + self.__timeout, reqID))
 
-        return dorpc
+            # 序列化打包请求，请求编号附加在最后
+            reqb = self.pack([name, args, kwargs, reqID])
+            self.__socketPUSH.send(reqb)
+
+        return future
+
+    #----------------------------------------------------------------------
+    def setTimeout(self, timeout):
+        """设置调用超时时间（秒），为空则一直等待，只对之后发出的请求有效"""
+        self.__timeout = timeout
 
     #----------------------------------------------------------------------
     def start(self):
         """启动客户端"""
         # 连接端口
-        self.__socketREQ.connect(self.__reqAddress)
         self.__socketSUB.connect(self.__subAddress)
+        self.__socketDEALER = self.createDealer()
 
         # 将服务器设为启动
         self.__active = True
@@ -256,6 +554,9 @@ class RpcClient(RpcObject):
         if not self.__thread.isAlive():
             self.__thread.start()
 
+        if not self.__rpcThread.isAlive():
+            self.__rpcThread.start()
+
     #----------------------------------------------------------------------
     def stop(self):
         """停止客户端"""
@@ -266,6 +567,17 @@ class RpcClient(RpcObject):
         if self.__thread.isAlive():
             self.__thread.join()
 
+        if self.__rpcThread.isAlive():
+            self.__rpcThread.join()
+
+    #----------------------------------------------------------------------
+    def createDealer(self):
+        """创建并连接请求socket"""
+        socket = self.__context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.__reqAddress)
+        return socket
+
     #----------------------------------------------------------------------
     def run(self):
         """客户端运行函数"""
@@ -274,14 +586,106 @@ class RpcClient(RpcObject):
             if not self.__socketSUB.poll(1000):
                 continue
 
-            # 从订阅socket收取广播数据
-            topic, datab = self.__socketSUB.recv_multipart()
+            # 从订阅socket收取广播数据，多帧消息中第一帧为主题，之后每帧为一个数据
+            frames = self.__socketSUB.recv_multipart()
+            topic = frames[0]
+
+            for datab in frames[1:]:
+                # 序列化解包
+                data = self.unpack(datab)
+
+                # 调用回调函数处理
+                self.callback(topic, data)
+
+    #----------------------------------------------------------------------
+    def runRpc(self):
+        """请求线程运行函数，负责发出请求、收取回应以及检查超时"""
+        poller = zmq.Poller()
+        poller.register(self.__socketPULL, zmq.POLLIN)
+        poller.register(self.__socketDEALER, zmq.POLLIN)
+
+        while self.__active:
+            events = dict(poller.poll(self.getPollTimeout()))
+
+            # 发出其他线程提交的请求，空帧用于兼容REQ格式的信封
+            if self.__socketPULL in events:
+                reqb = self.__socketPULL.recv()
+                self.__socketDEALER.send_multipart([b'', reqb])
+
+            # 收取回应，根据请求编号设置对应的RpcFuture
+            if self.__socketDEALER in events:
+                repb = self.__socketDEALER.recv_multipart()[-1]
+                self.processReply(self.unpack(repb))
+
+            # 检查超时，需要时重建请求socket
+            if self.checkTimeout():
+                poller.unregister(self.__socketDEALER)
+                self.__socketDEALER.close()
+
+                self.__socketDEALER = self.createDealer()
+                poller.register(self.__socketDEALER, zmq.POLLIN)
+
+        # 客户端停止后，未完成的调用全部返回异常
+        with self.__requestLock:
+            futureList = list(self.__futureDict.values())
+            self.__futureDict.clear()
+            self.__deadlineHeap = []
+
+        for future in futureList:
+            future.setException(RemoteException(u'RPC客户端已停止'))
+
+    #----------------------------------------------------------------------
+    def processReply(self, rep):
+        """处理调用回应"""
+        with self.__requestLock:
+            future = self.__futureDict.pop(rep[2], None)
+
+        # 已经超时的请求，直接忽略
+        if not future:
+            return
+
+        # 若正常则设置结果，调用失败则设置异常
+        if rep[0]:
+            future.setResult(rep[1])
+        else:
+            future.setException(RemoteException(rep[1]))
+
+    #----------------------------------------------------------------------
+    def getPollTimeout(self):
+        """计算等待时间（毫秒），最长1秒，有请求即将超时则缩短"""
+        with self.__requestLock:
+            if not self.__deadlineHeap:
+                return 1000
 
-            # 序列化解包
-            data = self.unpack(datab)
+            remaining = self.__deadlineHeap[0][0] - default_timer()
 
-            # 调用回调函数处理
-            self.callback(topic, data)
+        return min(max(int(remaining * 1000) + 1, 0), 1000)
+
+    #----------------------------------------------------------------------
+    def checkTimeout(self):
+        """设置超时请求的异常，返回是否需要重建请求socket"""
+        now = default_timer()
+        timeoutList = []
+
+        with self.__requestLock:
+            while self.__deadlineHeap and self.__deadlineHeap[0][0] <= now:
+                deadline, reqID = heappop(self.__deadlineHeap)
+                future = self.__futureDict.pop(reqID, None)
+                if future:
+                    timeoutList.append(future)
+
+            if timeoutList:
+                self.__timeoutOccurred = True
+
+            # 有请求超时说明服务器可能已经断开，等待其他未完成的调用结束后再重建
+            reconnect = self.__timeoutOccurred and not self.__futureDict
+            if reconnect:
+                self.__timeoutOccurred = False
+
+        for future in timeoutList:
+            future.setException(RemoteTimeoutException(u'调用%s超时' %future.name))
+
+        return reconnect
 
     #----------------------------------------------------------------------
     def callback(self, topic, data):
@@ -313,3 +717,9 @@ class RemoteException(Exception):
     def __str__(self):
         """输出错误信息"""
         return self.__value
+
+
+########################################################################
+class RemoteTimeoutException(RemoteException):
+    """RPC调用超时异常"""
+    pass
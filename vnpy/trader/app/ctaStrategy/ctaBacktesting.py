@@ -10,8 +10,12 @@ from __future__ import print_function
 from datetime import datetime, timedelta
 from collections import OrderedDict
 from itertools import product
+from bisect import bisect_left, insort
+from operator import itemgetter
 import multiprocessing
 import copy
+import os
+import tempfile
 
 import pymongo
 import pandas as pd
@@ -29,11 +33,12 @@ except ImportError:
     pass
 
 from vnpy.trader.vtGlobal import globalSetting
-from vnpy.trader.vtObject import VtTickData, VtBarData
+from vnpy.trader.vtObject import VtTickData, VtBarData, VtCompactTickData, VtCompactBarData
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtGateway import VtOrderData, VtTradeData
 
 from .ctaBase import *
+from .ctaBarFeed import BarFeed, loadBarFeed
 
 
 ########################################################################
@@ -57,6 +62,10 @@ class BacktestingEngine(object):
         self.stopOrderDict = {}             # 停止单撤销后不会从本字典中删除
         self.workingStopOrderDict = {}      # 停止单撤销后会从本字典中删除
         
+        # 按价格排序的停止单簿，key为方向
+        self.stopOrderBookDict = {DIRECTION_LONG: OrderBook(),
+                                  DIRECTION_SHORT: OrderBook()}
+        
         self.engineType = ENGINETYPE_BACKTESTING    # 引擎类型为回测
         
         self.strategy = None        # 回测策略
@@ -77,6 +86,14 @@ class BacktestingEngine(object):
         self.hdsClient = None       # 历史数据服务器客户端
         
         self.initData = []          # 初始化用的数据
+        self.compactData = False    # 是否使用紧凑型数据类回放数据库中的数据
+        
+        self.barFeedEnabled = False     # 是否使用列式K线数据源（仅K线模式）
+        self.barFeedCacheDir = ''       # K线数据源的硬盘缓存目录，为空则不缓存
+        self.historyStore = None        # K线数据源使用的历史数据存储，为空则使用MongoDB
+        self.barFeed = None             # 当前使用的K线数据源
+        self.barFeedKey = None          # 当前数据源对应的(数据库, 合约, 开始时间, 结束时间)
+        self.replayFeed = None          # 回测回放部分的数据源
         self.dbName = ''            # 回测数据库名
         self.symbol = ''            # 回测集合名
         
@@ -88,6 +105,11 @@ class BacktestingEngine(object):
         self.limitOrderDict = OrderedDict()         # 限价单字典
         self.workingLimitOrderDict = OrderedDict()  # 活动限价单字典，用于进行撮合用
         
+        # 按价格排序的限价单簿，key为方向，撮合时只检查价格穿越的部分
+        self.limitOrderBookDict = {DIRECTION_LONG: OrderBook(),
+                                   DIRECTION_SHORT: OrderBook()}
+        self.newLimitOrderList = []                 # 尚未推送未成交状态的限价单编号
+        
         self.tradeCount = 0             # 成交编号
         self.tradeDict = OrderedDict()  # 成交字典
         
@@ -181,6 +203,41 @@ class BacktestingEngine(object):
         """设置价格最小变动"""
         self.priceTick = priceTick
     
+    #----------------------------------------------------------------------
+    def setCompactData(self, compactData):
+        """
+        设置是否使用紧凑型数据类（VtCompactBarData、VtCompactTickData）回放数据库中的数据，
+        可以降低内存占用，但数据对象不支持添加新属性，策略中不能在K线或Tick上保存自定义属性
+        """
+        self.compactData = compactData
+    
+    #----------------------------------------------------------------------
+    def enableBarFeed(self, cacheDir=''):
+        """
+        K线模式下使用列式数据源回放数据，历史数据只从数据库载入一次，
+        之后的回测（如参数优化）直接使用内存中的数组。
+        回放的K线为VtCompactBarData，策略中不能在K线上保存自定义属性。
+        cacheDir：硬盘缓存目录，设置后数据会缓存到硬盘供之后的回测使用
+        """
+        self.barFeedEnabled = True
+        self.barFeedCacheDir = cacheDir
+        
+    #----------------------------------------------------------------------
+    def setHistoryStore(self, store):
+        """
+        设置K线数据源使用的历史数据存储（如FileHistoryStore），
+        设置后K线模式下从该存储载入数据，不再访问MongoDB
+        """
+        self.barFeedEnabled = True
+        self.historyStore = store
+        
+    #----------------------------------------------------------------------
+    def setBarFeed(self, feed):
+        """直接设置已经载入的K线数据源，需要覆盖回测的数据时间范围"""
+        self.barFeedEnabled = True
+        self.barFeed = feed
+        self.barFeedKey = None
+    
     #------------------------------------------------
     # 数据回放相关
     #------------------------------------------------    
@@ -197,6 +254,10 @@ class BacktestingEngine(object):
     #----------------------------------------------------------------------
     def loadHistoryData(self):
         """载入历史数据"""
+        if self.barFeedEnabled and self.mode == self.BAR_MODE:
+            self.loadBarFeed()
+            return
+        
         self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
         collection = self.dbClient[self.dbName][self.symbol]          
 
@@ -204,10 +265,10 @@ class BacktestingEngine(object):
         
         # 首先根据回测模式，确认要使用的数据类
         if self.mode == self.BAR_MODE:
-            dataClass = VtBarData
+            dataClass = VtCompactBarData if self.compactData else VtBarData
             func = self.newBar
         else:
-            dataClass = VtTickData
+            dataClass = VtCompactTickData if self.compactData else VtTickData
             func = self.newTick
 
         # 载入初始化需要用的数据        
@@ -224,8 +285,7 @@ class BacktestingEngine(object):
         # 将数据从查询指针中读取出，并生成列表
         self.initData = []              # 清空initData列表
         for d in initCursor:
-            data = dataClass()
-            data.__dict__ = d
+            data = self.createData(dataClass, d)
             self.initData.append(data)      
         
         # 载入回测数据
@@ -248,6 +308,44 @@ class BacktestingEngine(object):
             count = initCursor.count() + self.dbCursor.count()
         self.output(u'载入完成，数据量：%s' %count)
         
+    #----------------------------------------------------------------------
+    def loadBarFeed(self):
+        """载入列式K线数据源"""
+        key = (self.dbName, self.symbol, self.dataStartDate, self.dataEndDate)
+        
+        # 外部直接设置的数据源，或者参数未变化时，直接使用已载入的数据
+        if self.barFeed is None or (self.barFeedKey and self.barFeedKey != key):
+            self.output(u'开始载入数据')
+            
+            if self.historyStore:
+                self.barFeed = self.historyStore.loadBarFeed(self.dbName, self.symbol,
+                                                             self.dataStartDate, self.dataEndDate)
+            else:
+                if not self.dbClient:
+                    self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
+                
+                self.barFeed = loadBarFeed(self.dbClient, self.dbName, self.symbol,
+                                           self.dataStartDate, self.dataEndDate,
+                                           self.barFeedCacheDir)
+            self.barFeedKey = key
+        
+        # 和数据库查询的条件保持一致：初始化数据不包含策略启动时间点，回测数据包含结束时间点
+        initFeed = self.barFeed.slice(self.dataStartDate, self.strategyStartDate, includeEnd=False)
+        self.initData = list(initFeed.iterBars())
+        self.replayFeed = self.barFeed.slice(self.strategyStartDate, self.dataEndDate)
+        
+        self.output(u'载入完成，数据量：%s' %(len(initFeed) + len(self.replayFeed)))
+    
+    #----------------------------------------------------------------------
+    def createData(self, dataClass, d):
+        """基于数据库中读取的文档创建数据对象"""
+        if self.compactData:
+            return dataClass.fromDict(d)
+        
+        data = dataClass()
+        data.__dict__ = d
+        return data
+    
     #----------------------------------------------------------------------
     def runBacktesting(self):
         """运行回测"""
@@ -256,10 +354,10 @@ class BacktestingEngine(object):
         
         # 首先根据回测模式，确认要使用的数据类
         if self.mode == self.BAR_MODE:
-            dataClass = VtBarData
+            dataClass = VtCompactBarData if self.compactData else VtBarData
             func = self.newBar
         else:
-            dataClass = VtTickData
+            dataClass = VtCompactTickData if self.compactData else VtTickData
             func = self.newTick
 
         self.output(u'开始回测')
@@ -274,10 +372,13 @@ class BacktestingEngine(object):
         
         self.output(u'开始回放数据')
 
-        for d in self.dbCursor:
-            data = dataClass()
-            data.__dict__ = d
-            func(data)     
+        if self.replayFeed is not None and self.mode == self.BAR_MODE:
+            for bar in self.replayFeed.iterBars():
+                func(bar)
+        else:
+            for d in self.dbCursor:
+                data = self.createData(dataClass, d)
+                func(data)     
             
         self.output(u'数据回放结束')
         
@@ -329,8 +430,25 @@ class BacktestingEngine(object):
             buyBestCrossPrice = self.tick.askPrice1
             sellBestCrossPrice = self.tick.bidPrice1
         
-        # 遍历限价单字典中的所有限价单
-        for orderID, order in self.workingLimitOrderDict.items():
+        # 需要处理的限价单：新发出的（推送未成交状态）以及价格穿越的（可能成交）
+        orderIDs = set(self.newLimitOrderList)
+        self.newLimitOrderList = []
+        
+        if buyCrossPrice > 0:
+            book = self.limitOrderBookDict[DIRECTION_LONG]
+            orderIDs.update(entry[2] for entry in book.getAbove(buyCrossPrice))
+        
+        if sellCrossPrice > 0:
+            book = self.limitOrderBookDict[DIRECTION_SHORT]
+            orderIDs.update(entry[2] for entry in book.getBelow(sellCrossPrice))
+        
+        # 按照委托发出的顺序处理，和遍历限价单字典时的推送顺序保持一致
+        for orderID in sorted(orderIDs, key=int):
+            # 委托可能已经在之前的回调函数中被撤销
+            order = self.workingLimitOrderDict.get(orderID)
+            if not order:
+                continue
+            
             # 推送委托进入队列（未成交）的状态更新
             if not order.status:
                 order.status = STATUS_NOTTRADED
@@ -382,9 +500,9 @@ class BacktestingEngine(object):
                 order.status = STATUS_ALLTRADED
                 self.strategy.onOrder(order)
                 
-                # 从字典中删除该限价单
+                # 从字典和限价单簿中删除该限价单
                 if orderID in self.workingLimitOrderDict:
-                    del self.workingLimitOrderDict[orderID]
+                    self.removeWorkingLimitOrder(order)
                 
     #----------------------------------------------------------------------
     def crossStopOrder(self):
@@ -399,8 +517,19 @@ class BacktestingEngine(object):
             sellCrossPrice = self.tick.lastPrice
             bestCrossPrice = self.tick.lastPrice
         
-        # 遍历停止单字典中的所有停止单
-        for stopOrderID, so in self.workingStopOrderDict.items():
+        # 从停止单簿中找出价格穿越的停止单
+        entries = (self.stopOrderBookDict[DIRECTION_LONG].getBelow(buyCrossPrice) +
+                   self.stopOrderBookDict[DIRECTION_SHORT].getAbove(sellCrossPrice))
+        
+        # 按照停止单发出的顺序处理
+        entries.sort(key=itemgetter(1))
+        
+        for price, seq, stopOrderID in entries:
+            # 停止单可能已经在之前的回调函数中被撤销
+            so = self.workingStopOrderDict.get(stopOrderID)
+            if not so:
+                continue
+            
             # 判断是否会成交
             buyCross = so.direction==DIRECTION_LONG and so.price<=buyCrossPrice
             sellCross = so.direction==DIRECTION_SHORT and so.price>=sellCrossPrice
@@ -409,8 +538,7 @@ class BacktestingEngine(object):
             if buyCross or sellCross:
                 # 更新停止单状态，并从字典中删除该停止单
                 so.status = STOPORDER_TRIGGERED
-                if stopOrderID in self.workingStopOrderDict:
-                    del self.workingStopOrderDict[stopOrderID]                        
+                self.removeWorkingStopOrder(so)
 
                 # 推送成交数据
                 self.tradeCount += 1            # 成交编号自增1
@@ -496,6 +624,10 @@ class BacktestingEngine(object):
         self.workingLimitOrderDict[orderID] = order
         self.limitOrderDict[orderID] = order
         
+        # 加入限价单簿，等待下一次撮合时推送未成交状态
+        self.limitOrderBookDict[order.direction].add(order.price, self.limitOrderCount, orderID)
+        self.newLimitOrderList.append(orderID)
+        
         return [orderID]
     
     #----------------------------------------------------------------------
@@ -509,7 +641,13 @@ class BacktestingEngine(object):
             
             self.strategy.onOrder(order)
             
-            del self.workingLimitOrderDict[vtOrderID]
+            self.removeWorkingLimitOrder(order)
+    
+    #----------------------------------------------------------------------
+    def removeWorkingLimitOrder(self, order):
+        """从活动限价单字典和限价单簿中删除限价单"""
+        del self.workingLimitOrderDict[order.orderID]
+        self.limitOrderBookDict[order.direction].remove(order.price, int(order.orderID), order.orderID)
         
     #----------------------------------------------------------------------
     def sendStopOrder(self, vtSymbol, orderType, price, volume, strategy):
@@ -541,6 +679,7 @@ class BacktestingEngine(object):
         # 保存stopOrder对象到字典中
         self.stopOrderDict[stopOrderID] = so
         self.workingStopOrderDict[stopOrderID] = so
+        self.stopOrderBookDict[so.direction].add(so.price, self.stopOrderCount, stopOrderID)
         
         # 推送停止单初始更新
         self.strategy.onStopOrder(so)        
@@ -554,9 +693,16 @@ class BacktestingEngine(object):
         if stopOrderID in self.workingStopOrderDict:
             so = self.workingStopOrderDict[stopOrderID]
             so.status = STOPORDER_CANCELLED
-            del self.workingStopOrderDict[stopOrderID]
+            self.removeWorkingStopOrder(so)
             self.strategy.onStopOrder(so)
     
+    #----------------------------------------------------------------------
+    def removeWorkingStopOrder(self, so):
+        """从活动停止单字典和停止单簿中删除停止单"""
+        del self.workingStopOrderDict[so.stopOrderID]
+        seq = int(so.stopOrderID[len(STOPORDERPREFIX):])
+        self.stopOrderBookDict[so.direction].remove(so.price, seq, so.stopOrderID)
+    
     #----------------------------------------------------------------------
     def putStrategyEvent(self, name):
         """发送策略更新事件，回测中忽略"""
@@ -881,17 +1027,27 @@ class BacktestingEngine(object):
         # 清空限价单相关
         self.limitOrderCount = 0
         self.limitOrderDict.clear()
-        self.workingLimitOrderDict.clear()        
+        self.workingLimitOrderDict.clear()
+        self.newLimitOrderList = []
+        
+        for book in self.limitOrderBookDict.values():
+            book.clear()
         
         # 清空停止单相关
         self.stopOrderCount = 0
         self.stopOrderDict.clear()
         self.workingStopOrderDict.clear()
         
+        for book in self.stopOrderBookDict.values():
+            book.clear()
+        
         # 清空成交相关
         self.tradeCount = 0
         self.tradeDict.clear()
         
+        # 清空按日统计结果，否则同一引擎多次回测时成交会被重复统计
+        self.dailyResultDict.clear()
+        
     #----------------------------------------------------------------------
     def runOptimization(self, strategyClass, optimizationSetting):
         """优化参数"""
@@ -938,18 +1094,43 @@ class BacktestingEngine(object):
         if not settingList or not targetName:
             self.output(u'优化设置有问题，请检查')
         
-        # 多进程优化，启动一个对应CPU核心数量的进程池
-        pool = multiprocessing.Pool(multiprocessing.cpu_count())
-        l = []
-
-        for setting in settingList:
-            l.append(pool.apply_async(optimize, (strategyClass, setting,
-                                                 targetName, self.mode, 
-                                                 self.startDate, self.initDays, self.endDate,
-                                                 self.slippage, self.rate, self.size, self.priceTick,
-                                                 self.dbName, self.symbol)))
-        pool.close()
-        pool.join()
+        engineSetting = (self.mode, self.startDate, self.initDays, self.endDate,
+                         self.slippage, self.rate, self.size, self.priceTick,
+                         self.dbName, self.symbol)
+        
+        # K线模式下由主进程载入一次数据，写入临时文件后由所有子进程内存映射读取，
+        # 每个子进程只创建一次回测引擎，在之后的参数组合中重复使用
+        if self.mode == self.BAR_MODE:
+            self.barFeedEnabled = True
+            self.loadHistoryData()
+            
+            fd, fileName = tempfile.mkstemp(suffix='.feed')
+            os.close(fd)
+            self.barFeed.saveRecords(fileName)
+            
+            try:
+                pool = multiprocessing.Pool(multiprocessing.cpu_count(),
+                                            initializer=initOptimizeProcess,
+                                            initargs=(engineSetting, fileName, self.barFeed.info))
+                l = []
+                
+                for setting in settingList:
+                    l.append(pool.apply_async(optimizeShared, (strategyClass, setting, targetName)))
+                pool.close()
+                pool.join()
+            finally:
+                os.remove(fileName)
+        
+        # Tick模式下每个参数组合单独从数据库载入数据
+        else:
+            # 多进程优化，启动一个对应CPU核心数量的进程池
+            pool = multiprocessing.Pool(multiprocessing.cpu_count())
+            l = []
+    
+            for setting in settingList:
+                l.append(pool.apply_async(optimize, (strategyClass, setting, targetName) + engineSetting))
+            pool.close()
+            pool.join()
         
         # 显示结果
         resultList = [res.get() for res in l]
@@ -1147,6 +1328,58 @@ class BacktestingEngine(object):
         plt.show()
        
         
+########################################################################
+class OrderBook(object):
+    """
+    回测撮合用的委托簿
+    条目为(价格, 序号, 委托编号)并按价格排序，序号为委托发出的顺序，
+    撮合时通过二分查找直接定位价格穿越的委托，无需遍历所有活动委托。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.entryList = []
+        
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """委托数量"""
+        return len(self.entryList)
+        
+    #----------------------------------------------------------------------
+    def add(self, price, seq, orderID):
+        """添加委托"""
+        insort(self.entryList, (price, seq, orderID))
+    
+    #----------------------------------------------------------------------
+    def remove(self, price, seq, orderID):
+        """删除委托"""
+        entry = (price, seq, orderID)
+        i = bisect_left(self.entryList, entry)
+        
+        if i < len(self.entryList) and self.entryList[i] == entry:
+            del self.entryList[i]
+    
+    #----------------------------------------------------------------------
+    def getAbove(self, price):
+        """获取价格大于等于price的委托"""
+        # (price,)小于所有价格为price的条目
+        i = bisect_left(self.entryList, (price,))
+        return self.entryList[i:]
+    
+    #----------------------------------------------------------------------
+    def getBelow(self, price):
+        """获取价格小于等于price的委托"""
+        # (price, inf)大于所有价格为price的条目
+        i = bisect_left(self.entryList, (price, float('inf')))
+        return self.entryList[:i]
+    
+    #----------------------------------------------------------------------
+    def clear(self):
+        """清空"""
+        del self.entryList[:]
+
+
 ########################################################################
 class TradingResult(object):
     """每笔交易的结果"""
@@ -1298,12 +1531,18 @@ class HistoryDataServer(RpcServer):
     """历史数据缓存服务器"""
 
     #----------------------------------------------------------------------
-    def __init__(self, repAddress, pubAddress):
-        """Constructor"""
+    def __init__(self, repAddress, pubAddress, store=None):
+        """
+        Constructor
+        store：历史数据存储（如FileHistoryStore），为空则从MongoDB加载
+        """
         super(HistoryDataServer, self).__init__(repAddress, pubAddress)
         
-        self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'], 
-                                            globalSetting['mongoPort'])
+        self.store = store
+        
+        if not store:
+            self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'], 
+                                                globalSetting['mongoPort'])
         
         self.historyDict = {}
         
@@ -1318,6 +1557,17 @@ class HistoryDataServer(RpcServer):
             print(u'找到内存缓存：%s %s %s %s' %(dbName, symbol, start, end))
             return history
         
+        # 使用历史数据存储时，从存储中加载K线数据（注意存储的结束时间包含end）
+        if self.store:
+            feed = self.store.loadBarFeed(dbName, symbol, start, end)
+            if end:
+                feed = feed.slice(start, end, includeEnd=False)
+            
+            history = [bar.toDict() for bar in feed.iterBars()]
+            self.historyDict[(dbName, symbol, start, end)] = history
+            print(u'从存储加载：%s %s %s %s' %(dbName, symbol, start, end))
+            return history
+        
         # 否则从数据库加载
         collection = self.dbClient[dbName][symbol]
         
@@ -1353,6 +1603,48 @@ def formatNumber(n):
     return format(rn, ',')  # 加上千分符
     
 
+#----------------------------------------------------------------------
+# 子进程中重复使用的回测引擎，由initOptimizeProcess创建
+processEngine = None
+
+#----------------------------------------------------------------------
+def initOptimizeProcess(engineSetting, fileName, info):
+    """多进程优化时子进程的初始化函数，创建回测引擎并映射共享的K线数据"""
+    global processEngine
+    
+    (mode, startDate, initDays, endDate, slippage, rate, size, 
+     priceTick, dbName, symbol) = engineSetting
+    
+    engine = BacktestingEngine()
+    engine.setBacktestingMode(mode)
+    engine.setStartDate(startDate, initDays)
+    engine.setEndDate(endDate)
+    engine.setSlippage(slippage)
+    engine.setRate(rate)
+    engine.setSize(size)
+    engine.setPriceTick(priceTick)
+    engine.setDatabase(dbName, symbol)
+    engine.setBarFeed(BarFeed.loadRecords(fileName, info))
+    
+    processEngine = engine
+
+#----------------------------------------------------------------------
+def optimizeShared(strategyClass, setting, targetName):
+    """多进程优化时跑在每个进程中运行的函数（使用共享的K线数据）"""
+    engine = processEngine
+    engine.clearBacktestingResult()
+    
+    engine.initStrategy(strategyClass, setting)
+    engine.runBacktesting()
+    
+    df = engine.calculateDailyResult()
+    df, d = engine.calculateDailyStatistics(df)
+    try:
+        targetValue = d[targetName]
+    except KeyError:
+        targetValue = 0            
+    return (str(setting), targetValue, d)
+
 #----------------------------------------------------------------------
 def optimize(strategyClass, setting, targetName,
              mode, startDate, initDays, endDate,
@@ -0,0 +1,300 @@
+# encoding: UTF-8
+
+'''
+本文件中包含的是CTA回测使用的列式K线数据源。
+
+K线数据一次性载入到NumPy数组中（时间、OHLC、成交量、持仓量），
+回放时直接从数组生成K线对象，避免每次回测都重新查询数据库和解码BSON，
+同时可以将数组缓存到硬盘上，供之后的回测和参数优化直接读取。
+'''
+from __future__ import division
+
+import os
+
+import numpy as np
+
+from vnpy.trader.vtObject import VtCompactBarData
+from vnpy.trader.vtConstant import EMPTY_STRING
+
+
+# 数值列名称，和VtBarData中的字段名保持一致
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'openInterest']
+
+# 合约信息字段（同一数据源中保持不变）
+INFO_FIELDS = ['vtSymbol', 'symbol', 'exchange', 'gatewayName']
+
+# 跨进程共享时使用的结构数组格式
+RECORD_DTYPE = np.dtype([('datetime', '<M8[us]'),
+                         ('open', '<f8'),
+                         ('high', '<f8'),
+                         ('low', '<f8'),
+                         ('close', '<f8'),
+                         ('volume', '<f8'),
+                         ('openInterest', '<f8'),
+                         ('date', '<U8'),
+                         ('time', '<U16')])
+
+# 回放时每次转换为Python对象的数据量
+CHUNK_SIZE = 50000
+
+
+########################################################################
+class BarFeed(object):
+    """
+    列式K线数据源
+
+    datetime数组为datetime64[us]类型，其余数值列为float64类型，
+    date和time字符串列保存为定长的unicode数组。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, columns=None, info=None):
+        """Constructor"""
+        columns = columns or {}
+        
+        self.datetime = np.asarray(columns.get('datetime', []), dtype='datetime64[us]')
+        n = len(self.datetime)
+        
+        # 缺少的列使用默认值填充，保证所有列的长度一致
+        self.open = self.getColumn(columns, 'open', np.float64, n)
+        self.high = self.getColumn(columns, 'high', np.float64, n)
+        self.low = self.getColumn(columns, 'low', np.float64, n)
+        self.close = self.getColumn(columns, 'close', np.float64, n)
+        self.volume = self.getColumn(columns, 'volume', np.float64, n)
+        self.openInterest = self.getColumn(columns, 'openInterest', np.float64, n)
+        
+        # 没有提供日期和时间字符串时，根据datetime生成
+        if 'date' in columns and 'time' in columns:
+            self.date = np.asarray(columns['date'], dtype='U8')
+            self.time = np.asarray(columns['time'], dtype='U16')
+        else:
+            self.date, self.time = self.formatDateTime(self.datetime)
+
+        # 合约信息
+        self.info = dict.fromkeys(INFO_FIELDS, EMPTY_STRING)
+        if info:
+            self.info.update(info)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def getColumn(columns, name, dtype, n):
+        """获取某一列的数组"""
+        if name in columns:
+            return np.asarray(columns[name], dtype=dtype)
+        else:
+            return np.zeros(n, dtype=dtype)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatDateTime(dtArray):
+        """将datetime64数组转换为YYYYMMDD格式的日期和HH:MM:SS格式的时间字符串数组"""
+        n = len(dtArray)
+        if not n:
+            return np.zeros(0, dtype='U8'), np.zeros(0, dtype='U16')
+        
+        # 格式为YYYY-MM-DDTHH:MM:SS，按字符拆分后截取对应的部分
+        chars = np.datetime_as_string(dtArray, unit='s').astype('U19').view('U1').reshape(n, 19)
+        
+        date = np.ascontiguousarray(chars[:, [0, 1, 2, 3, 5, 6, 8, 9]]).view('U8').reshape(n)
+        time = np.ascontiguousarray(chars[:, 11:19]).view('U8').reshape(n).astype('U16')
+        return date, time
+
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """数据量"""
+        return len(self.datetime)
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromDocuments(cls, documents):
+        """从数据库文档（字典）的迭代器创建，文档需要按时间排序"""
+        columns = {k: [] for k in ['datetime', 'date', 'time'] + PRICE_FIELDS}
+        info = {}
+
+        for d in documents:
+            if not info:
+                info = {k: d.get(k, EMPTY_STRING) for k in INFO_FIELDS}
+
+            columns['datetime'].append(d['datetime'])
+            columns['date'].append(d.get('date', EMPTY_STRING))
+            columns['time'].append(d.get('time', EMPTY_STRING))
+
+            for k in PRICE_FIELDS:
+                columns[k].append(d.get(k) or 0)
+
+        return cls(columns, info)
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromMongo(cls, dbClient, dbName, symbol, start, end=None):
+        """从MongoDB中载入[start, end]范围内的数据"""
+        if end:
+            flt = {'datetime':{'$gte':start, '$lte':end}}
+        else:
+            flt = {'datetime':{'$gte':start}}
+
+        # 只查询需要的字段，减少BSON解码的开销
+        projection = dict.fromkeys(['datetime', 'date', 'time'] + PRICE_FIELDS + INFO_FIELDS, True)
+        projection['_id'] = False
+
+        cursor = dbClient[dbName][symbol].find(flt, projection).sort('datetime')
+        return cls.fromDocuments(cursor)
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def load(cls, fileName):
+        """从硬盘缓存文件载入"""
+        with np.load(fileName) as f:
+            columns = {k: f[k] for k in f.files if k != 'info'}
+            info = dict(zip(INFO_FIELDS, f['info'].tolist()))
+
+        return cls(columns, info)
+
+    #----------------------------------------------------------------------
+    def save(self, fileName):
+        """保存到硬盘缓存文件（npz格式）"""
+        np.savez(fileName,
+                 datetime=self.datetime,
+                 open=self.open,
+                 high=self.high,
+                 low=self.low,
+                 close=self.close,
+                 volume=self.volume,
+                 openInterest=self.openInterest,
+                 date=self.date,
+                 time=self.time,
+                 info=np.array([self.info[k] for k in INFO_FIELDS], dtype='U64'))
+
+    #----------------------------------------------------------------------
+    def searchIndex(self, dt, side='left'):
+        """二分查找某个时间点在数组中的位置"""
+        if dt is None:
+            return len(self.datetime) if side == 'right' else 0
+
+        return int(np.searchsorted(self.datetime, np.datetime64(dt, 'us'), side=side))
+
+    #----------------------------------------------------------------------
+    def slice(self, start=None, end=None, includeEnd=True):
+        """
+        截取时间范围内的数据，返回新的BarFeed（数组为原数组的视图，不复制数据）
+        includeEnd：是否包含end时间点的数据
+        """
+        i = self.searchIndex(start, 'left')
+        j = self.searchIndex(end, 'right' if includeEnd else 'left')
+
+        columns = {k: getattr(self, k)[i:j] for k in ['datetime', 'date', 'time'] + PRICE_FIELDS}
+        return BarFeed(columns, self.info)
+
+    #----------------------------------------------------------------------
+    def iterBars(self, reuseBar=False, chunkSize=CHUNK_SIZE):
+        """
+        按时间顺序生成K线对象
+        reuseBar：是否重复使用同一个K线对象，开启后速度更快，但策略中不能保存K线对象的引用
+        chunkSize：每次转换为Python对象的数据量，用于限制回放时的临时内存占用
+        """
+        info = self.info
+        vtSymbol = info['vtSymbol']
+        symbol = info['symbol']
+        exchange = info['exchange']
+        gatewayName = info['gatewayName']
+
+        if reuseBar:
+            bar = VtCompactBarData()
+            bar.vtSymbol = vtSymbol
+            bar.symbol = symbol
+            bar.exchange = exchange
+            bar.gatewayName = gatewayName
+
+        fromTuple = VtCompactBarData.fromTuple
+
+        for i in range(0, len(self.datetime), chunkSize):
+            j = i + chunkSize
+
+            # 分块转换为Python对象列表，比逐个元素访问NumPy数组快得多
+            rows = zip(self.datetime[i:j].tolist(),
+                       self.date[i:j].tolist(),
+                       self.time[i:j].tolist(),
+                       self.open[i:j].tolist(),
+                       self.high[i:j].tolist(),
+                       self.low[i:j].tolist(),
+                       self.close[i:j].tolist(),
+                       self.volume[i:j].tolist(),
+                       self.openInterest[i:j].tolist())
+
+            if reuseBar:
+                for (bar.datetime, bar.date, bar.time, bar.open, bar.high, bar.low,
+                     bar.close, bar.volume, bar.openInterest) in rows:
+                    yield bar
+            else:
+                for dt, date, time, open_, high, low, close, volume, oi in rows:
+                    # 顺序和VtCompactBarData.__slots__保持一致
+                    yield fromTuple((gatewayName, None, vtSymbol, symbol, exchange,
+                                     open_, high, low, close, date, time, dt, volume, oi))
+
+    #----------------------------------------------------------------------
+    def toRecords(self):
+        """转换为RECORD_DTYPE结构数组"""
+        records = np.empty(len(self.datetime), dtype=RECORD_DTYPE)
+
+        for k in RECORD_DTYPE.names:
+            records[k] = getattr(self, k)
+
+        return records
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromRecords(cls, records, info=None):
+        """从RECORD_DTYPE结构数组创建，各列为结构数组的视图，不复制数据"""
+        columns = {k: records[k] for k in RECORD_DTYPE.names}
+        return cls(columns, info)
+
+    #----------------------------------------------------------------------
+    def saveRecords(self, fileName):
+        """将数据以结构数组的原始字节写入文件，供其他进程内存映射读取"""
+        self.toRecords().tofile(fileName)
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def loadRecords(cls, fileName, info=None):
+        """
+        以只读内存映射的方式载入saveRecords写入的文件，
+        多个进程映射同一个文件时共享操作系统的页缓存，不会各自复制一份数据
+        """
+        if not os.path.getsize(fileName):
+            return cls(info=info)
+
+        records = np.memmap(fileName, dtype=RECORD_DTYPE, mode='r')
+        return cls.fromRecords(records, info)
+
+
+#----------------------------------------------------------------------
+def getCacheFileName(cacheDir, dbName, symbol, start, end=None):
+    """生成数据缓存文件名"""
+    startStr = start.strftime('%Y%m%d%H%M')
+    endStr = end.strftime('%Y%m%d%H%M') if end else 'latest'
+
+    fileName = '_'.join([dbName, symbol, startStr, endStr]) + '.npz'
+    return os.path.join(cacheDir, fileName)
+
+
+#----------------------------------------------------------------------
+def loadBarFeed(dbClient, dbName, symbol, start, end=None, cacheDir=None):
+    """
+    载入K线数据源，若设置了缓存目录则优先从缓存文件读取，
+    缓存不存在时从数据库载入并写入缓存。
+    注意end为空时数据库中的新数据不会更新到缓存中。
+    """
+    if cacheDir:
+        fileName = getCacheFileName(cacheDir, dbName, symbol, start, end)
+
+        if os.path.exists(fileName):
+            return BarFeed.load(fileName)
+
+    feed = BarFeed.fromMongo(dbClient, dbName, symbol, start, end)
+
+    if cacheDir:
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+        feed.save(fileName)
+
+    return feed
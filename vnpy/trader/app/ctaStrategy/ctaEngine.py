@@ -9,6 +9,7 @@ from __future__ import division
 import json
 import os
 import traceback
+from threading import Lock
 from collections import OrderedDict
 from datetime import datetime, timedelta
 from copy import copy
@@ -19,6 +20,7 @@ from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import VtTickData, VtBarData
 from vnpy.trader.vtGateway import VtSubscribeReq, VtOrderReq, VtCancelOrderReq, VtLogData
 from vnpy.trader.vtFunction import todayDate, getJsonPath
+from vnpy.trader.vtLatency import latencyMonitor, STAGE_STRATEGY
 from vnpy.trader.app import AppEngine
 
 from .ctaBase import *
@@ -71,6 +73,10 @@ class CtaEngine(AppEngine):
         # 成交号集合，用来过滤已经收到过的成交推送
         self.tradeSet = set()
         
+        # 使用分片事件引擎时，不同合约的事件在不同工作线程中处理，
+        # 发单撤单和停止单编号等跨合约共享的操作需要加锁
+        self.orderLock = Lock()
+        
         # 引擎类型为实盘
         self.engineType = ENGINETYPE_TRADING
         
@@ -94,6 +100,7 @@ class CtaEngine(AppEngine):
         
         req.productClass = strategy.productClass
         req.currency = strategy.currency        
+        req.strategyName = strategy.name
         
         # 设计为CTA引擎发出的委托只允许使用限价单
         req.priceType = PRICETYPE_LIMITPRICE    
@@ -122,11 +129,12 @@ class CtaEngine(AppEngine):
         if not reqList:
             return vtOrderIDList
         
-        for convertedReq in reqList:
-            vtOrderID = self.mainEngine.sendOrder(convertedReq, contract.gatewayName)    # 发单
-            self.orderStrategyDict[vtOrderID] = strategy                                 # 保存vtOrderID和策略的映射关系
-            self.strategyOrderDict[strategy.name].add(vtOrderID)                         # 添加到策略委托号集合中
-            vtOrderIDList.append(vtOrderID)
+        with self.orderLock:
+            for convertedReq in reqList:
+                vtOrderID = self.mainEngine.sendOrder(convertedReq, contract.gatewayName)    # 发单
+                self.orderStrategyDict[vtOrderID] = strategy                                 # 保存vtOrderID和策略的映射关系
+                self.strategyOrderDict[strategy.name].add(vtOrderID)                         # 添加到策略委托号集合中
+                vtOrderIDList.append(vtOrderID)
             
         self.writeCtaLog(u'策略%s发送委托，%s，%s，%s@%s' 
                          %(strategy.name, vtSymbol, req.direction, volume, price))
@@ -150,13 +158,16 @@ class CtaEngine(AppEngine):
                 req.frontID = order.frontID
                 req.sessionID = order.sessionID
                 req.orderID = order.orderID
-                self.mainEngine.cancelOrder(req, order.gatewayName)    
+                
+                with self.orderLock:
+                    self.mainEngine.cancelOrder(req, order.gatewayName)    
 
     #----------------------------------------------------------------------
     def sendStopOrder(self, vtSymbol, orderType, price, volume, strategy):
         """发停止单（本地实现）"""
-        self.stopOrderCount += 1
-        stopOrderID = STOPORDERPREFIX + str(self.stopOrderCount)
+        with self.orderLock:
+            self.stopOrderCount += 1
+            stopOrderID = STOPORDERPREFIX + str(self.stopOrderCount)
         
         so = StopOrder()
         so.vtSymbol = vtSymbol
@@ -195,17 +206,14 @@ class CtaEngine(AppEngine):
     #----------------------------------------------------------------------
     def cancelStopOrder(self, stopOrderID):
         """撤销停止单"""
-        # 检查停止单是否存在
-        if stopOrderID in self.workingStopOrderDict:
-            so = self.workingStopOrderDict[stopOrderID]
+        # 检查停止单是否存在，同时从活动停止单字典中移除
+        so = self.workingStopOrderDict.pop(stopOrderID, None)
+        if so:
             strategy = so.strategy
             
             # 更改停止单状态为已撤销
             so.status = STOPORDER_CANCELLED
             
-            # 从活动停止单字典中移除
-            del self.workingStopOrderDict[stopOrderID]
-            
             # 从策略委托号集合中移除
             s = self.strategyOrderDict[strategy.name]
             if stopOrderID in s:
@@ -221,8 +229,8 @@ class CtaEngine(AppEngine):
         
         # 首先检查是否有策略交易该合约
         if vtSymbol in self.tickStrategyDict:
-            # 遍历等待中的停止单，检查是否会被触发
-            for so in self.workingStopOrderDict.values():
+            # 遍历等待中的停止单，检查是否会被触发（其他工作线程可能同时增删停止单，因此遍历副本）
+            for so in list(self.workingStopOrderDict.values()):
                 if so.vtSymbol == vtSymbol:
                     longTriggered = so.direction==DIRECTION_LONG and tick.lastPrice>=so.price        # 多头停止单被触发
                     shortTriggered = so.direction==DIRECTION_SHORT and tick.lastPrice<=so.price     # 空头停止单被触发
@@ -241,7 +249,7 @@ class CtaEngine(AppEngine):
                         # 检查因为风控流控等原因导致的委托失败（无委托号）
                         if vtOrderID:
                             # 从活动停止单字典中移除该停止单
-                            del self.workingStopOrderDict[so.stopOrderID]
+                            self.workingStopOrderDict.pop(so.stopOrderID, None)
                             
                             # 从策略委托号集合中移除
                             s = self.strategyOrderDict[so.strategy.name]
@@ -255,6 +263,10 @@ class CtaEngine(AppEngine):
     #----------------------------------------------------------------------
     def processTickEvent(self, event):
         """处理行情推送"""
+        # 开始跟踪该行情触发的委托延时
+        if latencyMonitor.enabled:
+            latencyMonitor.beginTrace(event)
+        
         tick = event.dict_['data']
         
         tick = copy(tick)
@@ -271,12 +283,19 @@ class CtaEngine(AppEngine):
                     tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
             except ValueError:
                 self.writeCtaLog(traceback.format_exc())
+                latencyMonitor.endTrace()
                 return
+            
+            if latencyMonitor.enabled:
+                latencyMonitor.mark(STAGE_STRATEGY)
                 
             # 逐个推送到策略实例中
             l = self.tickStrategyDict[tick.vtSymbol]
             for strategy in l:
                 self.callStrategyFunc(strategy, strategy.onTick, tick)
+        
+        if latencyMonitor.enabled:
+            latencyMonitor.endTrace()
     
     #----------------------------------------------------------------------
     def processOrderEvent(self, event):
@@ -324,9 +343,13 @@ class CtaEngine(AppEngine):
     #----------------------------------------------------------------------
     def registerEvent(self):
         """注册事件监听"""
-        self.eventEngine.register(EVENT_TICK, self.processTickEvent)
-        self.eventEngine.register(EVENT_ORDER, self.processOrderEvent)
-        self.eventEngine.register(EVENT_TRADE, self.processTradeEvent)
+        # 每个策略只交易一个合约，其行情、委托和成交推送都会被分配到同一个工作线程，
+        # 因此使用分片事件引擎时按合约分片处理，交易缓慢的策略不会阻塞其他合约
+        register = getattr(self.eventEngine, 'registerSharded', self.eventEngine.register)
+        
+        register(EVENT_TICK, self.processTickEvent)
+        register(EVENT_ORDER, self.processOrderEvent)
+        register(EVENT_TRADE, self.processTradeEvent)
  
     #----------------------------------------------------------------------
     def insertData(self, dbName, collectionName, data):
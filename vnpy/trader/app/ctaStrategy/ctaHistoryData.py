@@ -6,6 +6,9 @@
 2. 将通达信导出的历史数据载入到MongoDB中的函数
 3. 将交易开拓者导出的历史数据载入到MongoDB中的函数
 4. 将OKEX下载的历史数据载入到MongoDB中的函数
+
+载入函数的store参数可以传入其他的HistoryStore（如FileHistoryStore），
+将数据写入本地文件而不是MongoDB，默认为MongoHistoryStore。
 """
 from __future__ import print_function
 
@@ -16,12 +19,23 @@ from struct import unpack
 
 import pymongo
 
-from vnpy.trader.vtGlobal import globalSetting
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import VtBarData
 from .ctaBase import SETTING_DB_NAME, TICK_DB_NAME, MINUTE_DB_NAME, DAILY_DB_NAME
+from .ctaHistoryStore import MongoHistoryStore
+
+
+# 导入数据时每批保存的K线数量，避免大文件的数据全部保存在内存中
+SAVE_CHUNK_SIZE = 10000
 
 
+#----------------------------------------------------------------------
+def saveBarChunk(store, dbName, symbol, bars):
+    """缓存的K线数量达到SAVE_CHUNK_SIZE时批量保存，并清空缓存列表"""
+    if len(bars) >= SAVE_CHUNK_SIZE:
+        store.saveBars(dbName, symbol, bars)
+        del bars[:]
+
 #----------------------------------------------------------------------
 def downloadEquityDailyBarts(self, symbol):
     """
@@ -73,15 +87,14 @@ def downloadEquityDailyBarts(self, symbol):
         print(u'找不到合约%s' %symbol)
 
 #----------------------------------------------------------------------
-def loadMcCsv(fileName, dbName, symbol):
+def loadMcCsv(fileName, dbName, symbol, store=None):
     """将Multicharts导出的csv格式的历史数据插入到Mongo数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort']) 
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)   
+    if not store:
+        store = MongoHistoryStore()
+    bars = []
     
     # 读取数据和插入到数据库
     with open(fileName, 'r') as f:
@@ -99,22 +112,22 @@ def loadMcCsv(fileName, dbName, symbol):
             bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
             bar.volume = d['TotalVolume']
     
-            flt = {'datetime': bar.datetime}
-            collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+            bars.append(bar)
+            saveBarChunk(store, dbName, symbol, bars)
             print(bar.date, bar.time)
     
+    store.saveBars(dbName, symbol, bars)
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
-def loadTbCsv(fileName, dbName, symbol):
+def loadTbCsv(fileName, dbName, symbol, store=None):
     """将TradeBlazer导出的csv格式的历史分钟数据插入到Mongo数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)   
+    if not store:
+        store = MongoHistoryStore()
+    bars = []
     
     # 读取数据和插入到数据库
     reader = csv.reader(file(fileName, 'r'))
@@ -132,22 +145,22 @@ def loadTbCsv(fileName, dbName, symbol):
         bar.volume = d[5]
         bar.openInterest = d[6]
 
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+        bars.append(bar)
+        saveBarChunk(store, dbName, symbol, bars)
         print(bar.date, bar.time)
     
+    store.saveBars(dbName, symbol, bars)
     print(u'插入完毕，耗时：%s' % (time()-start))
     
  #----------------------------------------------------------------------
-def loadTbPlusCsv(fileName, dbName, symbol):
+def loadTbPlusCsv(fileName, dbName, symbol, store=None):
     """将TB极速版导出的csv格式的历史分钟数据插入到Mongo数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol)) 
 
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)      
+    if not store:
+        store = MongoHistoryStore()
+    bars = []
 
     # 读取数据和插入到数据库
     reader = csv.reader(file(fileName, 'r'))
@@ -167,10 +180,11 @@ def loadTbPlusCsv(fileName, dbName, symbol):
         bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
         bar.volume = d[6]
         bar.openInterest = d[7]
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+        bars.append(bar)
+        saveBarChunk(store, dbName, symbol, bars)
         print(bar.date, bar.time)    
 
+    store.saveBars(dbName, symbol, bars)
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
@@ -184,16 +198,15 @@ def loadTbPlusCsv(fileName, dbName, symbol):
 
 注意事项：导出csv后手工删除表头和表尾
 """
-def loadTdxCsv(fileName, dbName, symbol):
+def loadTdxCsv(fileName, dbName, symbol, store=None):
     """将通达信导出的csv格式的历史分钟数据插入到Mongo数据库中"""
     start = time()
     date_correct = ""
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)   
+    if not store:
+        store = MongoHistoryStore()
+    bars = []
     
     # 读取数据和插入到数据库
     reader = csv.reader(file(fileName, 'r'))
@@ -217,9 +230,10 @@ def loadTdxCsv(fileName, dbName, symbol):
         bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
         bar.volume = d[5]
 
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+        bars.append(bar)
+        saveBarChunk(store, dbName, symbol, bars)
     
+    store.saveBars(dbName, symbol, bars)
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
@@ -229,16 +243,15 @@ def loadTdxCsv(fileName, dbName, symbol):
 
 注意事项：
 """   
-def loadTdxLc1(fileName, dbName, symbol):
+def loadTdxLc1(fileName, dbName, symbol, store=None):
     """将通达信导出的lc1格式的历史分钟数据插入到Mongo数据库中"""
     start = time()
 
     print(u'开始读取通达信Lc1文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)  
+    if not store:
+        store = MongoHistoryStore()
+    bars = []
 
     #读取二进制文件
     ofile=open(fileName,'rb')
@@ -266,21 +279,21 @@ def loadTdxLc1(fileName, dbName, symbol):
         bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
         bar.volume = a[7]
 
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)
+        bars.append(bar)
+        saveBarChunk(store, dbName, symbol, bars)
     
+    store.saveBars(dbName, symbol, bars)
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
-def loadOKEXCsv(fileName, dbName, symbol):
+def loadOKEXCsv(fileName, dbName, symbol, store=None):
     """将OKEX导出的csv格式的历史分钟数据插入到Mongo数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
 
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)
+    if not store:
+        store = MongoHistoryStore()
+    bars = []
 
     # 读取数据和插入到数据库
     reader = csv.reader(open(fileName,"r"))
@@ -302,9 +315,10 @@ def loadOKEXCsv(fileName, dbName, symbol):
             bar.volume = float(d[6])
             bar.tobtcvolume = float(d[7])
 
-            flt = {'datetime': bar.datetime}
-            collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)
+            bars.append(bar)
+            saveBarChunk(store, dbName, symbol, bars)
             print('%s \t %s' % (bar.date, bar.time))
 
+    store.saveBars(dbName, symbol, bars)
     print(u'插入完毕，耗时：%s' % (time()-start))
     
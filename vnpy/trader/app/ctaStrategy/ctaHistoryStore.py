@@ -0,0 +1,260 @@
+# encoding: UTF-8
+
+'''
+本文件中包含的是K线历史数据的存储接口，以及两种实现：
+
+1. MongoHistoryStore：基于MongoDB，和原有的数据库结构保持一致
+2. FileHistoryStore：基于本地二进制文件，每个合约按月分区保存，
+   读取时使用内存映射并通过二分查找截取时间范围，无需数据库
+
+回测引擎（BacktestingEngine.setHistoryStore）、历史数据服务器
+以及ctaHistoryData中的CSV导入函数都通过HistoryStore接口读写数据。
+'''
+from __future__ import division
+
+import os
+import json
+
+import numpy as np
+import pymongo
+
+from vnpy.trader.vtGlobal import globalSetting
+from vnpy.trader.vtConstant import EMPTY_STRING
+
+from .ctaBarFeed import BarFeed, INFO_FIELDS
+
+
+# 文件中每条K线的数据结构（小端字节序，固定长度）
+BAR_DTYPE = np.dtype([('datetime', '<M8[us]'),
+                      ('open', '<f8'),
+                      ('high', '<f8'),
+                      ('low', '<f8'),
+                      ('close', '<f8'),
+                      ('volume', '<f8'),
+                      ('openInterest', '<f8')])
+
+BAR_FILE_SUFFIX = '.bar'
+INFO_FILE_NAME = 'info.json'
+
+
+########################################################################
+class HistoryStore(object):
+    """K线历史数据存储接口"""
+
+    #----------------------------------------------------------------------
+    def saveBars(self, dbName, symbol, bars):
+        """
+        保存K线数据，bars为K线对象的列表（VtBarData或VtCompactBarData），
+        已存在的相同时间点的数据会被覆盖
+        """
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def loadBarFeed(self, dbName, symbol, start, end=None):
+        """载入[start, end]时间范围内的K线数据，返回BarFeed"""
+        raise NotImplementedError
+
+
+########################################################################
+class MongoHistoryStore(HistoryStore):
+    """基于MongoDB的K线历史数据存储"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, dbClient=None):
+        """Constructor"""
+        if not dbClient:
+            dbClient = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
+        self.dbClient = dbClient
+
+    #----------------------------------------------------------------------
+    def saveBars(self, dbName, symbol, bars):
+        """保存K线数据"""
+        collection = self.dbClient[dbName][symbol]
+        collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)
+
+        for bar in bars:
+            flt = {'datetime': bar.datetime}
+            collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)
+
+    #----------------------------------------------------------------------
+    def loadBarFeed(self, dbName, symbol, start, end=None):
+        """载入K线数据"""
+        return BarFeed.fromMongo(self.dbClient, dbName, symbol, start, end)
+
+
+########################################################################
+class FileHistoryStore(HistoryStore):
+    """
+    基于本地文件的K线历史数据存储
+
+    目录结构：rootDir/dbName/symbol/YYYYMM.bar，每个文件中是按时间排序的
+    BAR_DTYPE结构数组的原始字节，同一目录下的info.json保存合约信息。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, rootDir):
+        """Constructor"""
+        self.rootDir = rootDir
+
+    #----------------------------------------------------------------------
+    def getSymbolDir(self, dbName, symbol):
+        """获取合约数据目录"""
+        return os.path.join(self.rootDir, dbName, symbol)
+
+    #----------------------------------------------------------------------
+    def getPartitions(self, dbName, symbol):
+        """获取合约的所有分区（YYYYMM字符串），按时间排序"""
+        path = self.getSymbolDir(dbName, symbol)
+        if not os.path.isdir(path):
+            return []
+
+        partitions = [name[:-len(BAR_FILE_SUFFIX)] for name in os.listdir(path)
+                      if name.endswith(BAR_FILE_SUFFIX)]
+        partitions.sort()
+        return partitions
+
+    #----------------------------------------------------------------------
+    def getPartitionFile(self, dbName, symbol, partition):
+        """获取分区文件路径"""
+        return os.path.join(self.getSymbolDir(dbName, symbol), partition + BAR_FILE_SUFFIX)
+
+    #----------------------------------------------------------------------
+    def loadInfo(self, dbName, symbol):
+        """读取合约信息"""
+        fileName = os.path.join(self.getSymbolDir(dbName, symbol), INFO_FILE_NAME)
+        if not os.path.exists(fileName):
+            return {}
+
+        with open(fileName) as f:
+            return json.load(f)
+
+    #----------------------------------------------------------------------
+    def saveInfo(self, dbName, symbol, info):
+        """保存合约信息"""
+        fileName = os.path.join(self.getSymbolDir(dbName, symbol), INFO_FILE_NAME)
+        with open(fileName, 'w') as f:
+            json.dump(info, f)
+
+    #----------------------------------------------------------------------
+    def saveBars(self, dbName, symbol, bars):
+        """保存K线数据，新数据晚于已有数据时直接追加到文件末尾，否则合并后重写分区"""
+        if not bars:
+            return
+
+        path = self.getSymbolDir(dbName, symbol)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        if not self.loadInfo(dbName, symbol):
+            bar = bars[0]
+            info = {k: getattr(bar, k, EMPTY_STRING) for k in INFO_FIELDS}
+            self.saveInfo(dbName, symbol, info)
+
+        data = np.empty(len(bars), dtype=BAR_DTYPE)
+        data['datetime'] = [bar.datetime for bar in bars]
+        for k in BAR_DTYPE.names[1:]:
+            data[k] = [float(getattr(bar, k) or 0) for bar in bars]
+
+        data = self.sortUnique(data)
+
+        # 按月分区写入
+        months = data['datetime'].astype('datetime64[M]')
+        boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1
+
+        for chunk in np.split(data, boundaries):
+            partition = str(chunk['datetime'][0].astype('datetime64[M]')).replace('-', '')
+            self.writePartition(dbName, symbol, partition, chunk)
+
+    #----------------------------------------------------------------------
+    def writePartition(self, dbName, symbol, partition, data):
+        """写入单个分区的数据"""
+        fileName = self.getPartitionFile(dbName, symbol, partition)
+        existing = self.readPartition(fileName)
+
+        # 增量追加
+        if not len(existing) or data['datetime'][0] > existing['datetime'][-1]:
+            with open(fileName, 'ab') as f:
+                data.tofile(f)
+            return
+
+        # 时间有重叠则合并，相同时间点使用新数据
+        merged = self.sortUnique(np.concatenate([existing, data]))
+        del existing
+
+        tempName = fileName + '.tmp'
+        merged.tofile(tempName)
+
+        if os.path.exists(fileName):
+            os.remove(fileName)
+        os.rename(tempName, fileName)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def readPartition(fileName, mmap=False):
+        """读取分区文件，mmap为True时使用只读内存映射"""
+        if not os.path.exists(fileName) or not os.path.getsize(fileName):
+            return np.zeros(0, dtype=BAR_DTYPE)
+
+        if mmap:
+            return np.memmap(fileName, dtype=BAR_DTYPE, mode='r')
+        else:
+            return np.fromfile(fileName, dtype=BAR_DTYPE)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def sortUnique(data):
+        """按时间稳定排序，相同时间点只保留最后一条数据"""
+        data = data[np.argsort(data['datetime'], kind='mergesort')]
+
+        dt = data['datetime']
+        keep = np.ones(len(data), dtype=bool)
+        keep[:-1] = dt[1:] != dt[:-1]
+        return data[keep]
+
+    #----------------------------------------------------------------------
+    def loadBars(self, dbName, symbol, start=None, end=None):
+        """
+        载入[start, end]时间范围内的结构数组
+        只涉及单个分区时返回的是内存映射的视图，不会复制数据
+        """
+        startMonth = self.formatMonth(start)
+        endMonth = self.formatMonth(end)
+
+        pieces = []
+        for partition in self.getPartitions(dbName, symbol):
+            if startMonth and partition < startMonth:
+                continue
+            if endMonth and partition > endMonth:
+                break
+
+            data = self.readPartition(self.getPartitionFile(dbName, symbol, partition), mmap=True)
+            dt = data['datetime']
+
+            i = np.searchsorted(dt, np.datetime64(start, 'us')) if start else 0
+            j = np.searchsorted(dt, np.datetime64(end, 'us'), side='right') if end else len(dt)
+
+            if j > i:
+                pieces.append(data[i:j])
+
+        if not pieces:
+            return np.zeros(0, dtype=BAR_DTYPE)
+        elif len(pieces) == 1:
+            return pieces[0]
+        else:
+            return np.concatenate(pieces)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatMonth(dt):
+        """获取时间对应的分区名"""
+        if not dt:
+            return ''
+        return dt.strftime('%Y%m')
+
+    #----------------------------------------------------------------------
+    def loadBarFeed(self, dbName, symbol, start, end=None):
+        """载入K线数据"""
+        data = self.loadBars(dbName, symbol, start, end)
+
+        columns = {k: data[k] for k in BAR_DTYPE.names}
+        return BarFeed(columns, self.loadInfo(dbName, symbol))
@@ -0,0 +1,231 @@
+# encoding: UTF-8
+
+'''
+本文件中包含的是ArrayManager增量模式下使用的技术指标。
+
+每根K线到来时只根据新数据更新指标状态（滑动求和、Wilder平滑、单调队列），
+不需要对整个窗口重新计算，计算规则和talib中的对应函数保持一致。
+'''
+from __future__ import division
+
+from collections import deque
+from math import sqrt
+
+
+NAN = float('nan')
+
+# talib中判断浮点数为0的精度
+ZERO_EPSILON = 0.00000001
+
+
+########################################################################
+class SmaIndicator(object):
+    """简单均线，同talib.SMA"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.window = deque()
+        self.total = 0.0
+        self.updateCount = 0
+
+        self.value = NAN
+
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新K线数据"""
+        self.window.append(close)
+        self.total += close
+
+        if len(self.window) > self.n:
+            self.total -= self.window.popleft()
+
+        # 窗口完整滚动一次后重新求和，避免浮点误差累积
+        self.updateCount += 1
+        if self.updateCount >= self.n:
+            self.updateCount = 0
+            self.total = sum(self.window)
+
+        if len(self.window) == self.n:
+            self.value = self.total / self.n
+
+
+########################################################################
+class StdIndicator(object):
+    """标准差，同talib.STDDEV（总体标准差，nbdev为1）"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.window = deque()
+        self.total = 0.0            # 求和
+        self.squareTotal = 0.0      # 平方和
+        self.updateCount = 0
+
+        self.value = NAN
+
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新K线数据"""
+        self.window.append(close)
+        self.total += close
+        self.squareTotal += close * close
+
+        if len(self.window) > self.n:
+            old = self.window.popleft()
+            self.total -= old
+            self.squareTotal -= old * old
+
+        self.updateCount += 1
+        if self.updateCount >= self.n:
+            self.updateCount = 0
+            self.total = sum(self.window)
+            self.squareTotal = sum(x * x for x in self.window)
+
+        if len(self.window) == self.n:
+            mean = self.total / self.n
+            variance = self.squareTotal / self.n - mean * mean
+
+            if variance > 0:
+                self.value = sqrt(variance)
+            else:
+                self.value = 0.0
+
+
+########################################################################
+class AtrIndicator(object):
+    """ATR指标，同talib.ATR：前n个真实波幅取均值，之后使用Wilder平滑"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.preClose = None
+        self.count = 0          # 已计算的真实波幅数量
+        self.total = 0.0
+
+        self.value = NAN
+
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新K线数据"""
+        # 第一根K线没有昨收盘价，无法计算真实波幅
+        if self.preClose is None:
+            self.preClose = close
+            return
+
+        tr = max(high - low, abs(high - self.preClose), abs(low - self.preClose))
+        self.preClose = close
+
+        if self.count < self.n:
+            self.count += 1
+            self.total += tr
+
+            if self.count == self.n:
+                self.value = self.total / self.n
+        else:
+            self.value = (self.value * (self.n - 1) + tr) / self.n
+
+
+########################################################################
+class RsiIndicator(object):
+    """RSI指标，同talib.RSI：前n个涨跌幅取均值，之后使用Wilder平滑"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.preClose = None
+        self.count = 0          # 已计算的涨跌幅数量
+        self.avgGain = 0.0
+        self.avgLoss = 0.0
+
+        self.value = NAN
+
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新K线数据"""
+        if self.preClose is None:
+            self.preClose = close
+            return
+
+        change = close - self.preClose
+        self.preClose = close
+
+        if self.count < self.n:
+            self.count += 1
+
+            if change < 0:
+                self.avgLoss -= change
+            else:
+                self.avgGain += change
+
+            if self.count < self.n:
+                return
+        else:
+            self.avgLoss *= self.n - 1
+            self.avgGain *= self.n - 1
+
+            if change < 0:
+                self.avgLoss -= change
+            else:
+                self.avgGain += change
+
+        self.avgLoss /= self.n
+        self.avgGain /= self.n
+
+        total = self.avgGain + self.avgLoss
+        if -ZERO_EPSILON < total < ZERO_EPSILON:
+            self.value = 0.0
+        else:
+            self.value = 100.0 * (self.avgGain / total)
+
+
+########################################################################
+class DonchianIndicator(object):
+    """唐奇安通道，同talib.MAX(high)和talib.MIN(low)，使用单调队列维护窗口内的极值"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.count = 0
+        self.highQueue = deque()    # (序号, 最高价)，价格单调递减
+        self.lowQueue = deque()     # (序号, 最低价)，价格单调递增
+
+        self.up = NAN
+        self.down = NAN
+
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新K线数据"""
+        i = self.count
+        self.count += 1
+
+        highQueue = self.highQueue
+        while highQueue and highQueue[-1][1] <= high:
+            highQueue.pop()
+        highQueue.append((i, high))
+
+        lowQueue = self.lowQueue
+        while lowQueue and lowQueue[-1][1] >= low:
+            lowQueue.pop()
+        lowQueue.append((i, low))
+
+        # 移除窗口之外的数据
+        if highQueue[0][0] <= i - self.n:
+            highQueue.popleft()
+        if lowQueue[0][0] <= i - self.n:
+            lowQueue.popleft()
+
+        if self.count >= self.n:
+            self.up = highQueue[0][1]
+            self.down = lowQueue[0][1]
+
+    #----------------------------------------------------------------------
+    @property
+    def value(self):
+        """通道上下轨"""
+        return self.up, self.down
@@ -11,6 +11,8 @@ from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import VtBarData
 
 from .ctaBase import *
+from .ctaIndicator import (SmaIndicator, StdIndicator, AtrIndicator,
+                           RsiIndicator, DonchianIndicator)
 
 
 ########################################################################
@@ -463,73 +465,125 @@ class ArrayManager(object):
     K线序列管理工具，负责：
     1. K线时间序列的维护
     2. 常用技术指标的计算
+    
+    K线数据保存在长度为2倍size的环形缓冲区中，每个数据同时写入i和i+size两个位置，
+    因此最近size根K线在缓冲区中始终是连续的，更新时不需要移动整个数组。
+    
+    incremental为True时，sma/std/atr/rsi/donchian（以及基于它们的boll/keltner）
+    获取最新值时使用增量计算的指标，不再每次对整个窗口调用talib，
+    指标在第一次获取时使用缓存中已有的数据初始化。注意atr和rsi使用的Wilder平滑
+    从初始化时开始连续计算，而talib每次只基于最近size根K线重新平滑，两者存在微小差异。
     """
 
     #----------------------------------------------------------------------
-    def __init__(self, size=100):
+    def __init__(self, size=100, incremental=False):
         """Constructor"""
         self.count = 0                      # 缓存计数
         self.size = size                    # 缓存大小
         self.inited = False                 # True if count>=size
+        self.incremental = incremental      # 是否使用增量计算的指标
+        
+        self.openBuffer = np.zeros(size * 2)    # OHLC环形缓冲区
+        self.highBuffer = np.zeros(size * 2)
+        self.lowBuffer = np.zeros(size * 2)
+        self.closeBuffer = np.zeros(size * 2)
+        self.volumeBuffer = np.zeros(size * 2)
+        self.start = 0                          # 当前窗口在缓冲区中的起始位置
         
-        self.openArray = np.zeros(size)     # OHLC
-        self.highArray = np.zeros(size)
-        self.lowArray = np.zeros(size)
-        self.closeArray = np.zeros(size)
-        self.volumeArray = np.zeros(size)
+        self.indicatorDict = {}             # 增量指标字典，key为(指标名, 参数)
         
     #----------------------------------------------------------------------
     def updateBar(self, bar):
         """更新K线"""
+        i = self.count % self.size
+        j = i + self.size
+        
         self.count += 1
         if not self.inited and self.count >= self.size:
             self.inited = True
         
-        self.openArray[0:self.size-1] = self.openArray[1:self.size]
-        self.highArray[0:self.size-1] = self.highArray[1:self.size]
-        self.lowArray[0:self.size-1] = self.lowArray[1:self.size]
-        self.closeArray[0:self.size-1] = self.closeArray[1:self.size]
-        self.volumeArray[0:self.size-1] = self.volumeArray[1:self.size]
-    
-        self.openArray[-1] = bar.open
-        self.highArray[-1] = bar.high
-        self.lowArray[-1] = bar.low        
-        self.closeArray[-1] = bar.close
-        self.volumeArray[-1] = bar.volume
+        self.openBuffer[i] = self.openBuffer[j] = bar.open
+        self.highBuffer[i] = self.highBuffer[j] = bar.high
+        self.lowBuffer[i] = self.lowBuffer[j] = bar.low
+        self.closeBuffer[i] = self.closeBuffer[j] = bar.close
+        self.volumeBuffer[i] = self.volumeBuffer[j] = bar.volume
+        
+        self.start = i + 1
+        
+        # 更新增量指标
+        if self.indicatorDict:
+            high = self.highBuffer.item(j)
+            low = self.lowBuffer.item(j)
+            close = self.closeBuffer.item(j)
+            
+            for indicator in self.indicatorDict.values():
+                indicator.update(high, low, close)
         
     #----------------------------------------------------------------------
     @property
     def open(self):
         """获取开盘价序列"""
-        return self.openArray
+        return self.openBuffer[self.start:self.start+self.size]
         
     #----------------------------------------------------------------------
     @property
     def high(self):
         """获取最高价序列"""
-        return self.highArray
+        return self.highBuffer[self.start:self.start+self.size]
     
     #----------------------------------------------------------------------
     @property
     def low(self):
         """获取最低价序列"""
-        return self.lowArray
+        return self.lowBuffer[self.start:self.start+self.size]
     
     #----------------------------------------------------------------------
     @property
     def close(self):
         """获取收盘价序列"""
-        return self.closeArray
+        return self.closeBuffer[self.start:self.start+self.size]
     
     #----------------------------------------------------------------------
     @property    
     def volume(self):
         """获取成交量序列"""
-        return self.volumeArray
+        return self.volumeBuffer[self.start:self.start+self.size]
+    
+    # 兼容之前版本的数组名称
+    openArray = open
+    highArray = high
+    lowArray = low
+    closeArray = close
+    volumeArray = volume
+    
+    #----------------------------------------------------------------------
+    def getIndicator(self, name, indicatorClass, n):
+        """获取增量指标，不存在则创建并使用缓存中已有的数据初始化"""
+        key = (name, n)
+        indicator = self.indicatorDict.get(key)
+        
+        if not indicator:
+            indicator = indicatorClass(n)
+            
+            count = min(self.count, self.size)
+            if count:
+                high = self.high[-count:].tolist()
+                low = self.low[-count:].tolist()
+                close = self.close[-count:].tolist()
+                
+                for data in zip(high, low, close):
+                    indicator.update(*data)
+            
+            self.indicatorDict[key] = indicator
+        
+        return indicator
     
     #----------------------------------------------------------------------
     def sma(self, n, array=False):
         """简单均线"""
+        if self.incremental and not array:
+            return self.getIndicator('sma', SmaIndicator, n).value
+        
         result = talib.SMA(self.close, n)
         if array:
             return result
@@ -538,6 +592,9 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def std(self, n, array=False):
         """标准差"""
+        if self.incremental and not array:
+            return self.getIndicator('std', StdIndicator, n).value
+        
         result = talib.STDDEV(self.close, n)
         if array:
             return result
@@ -554,6 +611,9 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def atr(self, n, array=False):
         """ATR指标"""
+        if self.incremental and not array:
+            return self.getIndicator('atr', AtrIndicator, n).value
+        
         result = talib.ATR(self.high, self.low, self.close, n)
         if array:
             return result
@@ -562,6 +622,9 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def rsi(self, n, array=False):
         """RSI指标"""
+        if self.incremental and not array:
+            return self.getIndicator('rsi', RsiIndicator, n).value
+        
         result = talib.RSI(self.close, n)
         if array:
             return result
@@ -609,6 +672,9 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def donchian(self, n, array=False):
         """唐奇安通道"""
+        if self.incremental and not array:
+            return self.getIndicator('donchian', DonchianIndicator, n).value
+        
         up = talib.MAX(self.high, n)
         down = talib.MIN(self.low, n)
         
@@ -15,5 +15,11 @@ MINUTE_DB_NAME = 'VnTrader_1Min_Db'
 # 行情记录模块事件
 EVENT_DATARECORDER_LOG = 'eDataRecorderLog'     # 行情记录日志更新事件
 
+# 数据插入队列已满时的处理方式
+QUEUE_FULL_BLOCK = 'block'      # 阻塞等待（反压到事件引擎，数据库缓慢时会卡住整个事件引擎线程）
+QUEUE_FULL_DROP = 'drop'        # 丢弃新数据并计数、输出日志（默认）
+
+QUEUE_FULL_LOG_INTERVAL = 10    # 丢弃数据时两次日志输出之间的最小间隔（秒）
+
 # CTA引擎中涉及的数据类定义
 from vnpy.trader.vtConstant import EMPTY_UNICODE, EMPTY_STRING, EMPTY_FLOAT, EMPTY_INT
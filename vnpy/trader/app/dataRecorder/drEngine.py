@@ -4,6 +4,9 @@
 本文件中实现了行情数据记录引擎，用于汇总TICK数据，并生成K线插入数据库。
 
 使用DR_setting.json来配置需要收集的合约，以及主力合约代码。
+
+数据库插入在单独的线程中批量执行：数据按集合分组缓存，缓存数量达到batchSize
+或者距离上次写入超过flushInterval秒时，使用insert_many一次性写入。
 '''
 
 import json
@@ -13,9 +16,10 @@ import copy
 import traceback
 from collections import OrderedDict
 from datetime import datetime, timedelta, time
-from Queue import Queue, Empty
+from Queue import Queue, Empty, Full
 from threading import Thread
-from pymongo.errors import DuplicateKeyError
+from timeit import default_timer
+from pymongo.errors import BulkWriteError, PyMongoError
 
 from vnpy.event import Event
 from vnpy.trader.vtEvent import *
@@ -57,9 +61,33 @@ class DrEngine(object):
         
         # 负责执行数据库插入的单独线程相关
         self.active = False                     # 工作状态
-        self.queue = Queue()                    # 队列
+        self.queue = None                       # 队列，载入配置后创建
         self.thread = Thread(target=self.run)   # 线程
         
+        # 批量写入相关配置
+        self.batchSize = 500                    # 单个集合缓存的数据量达到该值时写入
+        self.flushInterval = 1.0                # 距离上次写入超过该秒数时写入所有缓存
+        self.maxQueueSize = 100000              # 队列最大长度，0为不限制
+        self.queueFullPolicy = QUEUE_FULL_DROP  # 队列已满时的处理方式，默认丢弃以免阻塞事件引擎
+        self.statsInterval = 60                 # 统计日志的输出间隔（秒），0为不输出
+        
+        # 批量写入缓存，key为(dbName, collectionName)，value为数据字典列表
+        self.batchDict = {}
+        self.lastFlushTime = default_timer()
+        self.lastStatsTime = default_timer()
+        
+        # 统计数据
+        self.droppedCount = 0                   # 队列已满时丢弃的数据量
+        self.lastDropLogTime = None             # 上一次输出丢弃日志的时间
+        self.insertedCount = 0                  # 已写入的数据量
+        self.errorCount = 0                     # 写入失败的数据量
+        self.batchCount = 0                     # 写入次数
+        self.lastBatchSize = 0
+        self.maxBatchSize = 0
+        self.lastWriteTime = 0                  # 写入耗时（秒）
+        self.maxWriteTime = 0
+        self.totalWriteTime = 0
+        
         # 收盘相关
         self.marketCloseTime = None             # 收盘时间
         self.timerCount = 0                     # 定时器计数
@@ -67,6 +95,7 @@ class DrEngine(object):
         
         # 载入设置，订阅行情
         self.loadSetting()
+        self.queue = Queue(maxsize=self.maxQueueSize)
         
         # 启动数据插入线程
         self.start()
@@ -85,6 +114,13 @@ class DrEngine(object):
             if not working:
                 return
             
+            # 加载批量写入配置
+            self.batchSize = drSetting.get('batchSize', self.batchSize)
+            self.flushInterval = drSetting.get('flushInterval', self.flushInterval)
+            self.maxQueueSize = drSetting.get('maxQueueSize', self.maxQueueSize)
+            self.queueFullPolicy = drSetting.get('queueFullPolicy', self.queueFullPolicy)
+            self.statsInterval = drSetting.get('statsInterval', self.statsInterval)
+            
             # 加载收盘时间
             if 'marketCloseTime' in drSetting:
                 timestamp = drSetting['marketCloseTime']
@@ -272,28 +308,149 @@ class DrEngine(object):
     #----------------------------------------------------------------------
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是VtTickData或者VtBarData）"""
-        self.queue.put((dbName, collectionName, data.__dict__))
+        item = (dbName, collectionName, data.__dict__)
+        
+        # 阻塞模式下队列已满时等待写入线程（反压），否则丢弃新数据，避免阻塞事件引擎线程
+        if self.queueFullPolicy == QUEUE_FULL_BLOCK:
+            self.queue.put(item)
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except Full:
+                self.onQueueFull()
+    
+    #----------------------------------------------------------------------
+    def onQueueFull(self):
+        """队列已满丢弃数据时计数，并按间隔输出日志"""
+        self.droppedCount += 1
+        
+        now = default_timer()
+        if self.lastDropLogTime is None or now - self.lastDropLogTime >= QUEUE_FULL_LOG_INTERVAL:
+            self.lastDropLogTime = now
+            self.writeDrLog(text.QUEUE_FULL_MESSAGE.format(maxQueueSize=self.maxQueueSize,
+                                                           droppedCount=self.droppedCount))
         
     #----------------------------------------------------------------------
     def run(self):
         """运行插入线程"""
         while self.active:
+            # 最多等待到下一次定时写入的时间
+            timeout = self.flushInterval - (default_timer() - self.lastFlushTime)
+            
             try:
-                dbName, collectionName, d = self.queue.get(block=True, timeout=1)
-                
-                # 这里采用MongoDB的update模式更新数据，在记录tick数据时会由于查询
-                # 过于频繁，导致CPU占用和硬盘读写过高后系统卡死，因此不建议使用
-                #flt = {'datetime': d['datetime']}
-                #self.mainEngine.dbUpdate(dbName, collectionName, d, flt, True)
-                
-                # 使用insert模式更新数据，可能存在时间戳重复的情况，需要用户自行清洗
-                try:
-                    self.mainEngine.dbInsert(dbName, collectionName, d)
-                except DuplicateKeyError:
-                    self.writeDrLog(u'键值重复插入失败，报错信息：%s' %traceback.format_exc())
+                dbName, collectionName, d = self.queue.get(block=True, timeout=max(timeout, 0.01))
+                self.addToBatch(dbName, collectionName, d)
             except Empty:
                 pass
             
+            now = default_timer()
+            
+            if now - self.lastFlushTime >= self.flushInterval:
+                self.flushAll()
+            
+            if self.statsInterval and now - self.lastStatsTime >= self.statsInterval:
+                self.lastStatsTime = now
+                self.writeDrLog(text.STATS_LOGGING_MESSAGE.format(**self.getStats()))
+        
+        # 退出前写入队列中剩余的数据
+        while True:
+            try:
+                dbName, collectionName, d = self.queue.get_nowait()
+                self.addToBatch(dbName, collectionName, d)
+            except Empty:
+                break
+        
+        self.flushAll()
+    
+    #----------------------------------------------------------------------
+    def addToBatch(self, dbName, collectionName, d):
+        """将数据加入批量写入缓存，数量达到batchSize时立即写入"""
+        key = (dbName, collectionName)
+        
+        l = self.batchDict.setdefault(key, [])
+        l.append(d)
+        
+        if len(l) >= self.batchSize:
+            self.flush(key)
+    
+    #----------------------------------------------------------------------
+    def flush(self, key):
+        """写入某个集合的缓存数据"""
+        documents = self.batchDict.pop(key, None)
+        if not documents:
+            return
+        
+        dbName, collectionName = key
+        batchSize = len(documents)
+        errorCount = 0
+        start = default_timer()
+        
+        # 这里采用MongoDB的update模式更新数据，在记录tick数据时会由于查询
+        # 过于频繁，导致CPU占用和硬盘读写过高后系统卡死，因此不建议使用
+        #flt = {'datetime': d['datetime']}
+        #self.mainEngine.dbUpdate(dbName, collectionName, d, flt, True)
+        
+        # 使用insert模式批量写入，可能存在时间戳重复的情况，需要用户自行清洗，
+        # 非顺序写入时单条数据失败不影响其他数据
+        try:
+            # 数据库未连接时数据没有写入，计为失败
+            if not self.mainEngine.dbInsertMany(dbName, collectionName, documents, ordered=False):
+                errorCount = batchSize
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            errorCount = len(errors)
+            self.writeDrLog(u'批量插入%s中的%s条数据失败，第一条报错信息：%s' 
+                            %(collectionName, len(errors), errors[0].get('errmsg') if errors else e))
+        except PyMongoError:
+            errorCount = batchSize
+            self.writeDrLog(u'批量插入%s失败，报错信息：%s' %(collectionName, traceback.format_exc()))
+        
+        # 更新统计数据
+        writeTime = default_timer() - start
+        
+        self.insertedCount += batchSize - errorCount
+        self.errorCount += errorCount
+        self.batchCount += 1
+        self.lastBatchSize = batchSize
+        self.maxBatchSize = max(self.maxBatchSize, batchSize)
+        self.lastWriteTime = writeTime
+        self.maxWriteTime = max(self.maxWriteTime, writeTime)
+        self.totalWriteTime += writeTime
+    
+    #----------------------------------------------------------------------
+    def flushAll(self):
+        """写入所有缓存数据"""
+        for key in list(self.batchDict.keys()):
+            self.flush(key)
+        
+        self.lastFlushTime = default_timer()
+    
+    #----------------------------------------------------------------------
+    def getStats(self):
+        """获取批量写入的统计数据（时间单位为秒）"""
+        if self.batchCount:
+            avgBatchSize = float(self.insertedCount + self.errorCount) / self.batchCount
+            avgWriteTime = self.totalWriteTime / self.batchCount
+        else:
+            avgBatchSize = 0
+            avgWriteTime = 0
+        
+        d = {
+            'queueSize': self.queue.qsize(),
+            'maxQueueSize': self.maxQueueSize,
+            'droppedCount': self.droppedCount,
+            'insertedCount': self.insertedCount,
+            'errorCount': self.errorCount,
+            'batchCount': self.batchCount,
+            'lastBatchSize': self.lastBatchSize,
+            'maxBatchSize': self.maxBatchSize,
+            'avgBatchSize': avgBatchSize,
+            'lastWriteTime': self.lastWriteTime,
+            'maxWriteTime': self.maxWriteTime,
+            'avgWriteTime': avgWriteTime
+        }
+        return d
+            
     #----------------------------------------------------------------------
     def start(self):
         """启动"""
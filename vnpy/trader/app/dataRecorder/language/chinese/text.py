@@ -13,4 +13,6 @@ DOMINANT_CONTRACT = u'主力合约'
 DOMINANT_SYMBOL = u'主力代码'
 
 TICK_LOGGING_MESSAGE = u'记录Tick数据{symbol}，时间:{time}, last:{last}, bid:{bid}, ask:{ask}'
-BAR_LOGGING_MESSAGE = u'记录分钟线数据{symbol}，时间:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
\ No newline at end of file
+BAR_LOGGING_MESSAGE = u'记录分钟线数据{symbol}，时间:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
+STATS_LOGGING_MESSAGE = u'数据写入统计，队列:{queueSize}/{maxQueueSize}，丢弃:{droppedCount}，已写入:{insertedCount}，失败:{errorCount}，批次:{batchCount}，平均批量:{avgBatchSize:.1f}，平均耗时:{avgWriteTime:.4f}秒，最大耗时:{maxWriteTime:.4f}秒'
+QUEUE_FULL_MESSAGE = u'数据写入队列已满（{maxQueueSize}），新数据被丢弃，累计丢弃:{droppedCount}'
\ No newline at end of file
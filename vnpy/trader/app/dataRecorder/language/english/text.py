@@ -12,4 +12,6 @@ DOMINANT_CONTRACT = u'Dominant Contract'
 DOMINANT_SYMBOL = u'Dominant Symbol'
 
 TICK_LOGGING_MESSAGE = u'Record Tick Data {symbol}, Time:{time}, last:{last}, bid:{bid}, ask:{ask}'
-BAR_LOGGING_MESSAGE = u'Record Bar Data {symbol}, Time:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
\ No newline at end of file
+BAR_LOGGING_MESSAGE = u'Record Bar Data {symbol}, Time:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
+STATS_LOGGING_MESSAGE = u'Write stats, queue:{queueSize}/{maxQueueSize}, dropped:{droppedCount}, inserted:{insertedCount}, failed:{errorCount}, batches:{batchCount}, avg batch:{avgBatchSize:.1f}, avg latency:{avgWriteTime:.4f}s, max latency:{maxWriteTime:.4f}s'
+QUEUE_FULL_MESSAGE = u'Write queue is full ({maxQueueSize}), new data dropped, total dropped:{droppedCount}'
\ No newline at end of file
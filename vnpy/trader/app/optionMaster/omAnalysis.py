@@ -0,0 +1,125 @@
+# encoding: UTF-8
+
+'''
+持仓组合的情景分析
+
+创建分析对象时将组合中有持仓的期权数据拷贝为数组，之后对标的价格变动和波动率变动
+组成的情景网格进行一次广播计算，因此计算过程不再读取组合对象，可以在其他线程中运行。
+
+只有提供批量计算接口的定价模型（bsAnalytic、blackAnalytic、crr）能够进行向量化计算，
+其他模型（bs、black、bsCython、crrCython等）通过np.vectorize逐个期权调用标量函数，
+没有加速效果，大网格的耗时会高出几个数量级。
+'''
+
+from __future__ import division
+
+import numpy as np
+
+from .omDate import ANNUAL_TRADINGDAYS
+
+
+# 情景分析的结果字段
+SCENARIO_KEYS = ['pnl', 'delta', 'gamma', 'theta', 'vega']
+
+
+#----------------------------------------------------------------------
+def generateChangeArray(changeRange, changeCount):
+    """生成从-changeRange到+changeRange的变动数组，changeCount为网格数量"""
+    return np.linspace(-changeRange, changeRange, changeCount)
+
+#----------------------------------------------------------------------
+def vectorizeGreeks(model):
+    """将模型的标量希腊值计算函数包装为数组函数，用于不支持批量计算的模型"""
+    def calculateGreeks(s, k, r, t, v, cp):
+        # 和批量计算接口一致，波动率或者剩余时间为0的期权，价格为内在价值，希腊值为0
+        if t <= 0 or v <= 0:
+            return max(0, cp * (s - k)), 0, 0, 0, 0
+        return model.calculateGreeks(s, k, r, t, v, cp)
+
+    func = np.vectorize(calculateGreeks, otypes=[float]*5)
+
+    def calculateGreeksBatch(s, k, r, t, v, cp):
+        return func(s, k, r, t, v, cp)
+
+    return calculateGreeksBatch
+
+
+########################################################################
+class OmScenarioAnalysis(object):
+    """情景分析"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, portfolio):
+        """Constructor"""
+        # 标的物持仓
+        self.underlyingValue = 0        # 标的持仓市值（未乘以价格变动）
+        self.underlyingDelta = 0        # 标的持仓delta
+
+        for underlying in portfolio.underlyingDict.values():
+            self.underlyingValue += underlying.midPrice * underlying.netPos
+            self.underlyingDelta += underlying.theoDelta * underlying.netPos
+
+        # 期权持仓
+        optionList = [option for option in portfolio.optionDict.values() if option.netPos]
+
+        def createArray(func):
+            return np.array([func(option) for option in optionList], dtype=float)
+
+        self.s = createArray(lambda option: option.underlying.midPrice)
+        self.k = createArray(lambda option: option.k)
+        self.r = createArray(lambda option: option.r)
+        self.t = createArray(lambda option: option.t)
+        self.v = createArray(lambda option: option.pricingImpv)
+        self.cp = createArray(lambda option: option.cp)
+        self.theoPrice = createArray(lambda option: option.theoPrice)
+        self.posSize = createArray(lambda option: option.netPos * option.size)
+
+        # 定价函数
+        model = portfolio.model
+        self.calculateGreeksBatch = getattr(model, 'calculateGreeksBatch', None)
+        self.batchMode = bool(self.calculateGreeksBatch)     # 模型是否支持批量计算
+        if not self.batchMode:
+            self.calculateGreeksBatch = vectorizeGreeks(model)
+
+    #----------------------------------------------------------------------
+    def run(self, priceChangeArray, impvChangeArray, expiryChange=1/ANNUAL_TRADINGDAYS):
+        """
+        运行情景分析
+        priceChangeArray：标的价格变动比例数组
+        impvChangeArray：波动率变动比例数组
+        expiryChange：时间推移（年）
+
+        返回字典，key为SCENARIO_KEYS中的字段，value为二维数组，
+        行对应波动率变动，列对应价格变动
+        """
+        priceChange = np.asarray(priceChangeArray, dtype=float)
+        impvChange = np.asarray(impvChangeArray, dtype=float)
+        shape = (len(impvChange), len(priceChange))
+
+        # 标的物部分只和价格变动有关
+        result = {
+            'pnl': np.broadcast_to(self.underlyingValue * priceChange, shape).copy(),
+            'delta': np.full(shape, float(self.underlyingDelta)),
+            'gamma': np.zeros(shape),
+            'theta': np.zeros(shape),
+            'vega': np.zeros(shape)
+        }
+
+        if not self.posSize.size:
+            return result
+
+        # 数组维度为[波动率变动, 价格变动, 期权]
+        s = self.s * (1 + priceChange[None, :, None])
+        v = self.v * (1 + impvChange[:, None, None])
+        t = np.maximum(self.t - expiryChange, 0)
+
+        price, delta, gamma, theta, vega = self.calculateGreeksBatch(s, self.k, self.r, t, v, self.cp)
+
+        # 按持仓汇总到情景网格上
+        result['pnl'] += np.dot(price - self.theoPrice, self.posSize)
+        result['delta'] += np.dot(delta, self.posSize)
+        result['gamma'] += np.dot(gamma, self.posSize)
+        result['theta'] += np.dot(theta, self.posSize)
+        result['vega'] += np.dot(vega, self.posSize)
+
+        return result
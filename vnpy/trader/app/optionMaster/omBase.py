@@ -6,10 +6,12 @@ from copy import copy
 from collections import OrderedDict
 from math import log1p
 
+import numpy as np
+
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import VtTickData
 
-from .omDate import getTimeToMaturity
+from .omDate import getTimeToMaturity, toOrdinal
 
 
 # 常量定义
@@ -184,6 +186,7 @@ class OmOption(OmInstrument):
         self.midImpv = EMPTY_FLOAT
     
         # 定价公式
+        self.model = model
         self.calculatePrice = model.calculatePrice
         self.calculateGreeks = model.calculateGreeks
         self.calculateImpv = model.calculateImpv
@@ -205,6 +208,7 @@ class OmOption(OmInstrument):
         
         # 期权链
         self.chain = None
+        self.chainIndex = 0             # 在期权链数组中的位置
         
     #----------------------------------------------------------------------
     def calculateOptionImpv(self):
@@ -231,6 +235,15 @@ class OmOption(OmInstrument):
         if not underlyingPrice or not self.pricingImpv:
             return
         
+        # 到期日收盘后剩余时间为0，此时价格为内在价值，希腊值为0
+        if not self.t:
+            self.theoPrice = max(EMPTY_FLOAT, self.cp * (underlyingPrice - self.k))
+            self.theoDelta = EMPTY_FLOAT
+            self.theoGamma = EMPTY_FLOAT
+            self.theoTheta = EMPTY_FLOAT
+            self.theoVega = EMPTY_FLOAT
+            return
+        
         self.theoPrice, delta, gamma, theta, vega = self.calculateGreeks(underlyingPrice, 
                                                                          self.k, 
                                                                          self.r, 
@@ -280,6 +293,9 @@ class OmOption(OmInstrument):
     def setR(self, r):
         """设置折现率"""
         self.r = r
+        
+        if self.chain:
+            self.chain.rArray[self.chainIndex] = r
  
 
 ########################################################################
@@ -306,6 +322,13 @@ class OmChain(object):
             self.putDict[option.symbol] = option
             self.optionDict[option.symbol] = option
         
+        # 数组化的期权链数据，顺序和optionDict一致
+        self.optionList = list(self.optionDict.values())
+        for n, option in enumerate(self.optionList):
+            option.chainIndex = n
+        
+        self.initArray()
+        
         # 持仓数据
         self.longPos = EMPTY_INT
         self.shortPos = EMPTY_INT
@@ -316,6 +339,165 @@ class OmChain(object):
         self.posGamma = EMPTY_FLOAT
         self.posTheta = EMPTY_FLOAT
         self.posVega = EMPTY_FLOAT
+        
+        # 汇总初始持仓
+        self.calculatePosGreeks()
+    
+    #----------------------------------------------------------------------
+    def initArray(self):
+        """初始化期权链数组"""
+        def createArray(name):
+            return np.array([getattr(option, name) for option in self.optionList], dtype=float)
+        
+        # 合约属性
+        self.kArray = createArray('k')
+        self.cpArray = createArray('cp')
+        self.sizeArray = createArray('size')
+        self.rArray = createArray('r')
+        self.tArray = createArray('t')
+        self.expiryArray = np.array([toOrdinal(option.expiryDate) for option in self.optionList],
+                                    dtype=int)      # 到期日序数
+        
+        # 行情和持仓
+        self.bidArray = createArray('bidPrice1')
+        self.askArray = createArray('askPrice1')
+        self.netPosArray = createArray('netPos')
+        
+        # 计算结果
+        self.bidImpvArray = createArray('bidImpv')
+        self.askImpvArray = createArray('askImpv')
+        self.midImpvArray = createArray('midImpv')
+        
+        self.theoPriceArray = createArray('theoPrice')
+        self.theoDeltaArray = createArray('theoDelta')
+        self.theoGammaArray = createArray('theoGamma')
+        self.theoThetaArray = createArray('theoTheta')
+        self.theoVegaArray = createArray('theoVega')
+        
+        # 定价模型支持批量计算时（批量接口和单个期权的计算结果一致，如bsAnalytic、
+        # blackAnalytic、crr），标的行情更新时对整条期权链进行向量化计算
+        self.underlying = None
+        self.calculateGreeksBatch = None
+        self.calculateImpvBatch = None
+        
+        if self.optionList:
+            option = self.optionList[0]
+            self.underlying = option.underlying
+            self.calculateGreeksBatch = getattr(option.model, 'calculateGreeksBatch', None)
+            self.calculateImpvBatch = getattr(option.model, 'calculateImpvBatch', None)
+        
+        self.batchMode = bool(self.calculateGreeksBatch and self.calculateImpvBatch)
+    
+    #----------------------------------------------------------------------
+    def calculateChainImpv(self):
+        """批量计算整条期权链的隐含波动率"""
+        underlyingPrice = self.underlying.midPrice
+        if not underlyingPrice:
+            return
+        
+        mask = self.tArray > 0
+        if not mask.any():
+            return
+        
+        k = self.kArray[mask]
+        r = self.rArray[mask]
+        t = self.tArray[mask]
+        cp = self.cpArray[mask]
+        
+        askImpv = self.calculateImpvBatch(self.askArray[mask], underlyingPrice, k, r, t, cp)
+        bidImpv = self.calculateImpvBatch(self.bidArray[mask], underlyingPrice, k, r, t, cp)
+        
+        # 正常情况下波动率不应该超过100%，若超过则大概率为溢出，调整为1%
+        askImpv[askImpv > 1] = 0.01
+        bidImpv[bidImpv > 1] = 0.01
+        
+        self.askImpvArray[mask] = askImpv
+        self.bidImpvArray[mask] = bidImpv
+        self.midImpvArray[mask] = (askImpv + bidImpv) / 2
+        
+        # 更新到期权对象
+        for n, askImpv, bidImpv, midImpv in zip(np.flatnonzero(mask).tolist(),
+                                                askImpv.tolist(),
+                                                bidImpv.tolist(),
+                                                self.midImpvArray[mask].tolist()):
+            option = self.optionList[n]
+            option.askImpv = askImpv
+            option.bidImpv = bidImpv
+            option.midImpv = midImpv
+    
+    #----------------------------------------------------------------------
+    def calculateChainTheoGreeks(self):
+        """批量计算整条期权链的理论希腊值"""
+        underlyingPrice = self.underlying.midPrice
+        if not underlyingPrice:
+            return
+        
+        # 定价波动率由界面和策略直接修改期权对象，因此每次计算时读取
+        impvArray = np.array([option.pricingImpv for option in self.optionList], dtype=float)
+        
+        # 批量计算接口对剩余时间为0的期权返回内在价值和为0的希腊值，因此不需要过滤
+        mask = impvArray > 0
+        if not mask.any():
+            return
+        
+        size = self.sizeArray[mask]
+        price, delta, gamma, theta, vega = self.calculateGreeksBatch(underlyingPrice,
+                                                                     self.kArray[mask],
+                                                                     self.rArray[mask],
+                                                                     self.tArray[mask],
+                                                                     impvArray[mask],
+                                                                     self.cpArray[mask])
+        
+        self.theoPriceArray[mask] = price
+        self.theoDeltaArray[mask] = delta * size
+        self.theoGammaArray[mask] = gamma * size
+        self.theoThetaArray[mask] = theta * size
+        self.theoVegaArray[mask] = vega * size
+        
+        # 更新到期权对象
+        for n, price, delta, gamma, theta, vega in zip(np.flatnonzero(mask).tolist(),
+                                                       price.tolist(),
+                                                       self.theoDeltaArray[mask].tolist(),
+                                                       self.theoGammaArray[mask].tolist(),
+                                                       self.theoThetaArray[mask].tolist(),
+                                                       self.theoVegaArray[mask].tolist()):
+            option = self.optionList[n]
+            option.theoPrice = price
+            option.theoDelta = delta
+            option.theoGamma = gamma
+            option.theoTheta = theta
+            option.theoVega = vega
+    
+    #----------------------------------------------------------------------
+    def calculateChainPosGreeks(self):
+        """批量计算整条期权链的持仓希腊值"""
+        netPos = self.netPosArray
+        
+        posValue = self.theoPriceArray * netPos * self.sizeArray
+        posDelta = self.theoDeltaArray * netPos
+        posGamma = self.theoGammaArray * netPos
+        posTheta = self.theoThetaArray * netPos
+        posVega = self.theoVegaArray * netPos
+        
+        # 更新到期权对象
+        for option, value, delta, gamma, theta, vega in zip(self.optionList,
+                                                            posValue.tolist(),
+                                                            posDelta.tolist(),
+                                                            posGamma.tolist(),
+                                                            posTheta.tolist(),
+                                                            posVega.tolist()):
+            option.posValue = value
+            option.posDelta = delta
+            option.posGamma = gamma
+            option.posTheta = theta
+            option.posVega = vega
+        
+        # 汇总期权链
+        self.posValue = float(posValue.sum())
+        self.posDelta = float(posDelta.sum())
+        self.posGamma = float(posGamma.sum())
+        self.posTheta = float(posTheta.sum())
+        self.posVega = float(posVega.sum())
     
     #----------------------------------------------------------------------
     def calculatePosGreeks(self):
@@ -324,6 +506,7 @@ class OmChain(object):
         self.longPos = 0
         self.shortPos = 0
         self.netPos = 0
+        self.posValue = 0
         self.posDelta = 0
         self.posGamma = 0
         self.posTheta = 0
@@ -347,14 +530,38 @@ class OmChain(object):
         """期权行情更新"""
         option = self.optionDict[tick.symbol]
         option.newTick(tick)
+        
+        # 同步到期权链数组
+        n = option.chainIndex
+        self.bidArray[n] = option.bidPrice1
+        self.askArray[n] = option.askPrice1
+        self.bidImpvArray[n] = option.bidImpv
+        self.askImpvArray[n] = option.askImpv
+        self.midImpvArray[n] = option.midImpv
     
     #----------------------------------------------------------------------
     def newUnderlyingTick(self):
         """期货行情更新"""
-        for option in self.optionDict.values():
-            option.newUnderlyingTick()
-            
-        self.calculatePosGreeks()
+        if self.batchMode:
+            self.calculateChainImpv()
+            self.calculateChainTheoGreeks()
+            self.calculateChainPosGreeks()
+        else:
+            for option in self.optionDict.values():
+                option.newUnderlyingTick()
+                
+            self.calculatePosGreeks()
+        
+    #----------------------------------------------------------------------
+    def updateTimeToMaturity(self, dt=None):
+        """批量更新期权链的剩余到期时间，新的时间在下一次标的行情更新时用于计算"""
+        if not self.optionList:
+            return
+        
+        self.tArray = getTimeToMaturity(self.expiryArray, dt)
+        
+        for option, t in zip(self.optionList, self.tArray.tolist()):
+            option.t = t
         
     #----------------------------------------------------------------------
     def newTrade(self, trade):
@@ -373,6 +580,7 @@ class OmChain(object):
         
         # 更新到期权s中
         option.newTrade(trade)
+        self.netPosArray[option.chainIndex] = option.netPos
         
         # 计算持仓希腊值
         self.longPos = self.longPos - oldLongPos + option.longPos
@@ -418,7 +626,7 @@ class OmChain(object):
         
         self.r = sum(l)/len(l)
         for option in self.optionDict.values():
-            option.setR(r)
+            option.setR(self.r)
 
 
 ########################################################################
@@ -515,6 +723,12 @@ class OmPortfolio(object):
             underlying.newTrade(trade)
             self.calculatePosGreeks()
     
+    #----------------------------------------------------------------------
+    def updateTimeToMaturity(self, dt=None):
+        """更新所有期权的剩余到期时间"""
+        for chain in self.chainDict.values():
+            chain.updateTimeToMaturity(dt)
+    
     #----------------------------------------------------------------------
     def adjustR(self):
         """调整折现率"""
@@ -6,10 +6,13 @@ from __future__ import division
 
 import csv
 import datetime
+import numbers
 import sys
 import os
 from collections import OrderedDict
 
+import numpy as np
+
 from vnpy.trader.uiQt import QtCore, QtWidgets, QtGui
 
 
@@ -20,6 +23,9 @@ CALENDAR_FILENAME = 'TradingCalendar.csv'
 PATH = os.path.abspath(os.path.dirname(__file__))
 CALENDAR_FILEPATH = os.path.join(PATH, CALENDAR_FILENAME)
 
+# 交易时段，用于计算日内的剩余到期时间（默认为上交所ETF期权），为空则只按交易日计算
+TRADING_SESSIONS = [('09:30', '11:30'), ('13:00', '15:00')]
+
 # 加载日历数据
 try:
     with open(CALENDAR_FILEPATH, 'r') as f:
@@ -28,9 +34,6 @@ try:
 except IOError:
     CALENDAR = []
 
-# TimeToMaturity缓存字典
-TTM_DICT = {}      # key:date, value:float time(year)
-
 
 ########################################################################
 class CalendarEditor(QtWidgets.QTableWidget):
@@ -108,6 +111,8 @@ class CalendarEditor(QtWidgets.QTableWidget):
                     'description': description
                 }
                 writer.writerow(d)
+        
+        loadCalendar()
     
     #----------------------------------------------------------------------
     def initCalendar(self):
@@ -221,33 +226,171 @@ def initCalendarCsv():
         writer.writeheader()
         for d in calendarDict.values():
             writer.writerow(d)
+    
+    loadCalendar()
+
+
+#----------------------------------------------------------------------
+def toOrdinal(d):
+    """
+    将日期转换为序数，支持字符串（%Y%m%d或者%Y-%m-%d）、date和datetime对象，
+    整数和numpy数组则认为已经是序数直接返回
+    """
+    if isinstance(d, (np.ndarray, numbers.Integral)):
+        return d
+    
+    if isinstance(d, datetime.date):
+        return d.toordinal()
+    
+    d = d.replace('-', '')
+    return datetime.datetime.strptime(d, '%Y%m%d').toordinal()
+
+
+########################################################################
+class TradingCalendarIndex(object):
+    """
+    交易日历索引
+    
+    dateArray为日历中所有日期的序数（升序），countArray[i]为dateArray中前i个日期中的
+    交易日数量，因此任意日期之前的交易日数量都可以通过一次二分查找得到。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, calendar, sessions=TRADING_SESSIONS):
+        """Constructor"""
+        rowList = sorted([(toOrdinal(d['date']), not d['description']) for d in calendar])
+        
+        self.dateArray = np.array([row[0] for row in rowList], dtype=int)
+        self.countArray = np.concatenate([[0], np.cumsum([row[1] for row in rowList], dtype=int)])
+        
+        # 交易时段，转换为当日的秒数
+        self.sessionList = []
+        for start, end in sessions:
+            self.sessionList.append((self.parseTime(start), self.parseTime(end)))
+        self.sessionSeconds = sum([end - start for start, end in self.sessionList])
+        
+        # 当日相关的缓存，日期变化时重新计算
+        self.today = None
+        self.todayCount = 0         # 截至今日（含）的交易日数量
+        self.todayTrading = False   # 今日是否为交易日
+        
+        self.expiryDict = {}        # 到期日字符串:序数
+    
+    #----------------------------------------------------------------------
+    @staticmethod
+    def parseTime(s):
+        """将HH:MM格式的时间转换为当日的秒数"""
+        hour, minute = s.split(':')
+        return int(hour) * 3600 + int(minute) * 60
+    
+    #----------------------------------------------------------------------
+    def countTradingDays(self, d):
+        """计算截至日期d（含）的交易日数量，d可以是序数数组"""
+        return self.countArray[np.searchsorted(self.dateArray, d, side='right')]
+    
+    #----------------------------------------------------------------------
+    def tradingDaysBetween(self, start, end):
+        """计算start到end之间（均包含）的交易日数量，end可以是序数数组"""
+        start = toOrdinal(start)
+        end = toOrdinal(end)
+        days = np.maximum(self.countTradingDays(end) - self.countTradingDays(start - 1), 0)
+        
+        if isinstance(end, np.ndarray):
+            return days
+        return int(days)
+    
+    #----------------------------------------------------------------------
+    def isTradingDay(self, d):
+        """判断是否为交易日"""
+        d = toOrdinal(d)
+        return bool(self.countTradingDays(d) - self.countTradingDays(d - 1))
+    
+    #----------------------------------------------------------------------
+    def getSessionFraction(self, dt):
+        """计算当日剩余的交易时段占全天交易时段的比例"""
+        if not self.sessionSeconds:
+            return 1
+        
+        seconds = dt.hour * 3600 + dt.minute * 60 + dt.second
+        
+        remaining = 0
+        for start, end in self.sessionList:
+            remaining += max(0, end - max(start, seconds))
+        
+        return remaining / self.sessionSeconds
+    
+    #----------------------------------------------------------------------
+    def updateToday(self, today):
+        """日期变化时更新当日相关的缓存"""
+        self.today = today
+        
+        ordinal = today.toordinal()
+        self.todayCount = self.countTradingDays(ordinal)
+        self.todayTrading = self.isTradingDay(ordinal)
+    
+    #----------------------------------------------------------------------
+    def getTimeToMaturity(self, expiryDate, dt=None):
+        """
+        计算剩余的年化到期时间（交易日）
+        expiryDate：到期日字符串、日期对象或者序数数组（批量计算）
+        dt：计算时间，为空则使用当前时间
+        
+        剩余时间为今日之后到到期日（含）的交易日数量，加上今日剩余交易时段的比例
+        """
+        if not dt:
+            dt = datetime.datetime.now()
+        
+        if dt.date() != self.today:
+            self.updateToday(dt.date())
+        
+        if isinstance(expiryDate, np.ndarray):
+            expiry = expiryDate
+        else:
+            expiry = self.expiryDict.get(expiryDate, None)
+            if expiry is None:
+                expiry = toOrdinal(expiryDate)
+                if not isinstance(expiryDate, datetime.date):
+                    self.expiryDict[expiryDate] = expiry
+        
+        days = self.countTradingDays(expiry) - self.todayCount
+        
+        if self.todayTrading:
+            days = days + (expiry >= self.today.toordinal()) * self.getSessionFraction(dt)
+        
+        ttm = np.maximum(days, 0) / ANNUAL_TRADINGDAYS
+        
+        if isinstance(expiryDate, np.ndarray):
+            return ttm
+        return float(ttm)
+
+
+#----------------------------------------------------------------------
+def loadCalendar():
+    """读取日历文件并重建交易日历索引"""
+    global CALENDAR, CALENDAR_INDEX
+    
+    try:
+        with open(CALENDAR_FILEPATH, 'r') as f:
+            reader = csv.DictReader(f)
+            CALENDAR = [d for d in reader]
+    except IOError:
+        CALENDAR = []
+    
+    CALENDAR_INDEX = TradingCalendarIndex(CALENDAR)
 
+#----------------------------------------------------------------------
+def tradingDaysBetween(start, end):
+    """计算start到end之间（均包含）的交易日数量"""
+    return CALENDAR_INDEX.tradingDaysBetween(start, end)
 
 #----------------------------------------------------------------------
-def getTimeToMaturity(expiryDate):
-    """计算剩余的年化到期时间（交易日）"""
-    # 如果有缓存则直接返回
-    if expiryDate in TTM_DICT:
-        return TTM_DICT[expiryDate]
-    
-    # 获取日期对象
-    expiryDt = datetime.datetime.strptime(expiryDate, '%Y%m%d').date()
-    todayDt = datetime.date.today()
-    
-    tradingDays = 0
-    for d in CALENDAR:
-        dt = datetime.datetime.strptime(d['date'], '%Y-%m-%d').date()
-        # 判断是否为交易日的条件：
-        # 1. 日期大于等于今日
-        # 2. 日期小于等于到期日
-        # 3. 日期没有描述（假期）        
-        if dt>=todayDt and dt<=expiryDt and not d['description']:
-            tradingDays += 1
-    
-    # 缓存并返回年化剩余时间
-    ttm = tradingDays/ANNUAL_TRADINGDAYS
-    TTM_DICT[expiryDate] = ttm
-    return ttm
+def getTimeToMaturity(expiryDate, dt=None):
+    """计算剩余的年化到期时间（交易日），expiryDate为序数数组时进行批量计算"""
+    return CALENDAR_INDEX.getTimeToMaturity(expiryDate, dt)
+
+
+# 交易日历索引
+CALENDAR_INDEX = TradingCalendarIndex(CALENDAR)
     
     
 if __name__ == '__main__':
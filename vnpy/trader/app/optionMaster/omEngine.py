@@ -17,7 +17,8 @@ from vnpy.trader.vtConstant import (PRODUCT_OPTION, OPTION_CALL, OPTION_PUT,
                                     DIRECTION_LONG, DIRECTION_SHORT,
                                     OFFSET_OPEN, OFFSET_CLOSE,
                                     PRICETYPE_LIMITPRICE)
-from vnpy.pricing import black, bs, crr, bsCython, crrCython
+from vnpy.pricing import (black, bs, crr, bsCython, crrCython,
+                          blackAnalytic, bsAnalytic)
 
 from .omBase import (OmOption, OmUnderlying, OmChain, OmPortfolio,
                      EVENT_OM_LOG, EVENT_OM_STRATEGY, EVENT_OM_STRATEGYLOG,
@@ -33,6 +34,8 @@ MODEL_DICT['bs'] = bs
 MODEL_DICT['crr'] = crr
 MODEL_DICT['bsCython'] = bsCython
 MODEL_DICT['crrCython'] = crrCython
+MODEL_DICT['blackAnalytic'] = blackAnalytic
+MODEL_DICT['bsAnalytic'] = bsAnalytic
 
 
 
@@ -52,6 +55,9 @@ class OmEngine(object):
         self.portfolio = None
         self.optionContractDict = {}      # symbol:contract
         
+        self.ttmInterval = 60             # 剩余到期时间的更新间隔（秒）
+        self.timerCount = 0
+        
         self.strategyEngine = OmStrategyEngine(self, eventEngine)
         
         self.registerEvent()
@@ -60,6 +66,7 @@ class OmEngine(object):
     def registerEvent(self):
         """注册事件监听"""
         self.eventEngine.register(EVENT_CONTRACT, self.processContractEvent)
+        self.eventEngine.register(EVENT_TIMER, self.processTimerEvent)
     
     #----------------------------------------------------------------------
     def processTickEvent(self, event):
@@ -80,6 +87,19 @@ class OmEngine(object):
         if contract.symbol and contract.productClass == PRODUCT_OPTION:
             self.optionContractDict[contract.symbol] = contract
     
+    #----------------------------------------------------------------------
+    def processTimerEvent(self, event):
+        """定时事件，定期更新所有期权的剩余到期时间"""
+        if not self.portfolio:
+            return
+        
+        self.timerCount += 1
+        if self.timerCount < self.ttmInterval:
+            return
+        self.timerCount = 0
+        
+        self.portfolio.updateTimeToMaturity()
+    
     #----------------------------------------------------------------------
     def subscribeEvent(self, symbol):
         """订阅对应合约的事件"""
@@ -115,7 +135,15 @@ class OmEngine(object):
         if not model:
             self.writeLog(u'找不到定价模型%s' %setting['model'])
             return
-            
+
+        # 剩余到期时间的更新间隔
+        self.ttmInterval = setting.get('ttmInterval', self.ttmInterval)
+
+        # 二叉树模型的高度（可选）
+        steps = setting.get('steps', None)
+        if steps and hasattr(model, 'setSteps'):
+            model.setSteps(steps)
+
         # 创建标的对象
         underlyingDict = OrderedDict()
         
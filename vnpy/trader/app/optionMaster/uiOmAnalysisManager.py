@@ -2,9 +2,12 @@
 
 from __future__ import division
 
-import numpy as np
+import traceback
+from threading import Thread
 
 from .uiOmBase import *
+from .omAnalysis import OmScenarioAnalysis, generateChangeArray, SCENARIO_KEYS
+from .omDate import ANNUAL_TRADINGDAYS
 
 
 ########################################################################
@@ -35,17 +38,17 @@ class ScenarioValueMonitor(QtWidgets.QTableWidget):
         
         # 设置表头
         self.setColumnCount(len(priceChangeArray))
-        priceChangeHeaders = [('price %s%%' %(priceChange*100)) for priceChange in priceChangeArray]
+        priceChangeHeaders = [('price %.1f%%' %(priceChange*100)) for priceChange in priceChangeArray]
         self.setHorizontalHeaderLabels(priceChangeHeaders)
         
         self.setRowCount(len(impvChangeArray))
-        impvChangeHeaders = [('impv %s%%' %(impvChange*100)) for impvChange in impvChangeArray]
+        impvChangeHeaders = [('impv %.1f%%' %(impvChange*100)) for impvChange in impvChangeArray]
         self.setVerticalHeaderLabels(impvChangeHeaders)
 
-        # 设置数据
-        l = [d[self.key] for d in result.values()]
-        maxValue = max(l)
-        minValue = min(l)
+        # 设置数据，行对应波动率变动，列对应价格变动
+        valueArray = result[self.key]
+        maxValue = float(valueArray.max())
+        minValue = float(valueArray.min())
         
         # 最大和最小值相等，则说明计算逻辑有问题
         if maxValue == minValue:
@@ -54,10 +57,8 @@ class ScenarioValueMonitor(QtWidgets.QTableWidget):
         midValue = (maxValue + minValue) / 2
         colorRatio = 255*2/(maxValue-minValue)
         
-        for column, priceChange in enumerate(priceChangeArray):
-            for row, impvChange in enumerate(impvChangeArray):
-                value = result[(priceChange, impvChange)][self.key]
-                
+        for row, rowData in enumerate(valueArray.tolist()):
+            for column, value in enumerate(rowData):
                 # 计算颜色
                 red = 255
                 green = 255                
@@ -67,7 +68,7 @@ class ScenarioValueMonitor(QtWidgets.QTableWidget):
                     red -= abs(colorValue)
                 else:
                     green -= abs(colorValue)                
-                color = QtGui.QColor(red, green, 0)
+                color = QtGui.QColor(int(red), int(green), 0)
                 
                 # 插入单元格到表格中
                 cell = QtWidgets.QTableWidgetItem('%.1f' %value)
@@ -95,7 +96,7 @@ class ScenarioAnalysisMonitor(QtWidgets.QTabWidget):
         """"""
         self.valueMonitorList = []
         
-        for key in ['pnl', 'delta', 'gamma', 'theta', 'vega']:
+        for key in SCENARIO_KEYS:
             valueMonitor = ScenarioValueMonitor(key)
             self.addTab(valueMonitor, key)
             self.valueMonitorList.append(valueMonitor)
@@ -110,6 +111,7 @@ class ScenarioAnalysisMonitor(QtWidgets.QTabWidget):
 ########################################################################
 class AnalysisManager(QtWidgets.QWidget):
     """研究分析管理"""
+    signal = QtCore.Signal(object)
 
     #----------------------------------------------------------------------
     def __init__(self, omEngine, parent=None):
@@ -121,6 +123,8 @@ class AnalysisManager(QtWidgets.QWidget):
         
         self.initUi()
         
+        self.signal.connect(self.processResult)
+        
     #----------------------------------------------------------------------
     def initUi(self):
         """初始化界面"""
@@ -131,7 +135,24 @@ class AnalysisManager(QtWidgets.QWidget):
         self.buttonScenarioAnalysis = QtWidgets.QPushButton(u'情景分析')
         self.buttonScenarioAnalysis.clicked.connect(self.updateData)
         
+        # 情景网格设置
+        self.spinPriceRange = self.createSpinBox(1, 50, 5)
+        self.spinPriceCount = self.createSpinBox(3, 101, 11)
+        self.spinImpvRange = self.createSpinBox(1, 50, 5)
+        self.spinImpvCount = self.createSpinBox(3, 101, 11)
+        self.spinExpiryChange = self.createSpinBox(0, 60, 1)
+        
         hbox = QtWidgets.QHBoxLayout()
+        hbox.addWidget(QtWidgets.QLabel(u'价格变动范围(%)'))
+        hbox.addWidget(self.spinPriceRange)
+        hbox.addWidget(QtWidgets.QLabel(u'价格网格数'))
+        hbox.addWidget(self.spinPriceCount)
+        hbox.addWidget(QtWidgets.QLabel(u'波动率变动范围(%)'))
+        hbox.addWidget(self.spinImpvRange)
+        hbox.addWidget(QtWidgets.QLabel(u'波动率网格数'))
+        hbox.addWidget(self.spinImpvCount)
+        hbox.addWidget(QtWidgets.QLabel(u'时间推移(交易日)'))
+        hbox.addWidget(self.spinExpiryChange)
         hbox.addWidget(self.buttonScenarioAnalysis)
         hbox.addStretch()
         
@@ -140,68 +161,53 @@ class AnalysisManager(QtWidgets.QWidget):
         vbox.addWidget(self.scenarioAnalysisMonitor)
         self.setLayout(vbox)
         
+    #----------------------------------------------------------------------
+    def createSpinBox(self, minimum, maximum, value):
+        """创建整数输入框"""
+        spin = QtWidgets.QSpinBox()
+        spin.setRange(minimum, maximum)
+        spin.setValue(value)
+        return spin
+        
     #----------------------------------------------------------------------
     def updateData(self):
         """更新数据"""
-        result, priceChangeArray, impvChangeArray = self.runScenarioAnalysis()
-        if result:
-            self.scenarioAnalysisMonitor.updateData(result, priceChangeArray, impvChangeArray)
+        if not self.portfolio:
+            return
+        
+        # 在GUI线程中拷贝持仓数据，在后台线程中运行计算
+        analysis = OmScenarioAnalysis(self.portfolio)
+        if not analysis.batchMode:
+            self.omEngine.writeLog(u'定价模型不支持批量计算，情景分析将逐个期权计算，网格较大时耗时较长')
+        priceChangeArray = generateChangeArray(self.spinPriceRange.value() / 100,
+                                               self.spinPriceCount.value())
+        impvChangeArray = generateChangeArray(self.spinImpvRange.value() / 100,
+                                              self.spinImpvCount.value())
+        expiryChange = self.spinExpiryChange.value() / ANNUAL_TRADINGDAYS
+        
+        self.buttonScenarioAnalysis.setEnabled(False)
+        
+        thread = Thread(target=self.runScenarioAnalysis, 
+                        args=(analysis, priceChangeArray, impvChangeArray, expiryChange))
+        thread.daemon = True
+        thread.start()
     
     #----------------------------------------------------------------------
-    def runScenarioAnalysis(self):
-        """运行情景分析"""
-        portfolio = self.portfolio
-        calculateGreeks = portfolio.model.calculateGreeks
-        
-        if not portfolio:
-            return None, None, None
-        
-        changeRange = 5
-        priceChangeArray = np.arange(-changeRange, changeRange+1) / 100
-        impvChangeArray = np.arange(-changeRange, changeRange+1) / 100
-        expiryChange = 1/240    # 一个交易日对应的时间变化
-        result = {}     # 分析结果
-        
-        for priceChange in priceChangeArray:
-            for impvChange in impvChangeArray:
-                portfolioPnl = 0
-                portfolioDelta = 0
-                portfolioGamma = 0
-                portfolioTheta = 0
-                portfolioVega = 0
-                
-                for underlying in portfolio.underlyingDict.values():
-                    portfolioPnl += underlying.midPrice * underlying.netPos * priceChange
-                    portfolioDelta += underlying.theoDelta * underlying.netPos
-                    
-                try:
-                    for option in portfolio.optionDict.values():
-                        if not option.netPos:
-                            continue
-                        
-                        price, delta, gamma, theta, vega = calculateGreeks(option.underlying.midPrice*(1+priceChange),
-                                                                           option.k,
-                                                                           option.r,
-                                                                           max(option.t-expiryChange, 0),
-                                                                           option.pricingImpv*(1+impvChange),
-                                                                           option.cp)
-                        
-                        portfolioPnl += (price - option.theoPrice) * option.netPos * option.size
-                        portfolioDelta += delta * option.netPos * option.size
-                        portfolioGamma += gamma * option.netPos * option.size
-                        portfolioTheta += theta * option.netPos * option.size
-                        portfolioVega += vega * option.netPos * option.size
-                except ZeroDivisionError:
-                    return None, None, None
-                
-                d = {
-                    'pnl': portfolioPnl,
-                    'delta': portfolioDelta,
-                    'gamma': portfolioGamma,
-                    'theta': portfolioTheta,
-                    'vega': portfolioVega
-                }
-                result[(priceChange, impvChange)] = d
-        
-        return result, priceChangeArray, impvChangeArray    
-    
\ No newline at end of file
+    def runScenarioAnalysis(self, analysis, priceChangeArray, impvChangeArray, expiryChange):
+        """运行情景分析（后台线程）"""
+        try:
+            result = analysis.run(priceChangeArray, impvChangeArray, expiryChange)
+        except Exception:
+            traceback.print_exc()
+            result = None
+        
+        self.signal.emit((result, priceChangeArray, impvChangeArray))
+    
+    #----------------------------------------------------------------------
+    def processResult(self, data):
+        """显示情景分析结果"""
+        self.buttonScenarioAnalysis.setEnabled(True)
+        
+        result, priceChangeArray, impvChangeArray = data
+        if result:
+            self.scenarioAnalysisMonitor.updateData(result, priceChangeArray, impvChangeArray)
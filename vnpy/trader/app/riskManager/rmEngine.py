@@ -5,6 +5,11 @@
 1. 委托流控（单位时间内最大允许发出的委托数量）
 2. 总成交限制（每日总成交数量限制）
 3. 单笔委托的委托数量控制
+4. 活动委托数量控制（总数、单接口、单合约）
+5. 单策略的流控、单笔数量和活动委托控制
+
+流控使用滑动时间窗口，活动委托数量在发单和委托推送时增量维护，
+因此checkRisk的耗时和当前活动委托的数量无关。
 '''
 
 from __future__ import division
@@ -12,6 +17,9 @@ from __future__ import division
 import json
 import os
 import platform
+from collections import deque, defaultdict
+from threading import Lock
+from timeit import default_timer
 
 from vnpy.event import Event
 from vnpy.trader.vtEvent import *
@@ -27,6 +35,11 @@ class RmEngine(object):
     settingFilePath = getJsonPath(settingFileName, __file__)
 
     name = u'风控模块'
+    
+    FINISHED_STATUS = [STATUS_ALLTRADED, STATUS_REJECTED, STATUS_CANCELLED]
+    
+    # 保留的已结束委托号数量，只用于过滤推送早于发单返回的委托，不需要保留全部历史
+    FINISHED_ORDER_LIMIT = 10000
 
     #----------------------------------------------------------------------
     def __init__(self, mainEngine, eventEngine):
@@ -39,12 +52,15 @@ class RmEngine(object):
 
         # 是否启动风控
         self.active = False
+        
+        # 风控检查在发单线程中执行，委托和成交推送在事件引擎线程中处理，
+        # 读写计数和流控队列时需要加锁
+        self.lock = Lock()
 
         # 流控相关
-        self.orderFlowCount = EMPTY_INT     # 单位时间内委托计数
         self.orderFlowLimit = EMPTY_INT     # 委托限制
-        self.orderFlowClear = EMPTY_INT     # 计数清空时间（秒）
-        self.orderFlowTimer = EMPTY_INT     # 计数清空时间计时
+        self.orderFlowClear = EMPTY_INT     # 滑动窗口长度（秒）
+        self.orderFlowQueue = deque()       # 窗口内通过风控的委托时间戳
 
         # 单笔委托相关
         self.orderSizeLimit = EMPTY_INT     # 单笔委托最大限制
@@ -58,7 +74,21 @@ class RmEngine(object):
         self.orderCancelDict = {}           # 单一合约对应撤单次数的字典
 
         # 活动合约相关
-        self.workingOrderLimit = EMPTY_INT  # 活动合约最大限制
+        self.workingOrderLimit = EMPTY_INT          # 活动合约最大限制
+        self.gatewayWorkingOrderLimit = EMPTY_INT   # 单接口活动合约最大限制
+        self.symbolWorkingOrderLimit = EMPTY_INT    # 单合约活动合约最大限制
+        
+        self.workingOrderDict = {}                  # vtOrderID:(接口名, 合约代码, 策略名)
+        self.finishedOrderSet = set()               # 最近已结束的委托号
+        self.finishedOrderQueue = deque()           # 已结束的委托号，按结束顺序排列，用于限制集合大小
+        self.workingOrderCount = EMPTY_INT          # 活动委托总数
+        self.gatewayWorkingDict = defaultdict(int)  # 接口名:活动委托数
+        self.symbolWorkingDict = defaultdict(int)   # 合约代码:活动委托数
+        self.strategyWorkingDict = defaultdict(int) # 策略名:活动委托数
+        
+        # 单策略风控相关
+        self.strategyLimitDict = {}                 # 策略名:风控参数字典
+        self.strategyFlowDict = {}                  # 策略名:流控时间戳队列
         
         # 保证金相关
         self.marginRatioDict = {}           # 保证金占账户净值比例字典
@@ -84,10 +114,14 @@ class RmEngine(object):
             self.tradeLimit = d['tradeLimit']
 
             self.workingOrderLimit = d['workingOrderLimit']
+            self.gatewayWorkingOrderLimit = d.get('gatewayWorkingOrderLimit', self.workingOrderLimit)
+            self.symbolWorkingOrderLimit = d.get('symbolWorkingOrderLimit', self.workingOrderLimit)
 
             self.orderCancelLimit = d['orderCancelLimit']
             
             self.marginRatioLimit = d['marginRatioLimit']
+            
+            self.strategyLimitDict = d.get('strategyLimit', {})
 
     #----------------------------------------------------------------------
     def saveSetting(self):
@@ -106,10 +140,14 @@ class RmEngine(object):
             d['tradeLimit'] = self.tradeLimit
 
             d['workingOrderLimit'] = self.workingOrderLimit
+            d['gatewayWorkingOrderLimit'] = self.gatewayWorkingOrderLimit
+            d['symbolWorkingOrderLimit'] = self.symbolWorkingOrderLimit
 
             d['orderCancelLimit'] = self.orderCancelLimit
             
             d['marginRatioLimit'] = self.marginRatioLimit
+            
+            d['strategyLimit'] = self.strategyLimitDict
 
             # 写入json
             jsonD = json.dumps(d, indent=4)
@@ -119,38 +157,96 @@ class RmEngine(object):
     def registerEvent(self):
         """注册事件监听"""
         self.eventEngine.register(EVENT_TRADE, self.updateTrade)
-        self.eventEngine.register(EVENT_TIMER, self.updateTimer)
         self.eventEngine.register(EVENT_ORDER, self.updateOrder)
         self.eventEngine.register(EVENT_ACCOUNT, self.updateAccount)
         
     #----------------------------------------------------------------------
     def updateOrder(self, event):
-        """更新成交数据"""
-        # 只需要统计撤单成功的委托
+        """更新委托数据"""
         order = event.dict_['data']
-        if order.status != STATUS_CANCELLED:
+        
+        with self.lock:
+            # 更新活动委托计数
+            if order.status in self.FINISHED_STATUS:
+                self.removeWorkingOrder(order.vtOrderID)
+            elif order.vtOrderID not in self.workingOrderDict and order.vtOrderID not in self.finishedOrderSet:
+                # 不是通过主引擎发出的委托（如其他客户端发出）
+                self.addWorkingOrder(order.vtOrderID, order.gatewayName, order.vtSymbol, '')
+            
+            # 只需要统计撤单成功的委托
+            if order.status != STATUS_CANCELLED:
+                return
+            
+            if order.symbol not in self.orderCancelDict:
+                self.orderCancelDict[order.symbol] = 1
+            else:
+                self.orderCancelDict[order.symbol] += 1
+
+    #----------------------------------------------------------------------
+    def updateOrderSent(self, orderReq, gatewayName, vtOrderID):
+        """委托发出后由主引擎调用，记录活动委托"""
+        with self.lock:
+            # 委托推送可能早于该函数调用（如在其他线程中发单），已结束的委托不再记录
+            if not vtOrderID or vtOrderID in self.workingOrderDict or vtOrderID in self.finishedOrderSet:
+                return
+            
+            self.addWorkingOrder(vtOrderID, gatewayName, orderReq.vtSymbol, orderReq.strategyName)
+
+    #----------------------------------------------------------------------
+    def addWorkingOrder(self, vtOrderID, gatewayName, vtSymbol, strategyName):
+        """增加活动委托（调用时需持有锁）"""
+        self.workingOrderDict[vtOrderID] = (gatewayName, vtSymbol, strategyName)
+        
+        self.workingOrderCount += 1
+        self.gatewayWorkingDict[gatewayName] += 1
+        self.symbolWorkingDict[vtSymbol] += 1
+        if strategyName:
+            self.strategyWorkingDict[strategyName] += 1
+
+    #----------------------------------------------------------------------
+    def removeWorkingOrder(self, vtOrderID):
+        """移除活动委托（调用时需持有锁）"""
+        self.addFinishedOrder(vtOrderID)
+        
+        if vtOrderID not in self.workingOrderDict:
             return
+        gatewayName, vtSymbol, strategyName = self.workingOrderDict.pop(vtOrderID)
         
-        if order.symbol not in self.orderCancelDict:
-            self.orderCancelDict[order.symbol] = 1
-        else:
-            self.orderCancelDict[order.symbol] += 1
+        self.workingOrderCount -= 1
+        self.gatewayWorkingDict[gatewayName] -= 1
+        self.symbolWorkingDict[vtSymbol] -= 1
+        if strategyName:
+            self.strategyWorkingDict[strategyName] -= 1
+
+    #----------------------------------------------------------------------
+    def addFinishedOrder(self, vtOrderID):
+        """记录已结束的委托号，超过FINISHED_ORDER_LIMIT时移除最早的记录"""
+        if vtOrderID in self.finishedOrderSet:
+            return
+        
+        self.finishedOrderSet.add(vtOrderID)
+        self.finishedOrderQueue.append(vtOrderID)
+        
+        while len(self.finishedOrderQueue) > self.FINISHED_ORDER_LIMIT:
+            self.finishedOrderSet.discard(self.finishedOrderQueue.popleft())
 
     #----------------------------------------------------------------------
     def updateTrade(self, event):
         """更新成交数据"""
         trade = event.dict_['data']
-        self.tradeCount += trade.volume
+        with self.lock:
+            self.tradeCount += trade.volume
 
     #----------------------------------------------------------------------
-    def updateTimer(self, event):
-        """更新定时器"""
-        self.orderFlowTimer += 1
-
-        # 如果计时超过了流控清空的时间间隔，则执行清空
-        if self.orderFlowTimer >= self.orderFlowClear:
-            self.orderFlowCount = 0
-            self.orderFlowTimer = 0
+    def getOrderFlowCount(self, queue, window, now=None):
+        """移除滑动窗口之外的时间戳，返回窗口内的委托数量"""
+        if now is None:
+            now = default_timer()
+        
+        while queue and now - queue[0] >= window:
+            queue.popleft()
+        
+        return len(queue)
 
     #----------------------------------------------------------------------
     def updateAccount(self, event):
@@ -188,7 +284,13 @@ class RmEngine(object):
         # 如果没有启动风控检查，则直接返回成功
         if not self.active:
             return True
+        
+        with self.lock:
+            return self.checkRiskLocked(orderReq, gatewayName)
 
+    #----------------------------------------------------------------------
+    def checkRiskLocked(self, orderReq, gatewayName):
+        """检查风险（调用时需持有锁）"""
         # 检查委托数量
         if orderReq.volume <= 0:
             self.writeRiskLog(u'委托数量必须大于0')
@@ -206,16 +308,31 @@ class RmEngine(object):
             return False
 
         # 检查流控
-        if self.orderFlowCount >= self.orderFlowLimit:
+        now = default_timer()
+        orderFlowCount = self.getOrderFlowCount(self.orderFlowQueue, self.orderFlowClear, now)
+        if orderFlowCount >= self.orderFlowLimit:
             self.writeRiskLog(u'委托流数量%s，超过限制每%s秒%s'
-                              %(self.orderFlowCount, self.orderFlowClear, self.orderFlowLimit))
+                              %(orderFlowCount, self.orderFlowClear, self.orderFlowLimit))
             return False
 
         # 检查总活动合约
-        workingOrderCount = len(self.mainEngine.getAllWorkingOrders())
-        if workingOrderCount >= self.workingOrderLimit:
+        if self.workingOrderCount >= self.workingOrderLimit:
             self.writeRiskLog(u'当前活动委托数量%s，超过限制%s'
-                              %(workingOrderCount, self.workingOrderLimit))
+                              %(self.workingOrderCount, self.workingOrderLimit))
+            return False
+        
+        # 检查单接口活动合约
+        gatewayWorkingCount = self.gatewayWorkingDict.get(gatewayName, 0)
+        if gatewayWorkingCount >= self.gatewayWorkingOrderLimit:
+            self.writeRiskLog(u'%s接口活动委托数量%s，超过限制%s'
+                              %(gatewayName, gatewayWorkingCount, self.gatewayWorkingOrderLimit))
+            return False
+        
+        # 检查单合约活动合约
+        symbolWorkingCount = self.symbolWorkingDict.get(orderReq.vtSymbol, 0)
+        if symbolWorkingCount >= self.symbolWorkingOrderLimit:
+            self.writeRiskLog(u'%s合约活动委托数量%s，超过限制%s'
+                              %(orderReq.vtSymbol, symbolWorkingCount, self.symbolWorkingOrderLimit))
             return False
 
         # 检查撤单次数
@@ -230,21 +347,70 @@ class RmEngine(object):
                               %(gatewayName, self.marginRatioDict[gatewayName], self.marginRatioLimit))
             return False
         
+        # 检查单策略风控
+        strategyName = orderReq.strategyName
+        if strategyName in self.strategyLimitDict and not self.checkStrategyRisk(orderReq, strategyName, now):
+            return False
+        
         # 对于通过风控的委托，增加流控计数
-        self.orderFlowCount += 1
+        self.orderFlowQueue.append(now)
 
         return True
 
+    #----------------------------------------------------------------------
+    def checkStrategyRisk(self, orderReq, strategyName, now):
+        """检查单策略风险，参数字典中未配置的项目不检查"""
+        d = self.strategyLimitDict[strategyName]
+        
+        # 检查单笔委托数量
+        orderSizeLimit = d.get('orderSizeLimit')
+        if orderSizeLimit is not None and orderReq.volume > orderSizeLimit:
+            self.writeRiskLog(u'策略%s单笔委托数量%s，超过限制%s'
+                              %(strategyName, orderReq.volume, orderSizeLimit))
+            return False
+        
+        # 检查活动委托数量
+        workingOrderLimit = d.get('workingOrderLimit')
+        workingOrderCount = self.strategyWorkingDict.get(strategyName, 0)
+        if workingOrderLimit is not None and workingOrderCount >= workingOrderLimit:
+            self.writeRiskLog(u'策略%s活动委托数量%s，超过限制%s'
+                              %(strategyName, workingOrderCount, workingOrderLimit))
+            return False
+        
+        # 检查流控
+        orderFlowLimit = d.get('orderFlowLimit')
+        if orderFlowLimit is not None:
+            orderFlowClear = d.get('orderFlowClear', self.orderFlowClear)
+            
+            queue = self.strategyFlowDict.get(strategyName)
+            if queue is None:
+                queue = deque()
+                self.strategyFlowDict[strategyName] = queue
+            
+            orderFlowCount = self.getOrderFlowCount(queue, orderFlowClear, now)
+            if orderFlowCount >= orderFlowLimit:
+                self.writeRiskLog(u'策略%s委托流数量%s，超过限制每%s秒%s'
+                                  %(strategyName, orderFlowCount, orderFlowClear, orderFlowLimit))
+                return False
+            
+            queue.append(now)
+        
+        return True
+
     #----------------------------------------------------------------------
     def clearOrderFlowCount(self):
         """清空流控计数"""
-        self.orderFlowCount = 0
+        with self.lock:
+            self.orderFlowQueue.clear()
+            for queue in self.strategyFlowDict.values():
+                queue.clear()
         self.writeRiskLog(u'清空流控计数')
 
     #----------------------------------------------------------------------
     def clearTradeCount(self):
         """清空成交数量计数"""
-        self.tradeCount = 0
+        with self.lock:
+            self.tradeCount = 0
         self.writeRiskLog(u'清空总成交计数')
 
     #----------------------------------------------------------------------
@@ -277,6 +443,25 @@ class RmEngine(object):
         """设置单合约撤单次数上限"""
         self.orderCancelLimit = n
 
+    #----------------------------------------------------------------------
+    def setGatewayWorkingOrderLimit(self, n):
+        """设置单接口活动合约限制"""
+        self.gatewayWorkingOrderLimit = n
+
+    #----------------------------------------------------------------------
+    def setSymbolWorkingOrderLimit(self, n):
+        """设置单合约活动合约限制"""
+        self.symbolWorkingOrderLimit = n
+
+    #----------------------------------------------------------------------
+    def setStrategyLimit(self, strategyName, d):
+        """设置单策略风控参数，d中可以包含orderFlowLimit、orderFlowClear、orderSizeLimit、workingOrderLimit"""
+        if d:
+            self.strategyLimitDict[strategyName] = d
+        elif strategyName in self.strategyLimitDict:
+            del self.strategyLimitDict[strategyName]
+            self.strategyFlowDict.pop(strategyName, None)
+
     #----------------------------------------------------------------------
     def setMarginRatioLimit(self, n):
         """设置保证金比例限制"""
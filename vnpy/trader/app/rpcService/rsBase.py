@@ -0,0 +1,49 @@
+# encoding: UTF-8
+
+'''
+本文件中包含RPC服务端和客户端通用的定义。
+'''
+
+from vnpy.event import Event
+from vnpy.rpc import registerCompactClass
+from vnpy.trader.vtObject import (VtTickData, VtBarData, VtTradeData, VtOrderData,
+                                  VtPositionData, VtAccountData, VtErrorData,
+                                  VtLogData, VtContractData, VtSubscribeReq,
+                                  VtOrderReq, VtCancelOrderReq)
+
+
+# 使用紧凑格式传送的数据类，服务端和客户端的类定义必须一致
+COMPACT_CLASS_LIST = [Event, VtTickData, VtBarData, VtTradeData, VtOrderData,
+                      VtPositionData, VtAccountData, VtErrorData, VtLogData,
+                      VtContractData, VtSubscribeReq, VtOrderReq, VtCancelOrderReq]
+
+# 推送主题为事件类型加上结束符，zmq按前缀匹配订阅，加上结束符后订阅eTick.不会匹配eTick.rb1805
+TOPIC_END = '|'
+# 订阅时以该符号结尾表示按前缀匹配，如eTick.*订阅所有合约的行情（包括通用行情事件）
+TOPIC_PREFIX_MARK = '*'
+
+
+#----------------------------------------------------------------------
+def registerCompactClasses():
+    """注册紧凑格式的数据类"""
+    for cls in COMPACT_CLASS_LIST:
+        registerCompactClass(cls)
+
+#----------------------------------------------------------------------
+def getPublishTopic(type_):
+    """获取事件类型对应的推送主题"""
+    return type_ + TOPIC_END
+
+#----------------------------------------------------------------------
+def getSubscribeTopic(topic):
+    """
+    获取订阅的事件类型对应的zmq订阅前缀
+    默认精确匹配事件类型，以*结尾时按前缀匹配，为空则订阅全部事件
+    """
+    if not topic:
+        return topic
+    
+    if topic.endswith(TOPIC_PREFIX_MARK):
+        return topic[:-len(TOPIC_PREFIX_MARK)]
+    
+    return getPublishTopic(topic)
@@ -4,6 +4,8 @@ import copy
 
 from vnpy.rpc import RpcClient
 
+from .rsBase import registerCompactClasses, getSubscribeTopic
+
 
 ########################################################################
 class ObjectProxy(object):
@@ -55,15 +57,30 @@ class RsClient(RpcClient):
     #----------------------------------------------------------------------
     def callback(self, topic, data):
         """事件推送回调函数"""
-        self.eventEngine.put(data)      # 直接放入事件引擎中
+        # 服务端通过putLatest推送的事件（如行情）带有合并键，同样合并后放入事件引擎中
+        key = getattr(data, 'key_', None)
+        if key is not None:
+            self.eventEngine.putLatest(data, key)
+        else:
+            self.eventEngine.put(data)  # 直接放入事件引擎中
     
     #----------------------------------------------------------------------
-    def init(self, eventEngine):
-        """初始化"""
+    def init(self, eventEngine, topicList=None):
+        """
+        初始化
+        topicList：订阅的事件类型列表，为空则订阅全部事件
+        默认精确匹配事件类型（如eTick.只订阅通用行情事件），以*结尾时按前缀匹配（如eTick.*订阅所有合约的行情）
+        """
         self.eventEngine = eventEngine  # 绑定事件引擎对象
         
-        self.usePickle()                # 使用cPickle序列化
-        self.subscribeTopic('')         # 订阅全部主题推送
+        registerCompactClasses()
+        self.useCompact()               # 使用紧凑格式序列化
+        
+        if topicList is None:
+            topicList = ['']            # 订阅全部主题推送
+        for topic in topicList:
+            self.subscribeTopic(getSubscribeTopic(topic))
+        
         self.start()                    # 启动
 
 
@@ -80,10 +97,10 @@ class MainEngineProxy(object):
         self.client = None
         
     #----------------------------------------------------------------------
-    def init(self, reqAddress, subAddress):
-        """初始化"""
+    def init(self, reqAddress, subAddress, topicList=None):
+        """初始化，topicList为订阅的事件类型列表，为空则订阅全部事件"""
         self.client = RsClient(reqAddress, subAddress)
-        self.client.init(self.eventEngine)
+        self.client.init(self.eventEngine, topicList)
 
     #----------------------------------------------------------------------
     def __getattr__(self, name):
@@ -1,12 +1,26 @@
 # encoding: UTF-8
 
+'''
+本文件中实现了RPC服务引擎，将主引擎的函数提供给远程客户端调用，并将事件推送给客户端。
+
+事件推送以事件类型加上结束符作为主题，客户端默认精确订阅需要的事件类型（订阅eTick.
+只会收到通用行情事件，需要所有合约的行情事件时订阅eTick.*），没有客户端订阅的事件
+不进行打包。
+行情推送可以按合约限制频率，限频期间只保留每个合约的最新行情，在间隔到期后的下一个
+行情或者定时器事件时发出。
+'''
+
 import json
+from timeit import default_timer
 
-from vnpy.trader.vtConstant import EMPTY_STRING
+from vnpy.trader.vtConstant import EMPTY_STRING, EMPTY_FLOAT
+from vnpy.trader.vtEvent import EVENT_TICK, EVENT_TIMER
 
 from vnpy.rpc import RpcServer
 from vnpy.trader.vtFunction import getJsonPath
 
+from .rsBase import registerCompactClasses, getPublishTopic
+
 
 ########################################################################
 class RsEngine(object):
@@ -29,6 +43,12 @@ class RsEngine(object):
         
         self.functionDict = {}              # 调用过的函数对象缓存字典
         
+        # 行情限频相关
+        self.tickInterval = EMPTY_FLOAT     # 行情推送的最小间隔（秒），为0则不限制
+        self.symbolTickIntervalDict = {}    # 特定合约的推送间隔，vtSymbol:间隔
+        self.tickPublishTimeDict = {}       # (事件类型, vtSymbol):上一次推送时间
+        self.pendingTickDict = {}           # (事件类型, vtSymbol):限频期间等待推送的最新行情事件
+        
         self.loadSetting()
         self.registerEvent()
         
@@ -41,8 +61,15 @@ class RsEngine(object):
             self.repAddress = d['repAddress']
             self.pubAddress = d['pubAddress']
             
-            self.server = RpcServer(self.repAddress, self.pubAddress)
-            self.server.usePickle()
+            self.tickInterval = d.get('tickInterval', 0)
+            self.symbolTickIntervalDict = d.get('symbolTickInterval', {})
+            
+            # 主引擎的函数不保证线程安全，默认只使用1个工作线程
+            workerCount = d.get('workerCount', 1)
+            
+            self.server = RpcServer(self.repAddress, self.pubAddress, workerCount)
+            registerCompactClasses()
+            self.server.useCompact()
             self.server.register(self.call)
             self.server.start()
             
@@ -83,7 +110,63 @@ class RsEngine(object):
     #----------------------------------------------------------------------
     def processEvent(self, event):
         """处理事件推送"""
-        self.server.publish('', event)
+        type_ = event.type_
+        
+        # 定时器事件时发出到期的限频行情
+        if type_ == EVENT_TIMER and self.pendingTickDict:
+            self.publishPendingTick()
+        
+        # 没有客户端订阅的事件直接跳过，节省打包开销
+        topic = getPublishTopic(type_)
+        if not self.server.hasSubscriber(topic):
+            return
+        
+        if type_.startswith(EVENT_TICK) and not self.checkTickInterval(event):
+            return
+        
+        self.server.publish(topic, event)
+    
+    #----------------------------------------------------------------------
+    def getTickInterval(self, vtSymbol):
+        """获取合约的行情推送间隔"""
+        return self.symbolTickIntervalDict.get(vtSymbol, self.tickInterval)
+    
+    #----------------------------------------------------------------------
+    def checkTickInterval(self, event):
+        """检查行情事件是否可以推送，限频期间保存为等待推送的最新行情"""
+        vtSymbol = event.dict_['data'].vtSymbol
+        interval = self.getTickInterval(vtSymbol)
+        if not interval:
+            return True
+        
+        # 通用行情事件包含所有合约，因此使用事件类型和合约代码一起作为键
+        now = default_timer()
+        key = (event.type_, vtSymbol)
+        
+        if now - self.tickPublishTimeDict.get(key, 0) >= interval:
+            self.tickPublishTimeDict[key] = now
+            self.pendingTickDict.pop(key, None)
+            return True
+        
+        self.pendingTickDict[key] = event
+        return False
+    
+    #----------------------------------------------------------------------
+    def publishPendingTick(self):
+        """发出间隔已经到期的等待推送行情"""
+        now = default_timer()
+        
+        for key, event in list(self.pendingTickDict.items()):
+            type_, vtSymbol = key
+            interval = self.getTickInterval(vtSymbol)
+            
+            if now - self.tickPublishTimeDict.get(key, 0) >= interval:
+                self.tickPublishTimeDict[key] = now
+                del self.pendingTickDict[key]
+                
+                topic = getPublishTopic(type_)
+                if self.server.hasSubscriber(topic):
+                    self.server.publish(topic, event)
     
     #----------------------------------------------------------------------
     def stop(self):
@@ -1,6 +1,15 @@
 # encoding: UTF-8
 
+'''
+本文件中实现了RTD服务引擎，将指定类型的事件数据推送给Excel中的RTD客户端。
+
+Excel每秒只刷新有限次数，因此事件引擎线程中只保存每个键的最新数据，
+由推送线程按照固定间隔将有更新的数据打包，每个事件类型发出一条多帧消息。
+'''
+
 import json
+from threading import Thread, Event as ThreadEvent, Lock
+from datetime import datetime, date
 
 from vnpy.event import Event
 from vnpy.rpc import RpcServer
@@ -40,9 +49,21 @@ class RtdEngine(object):
         self.server = None
         self.eventTypeDict = {}     # key：事件类型，value：键
         
+        # 推送相关
+        self.flushInterval = 0.5            # 推送间隔（秒）
+        self.logActive = False              # 是否记录推送内容日志（调试用）
+        
+        self.pendingDict = {}               # (事件类型, 键):最新数据对象，保存上次推送后有更新的数据
+        self.pendingLock = Lock()
+        
+        self.stopEvent = ThreadEvent()
+        self.thread = Thread(target=self.run)
+        
         self.loadSetting()
         self.registerEvent()
         
+        self.thread.start()
+        
     #----------------------------------------------------------------------
     def loadSetting(self):
         """读取配置"""
@@ -55,6 +76,9 @@ class RtdEngine(object):
             self.server = RtdServer(repAddress, pubAddress)
             
             self.eventTypeDict = d['eventType']
+            
+            self.flushInterval = d.get('flushInterval', self.flushInterval)
+            self.logActive = d.get('log', self.logActive)
         
     #----------------------------------------------------------------------
     def registerEvent(self):
@@ -69,13 +93,56 @@ class RtdEngine(object):
             return
         
         data = event.dict_['data']
-        d = data.__dict__
         keyname = self.eventTypeDict[event.type_]   # 获取数据标识用的名称
-        d["key"] = d[keyname]
+        key = data.__dict__[keyname]
         
-        self.server.publish(event.type_, d)
+        # 只保存最新数据，由推送线程打包发出
+        with self.pendingLock:
+            self.pendingDict[(event.type_, key)] = data
         
-        self.writeLog(u'发布数据，类型%s，内容%s' %(event.type_, str(d)))
+    #----------------------------------------------------------------------
+    def run(self):
+        """推送线程运行函数"""
+        while not self.stopEvent.wait(self.flushInterval):
+            self.flush()
+        
+    #----------------------------------------------------------------------
+    def flush(self):
+        """推送上次推送后有更新的数据，同一事件类型的数据作为一条多帧消息发出"""
+        with self.pendingLock:
+            if not self.pendingDict:
+                return
+            pendingDict = self.pendingDict
+            self.pendingDict = {}
+        
+        topicDict = {}
+        for (eventType, key), data in pendingDict.items():
+            d = self.convertData(data, key)
+            topicDict.setdefault(eventType, []).append(d)
+        
+        for eventType, dataList in topicDict.items():
+            self.server.publishMultipart(eventType, dataList)
+            
+            if self.logActive:
+                for d in dataList:
+                    self.writeLog(u'发布数据，类型%s，内容%s' %(eventType, str(d)))
+        
+    #----------------------------------------------------------------------
+    def convertData(self, data, key):
+        """将数据对象转换为json可以打包的字典"""
+        d = {}
+        
+        for k, v in data.__dict__.items():
+            if k == 'rawData':
+                continue
+            
+            if isinstance(v, (datetime, date)):
+                v = str(v)
+            
+            d[k] = v
+        
+        d['key'] = key
+        return d
         
     #----------------------------------------------------------------------
     def writeLog(self, content):
@@ -91,7 +158,13 @@ class RtdEngine(object):
     #----------------------------------------------------------------------
     def stop(self):
         """停止"""
-        pass
+        self.stopEvent.set()
+        
+        if self.thread.isAlive():
+            self.thread.join()
+        
+        # 发出最后一批数据
+        self.flush()
         
 
     
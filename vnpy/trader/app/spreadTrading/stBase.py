@@ -29,6 +29,7 @@ class StLeg(object):
         self.ratio = EMPTY_INT          # 实际交易时的比例
         self.multiplier = EMPTY_FLOAT   # 计算价差时的乘数
         self.payup = EMPTY_INT          # 对冲时的超价tick
+        self.index = EMPTY_INT          # 在价差所有腿列表中的位置
         
         self.bidPrice = EMPTY_FLOAT
         self.askPrice = EMPTY_FLOAT
@@ -58,7 +59,16 @@ class StSpread(object):
         self.askPrice = EMPTY_FLOAT
         self.bidVolume = EMPTY_INT
         self.askVolume = EMPTY_INT
-        self.time = EMPTY_STRING
+        self.datetime = None            # 价格更新时间，读取time属性时才格式化为字符串
+        
+        # 各条腿对价差价格和报单量的贡献缓存，顺序和allLegs一致，
+        # 腿行情更新时只重新计算该腿的贡献，再对缓存进行汇总
+        self.legBidPriceList = []
+        self.legAskPriceList = []
+        self.legBidVolumeList = []
+        self.legAskVolumeList = []
+        self.legReadyList = []          # 腿是否已有挂单量
+        self.readyCount = EMPTY_INT     # 已有挂单量的腿数量
         
         self.longPos = EMPTY_INT
         self.shortPos = EMPTY_INT
@@ -75,6 +85,18 @@ class StSpread(object):
         self.allLegs.append(self.activeLeg)
         self.allLegs.extend(self.passiveLegs)
         
+        # 初始化腿贡献缓存
+        for n, leg in enumerate(self.allLegs):
+            leg.index = n
+        
+        legCount = len(self.allLegs)
+        self.legBidPriceList = [EMPTY_FLOAT] * legCount
+        self.legAskPriceList = [EMPTY_FLOAT] * legCount
+        self.legBidVolumeList = [EMPTY_INT] * legCount
+        self.legAskVolumeList = [EMPTY_INT] * legCount
+        self.legReadyList = [False] * legCount
+        self.readyCount = 0
+        
         # 生成价差代码
         legSymbolList = []
         
@@ -89,48 +111,75 @@ class StSpread(object):
         
     #----------------------------------------------------------------------
     def calculatePrice(self):
-        """计算价格"""
-        # 清空价格和委托量数据
-        self.bidPrice = EMPTY_FLOAT
-        self.askPrice = EMPTY_FLOAT
-        self.askVolume = EMPTY_INT
-        self.bidVolume = EMPTY_INT
+        """计算价格（重新计算所有腿）"""
+        for leg in self.allLegs:
+            self.updateLegCache(leg)
         
-        # 遍历价差腿列表
-        for n, leg in enumerate(self.allLegs):
-            # 过滤有某条腿尚未初始化的情况（无挂单量）
-            if not leg.bidVolume or not leg.askVolume:
-                self.bidPrice = EMPTY_FLOAT
-                self.askPrice = EMPTY_FLOAT
-                self.askVolume = EMPTY_INT
-                self.bidVolume = EMPTY_INT                
-                return
-                
-            # 计算价格
-            if leg.multiplier > 0:
-                self.bidPrice += leg.bidPrice * leg.multiplier
-                self.askPrice += leg.askPrice * leg.multiplier
-            else:
-                self.bidPrice += leg.askPrice * leg.multiplier
-                self.askPrice += leg.bidPrice * leg.multiplier
-                
-            # 计算报单量
-            if leg.ratio > 0:
-                legAdjustedBidVolume = floor(leg.bidVolume / leg.ratio)
-                legAdjustedAskVolume = floor(leg.askVolume / leg.ratio)
-            else:
-                legAdjustedBidVolume = floor(leg.askVolume / abs(leg.ratio))
-                legAdjustedAskVolume = floor(leg.bidVolume / abs(leg.ratio))
-            
-            if n == 0:
-                self.bidVolume = legAdjustedBidVolume                           # 对于第一条腿，直接初始化
-                self.askVolume = legAdjustedAskVolume
+        self.aggregatePrice()
+        
+    #----------------------------------------------------------------------
+    def calculateLegPrice(self, leg):
+        """某条腿行情更新后计算价格，只重新计算该腿的贡献"""
+        self.updateLegCache(leg)
+        self.aggregatePrice()
+    
+    #----------------------------------------------------------------------
+    def updateLegCache(self, leg):
+        """更新某条腿对价差价格和报单量的贡献"""
+        n = leg.index
+        
+        # 检查腿是否已经初始化（有挂单量）
+        ready = bool(leg.bidVolume and leg.askVolume)
+        if ready != self.legReadyList[n]:
+            self.legReadyList[n] = ready
+            if ready:
+                self.readyCount += 1
             else:
-                self.bidVolume = min(self.bidVolume, legAdjustedBidVolume)      # 对于后续的腿，价差可交易报单量取较小值
-                self.askVolume = min(self.askVolume, legAdjustedAskVolume)
-                
+                self.readyCount -= 1
+        
+        # 计算价格
+        if leg.multiplier > 0:
+            self.legBidPriceList[n] = leg.bidPrice * leg.multiplier
+            self.legAskPriceList[n] = leg.askPrice * leg.multiplier
+        else:
+            self.legBidPriceList[n] = leg.askPrice * leg.multiplier
+            self.legAskPriceList[n] = leg.bidPrice * leg.multiplier
+        
+        # 计算报单量
+        if leg.ratio > 0:
+            self.legBidVolumeList[n] = floor(leg.bidVolume / leg.ratio)
+            self.legAskVolumeList[n] = floor(leg.askVolume / leg.ratio)
+        else:
+            self.legBidVolumeList[n] = floor(leg.askVolume / abs(leg.ratio))
+            self.legAskVolumeList[n] = floor(leg.bidVolume / abs(leg.ratio))
+    
+    #----------------------------------------------------------------------
+    def aggregatePrice(self):
+        """汇总各条腿的贡献得到价差价格"""
+        # 过滤有某条腿尚未初始化的情况（无挂单量）
+        if not self.allLegs or self.readyCount < len(self.allLegs):
+            self.bidPrice = EMPTY_FLOAT
+            self.askPrice = EMPTY_FLOAT
+            self.askVolume = EMPTY_INT
+            self.bidVolume = EMPTY_INT
+            return
+        
+        # 价格为各条腿之和，价差可交易报单量取各条腿的较小值
+        self.bidPrice = sum(self.legBidPriceList)
+        self.askPrice = sum(self.legAskPriceList)
+        self.bidVolume = min(self.legBidVolumeList)
+        self.askVolume = min(self.legAskVolumeList)
+        
         # 更新时间
-        self.time = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+        self.datetime = datetime.now()
+    
+    #----------------------------------------------------------------------
+    @property
+    def time(self):
+        """价格更新时间字符串"""
+        if not self.datetime:
+            return EMPTY_STRING
+        return self.datetime.strftime('%H:%M:%S.%f')[:-3]
         
     #----------------------------------------------------------------------
     def calculatePos(self):
@@ -148,23 +148,28 @@ class StDataEngine(object):
         leg.bidVolume = tick.bidVolume1
         leg.askVolume = tick.askVolume1
         
-        # 更新价差价格
+        # 更新价差价格，只需重新计算该腿的贡献
         spread = self.vtSymbolSpreadDict[tick.vtSymbol]
-        spread.calculatePrice()
+        spread.calculateLegPrice(leg)
         
         # 发出事件
         self.putSpreadTickEvent(spread)
     
     #----------------------------------------------------------------------
     def putSpreadTickEvent(self, spread):
-        """发出价差行情更新事件"""
+        """
+        发出价差行情更新事件
+        
+        事件以价差名称作为合并键推送，同一价差在事件队列中尚未处理的更新会被合并，
+        通过registerConflated注册的处理函数每次只收到一个最新的价差行情
+        """
         event1 = Event(EVENT_SPREADTRADING_TICK+spread.name)
         event1.dict_['data'] = spread
-        self.eventEngine.put(event1)
+        self.eventEngine.putLatest(event1, spread.name)
         
         event2 = Event(EVENT_SPREADTRADING_TICK)
         event2.dict_['data'] = spread
-        self.eventEngine.put(event2)        
+        self.eventEngine.putLatest(event2, spread.name)
     
     #----------------------------------------------------------------------
     def processTradeEvent(self, event):
@@ -237,7 +242,7 @@ class StDataEngine(object):
     #----------------------------------------------------------------------
     def registerEvent(self):
         """"""
-        self.eventEngine.register(EVENT_TICK, self.processTickEvent)
+        self.eventEngine.registerConflated(EVENT_TICK, self.processTickEvent)     # 腿只需要最新行情
         self.eventEngine.register(EVENT_TRADE, self.processTradeEvent)
         self.eventEngine.register(EVENT_POSITION, self.processPosEvent)
         
@@ -292,7 +297,7 @@ class StAlgoEngine(object):
     #----------------------------------------------------------------------
     def registerEvent(self):
         """注册事件监听"""
-        self.eventEngine.register(EVENT_SPREADTRADING_TICK, self.processSpreadTickEvent)
+        self.eventEngine.registerConflated(EVENT_SPREADTRADING_TICK, self.processSpreadTickEvent)
         self.eventEngine.register(EVENT_SPREADTRADING_POS, self.processSpreadPosEvent)
         self.eventEngine.register(EVENT_TRADE, self.processTradeEvent)
         self.eventEngine.register(EVENT_ORDER, self.processOrderEvent)
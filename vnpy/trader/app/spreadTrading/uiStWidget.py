@@ -7,7 +7,8 @@ from six import text_type
 from vnpy.event import Event
 from vnpy.trader.uiQt import QtWidgets, QtCore
 from vnpy.trader.uiBasicWidget import (BasicMonitor, BasicCell, PnlCell,
-                                       AskCell, BidCell, BASIC_FONT)
+                                       AskCell, BidCell, BASIC_FONT,
+                                       MONITOR_MAX_ROW)
 
 from .stBase import (EVENT_SPREADTRADING_TICK, EVENT_SPREADTRADING_POS,
                      EVENT_SPREADTRADING_LOG, EVENT_SPREADTRADING_ALGO,
@@ -41,6 +42,7 @@ class StTickMonitor(BasicMonitor):
         self.setDataKey('name')
         self.setEventType(EVENT_SPREADTRADING_TICK)
         self.setFont(BASIC_FONT)
+        self.setConflate(True)
     
         self.initTable()
         self.registerEvent()        
@@ -116,6 +118,7 @@ class StAlgoLogMonitor(BasicMonitor):
     
         self.setEventType(EVENT_SPREADTRADING_ALGOLOG)
         self.setFont(BASIC_FONT)
+        self.setMaxRow(MONITOR_MAX_ROW)
     
         self.initTable()
         self.registerEvent()
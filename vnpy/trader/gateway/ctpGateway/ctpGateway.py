@@ -16,6 +16,7 @@ from datetime import datetime, timedelta
 from vnpy.api.ctp import MdApi, TdApi, defineDict
 from vnpy.trader.vtGateway import *
 from vnpy.trader.vtFunction import getJsonPath, getTempPath
+from vnpy.trader.vtLatency import latencyMonitor, STAGE_API_SEND
 from vnpy.trader.vtConstant import GATEWAYTYPE_FUTURES
 from .language import text
 
@@ -339,6 +340,9 @@ class CtpMdApi(MdApi):
     #----------------------------------------------------------------------  
     def onRtnDepthMarketData(self, data):
         """行情推送"""
+        if latencyMonitor.enabled:
+            latencyMonitor.startTrace()
+        
         # 过滤尚未获取合约交易所时的行情推送
         symbol = data['InstrumentID']
         if symbol not in symbolExchangeDict:
@@ -1461,6 +1465,9 @@ class CtpTdApi(TdApi):
             req['TimeCondition'] = defineDict['THOST_FTDC_TC_IOC']
             req['VolumeCondition'] = defineDict['THOST_FTDC_VC_CV']        
         
+        if latencyMonitor.enabled:
+            latencyMonitor.mark(STAGE_API_SEND)
+        
         self.reqOrderInsert(req, self.reqID)
         
         # 返回订单号（字符串），便于某些算法进行动态管理
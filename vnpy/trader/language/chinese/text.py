@@ -137,4 +137,6 @@ DATABASE_CONNECTING_FAILED = u'MongoDB连接失败'
 DATA_INSERT_FAILED = u'数据插入失败，MongoDB没有连接'
 DATA_QUERY_FAILED = u'数据查询失败，MongoDB没有连接'
 DATA_UPDATE_FAILED = u'数据更新失败，MongoDB没有连接'
-DATA_DELETE_FAILED = u'数据删除失败，MongoDB没有连接'
\ No newline at end of file
+DATA_DELETE_FAILED = u'数据删除失败，MongoDB没有连接'
+LATENCY_STATS = u'行情到委托延时统计（微秒）：{stats}'
+SLOW_HANDLER_WARNING = u'事件处理函数{handler}处理{type}事件耗时{cost:.1f}毫秒，超过预算{budget:.1f}毫秒'
@@ -138,4 +138,6 @@ DATABASE_CONNECTING_FAILED = u'Failed to connect to MongoDB.'
 DATA_INSERT_FAILED = u'Data insert failed，please connect MongoDB first.'
 DATA_QUERY_FAILED = u'Data query failed, please connect MongoDB first.'
 DATA_UPDATE_FAILED = u'Data update failed, please connect MongoDB first.'
-DATA_DELETE_FAILED = u'Data delete failed, please connect MongoDB first.'
\ No newline at end of file
+DATA_DELETE_FAILED = u'Data delete failed, please connect MongoDB first.'
+LATENCY_STATS = u'Tick-to-order latency (us): {stats}'
+SLOW_HANDLER_WARNING = u'Handler {handler} took {cost:.1f}ms on event {type}, budget {budget:.1f}ms'
@@ -5,6 +5,7 @@ import csv
 import os
 import platform
 from collections import OrderedDict
+from threading import Lock
 
 from six import text_type
 
@@ -15,16 +16,24 @@ from .vtGateway import *
 from . import vtText
 from .uiQt import QtGui, QtWidgets, QtCore, BASIC_FONT
 from .vtFunction import jsonPathDict
+from .vtGlobal import globalSetting
 from .vtConstant import *
 
 
 COLOR_RED = QtGui.QColor('red')
 COLOR_GREEN = QtGui.QColor('green')
+COLOR_BLACK = QtGui.QColor('black')
+COLOR_BID = QtGui.QColor(255,174,201)
+COLOR_ASK = QtGui.QColor(160,255,160)
+
+MONITOR_REFRESH_INTERVAL = globalSetting.get('monitorRefreshInterval', 250)  # 监控组件刷新间隔（毫秒）
+MONITOR_MAX_ROW = globalSetting.get('monitorMaxRow', 5000)                  # 日志类监控组件的最大行数
 
 
 ########################################################################
 class BasicCell(QtWidgets.QTableWidgetItem):
     """基础的单元格"""
+    background = None
 
     #----------------------------------------------------------------------
     def __init__(self, text=None, mainEngine=None):
@@ -41,11 +50,20 @@ class BasicCell(QtWidgets.QTableWidgetItem):
             self.setText('')
         else:
             self.setText(text)
+            
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatContent(text, mainEngine=None):
+        """表格模型中使用的显示内容和前景色"""
+        if text == '0' or text == '0.0':
+            return '', None
+        return text, None
 
 
 ########################################################################
 class NumCell(QtWidgets.QTableWidgetItem):
     """用来显示数字的单元格"""
+    background = None
 
     #----------------------------------------------------------------------
     def __init__(self, text=None, mainEngine=None):
@@ -67,10 +85,20 @@ class NumCell(QtWidgets.QTableWidgetItem):
         except ValueError:
             self.setText(text)
             
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatContent(text, mainEngine=None):
+        """表格模型中使用的显示内容和前景色"""
+        try:
+            return int(text), None
+        except ValueError:
+            return text, None
+            
 
 ########################################################################
 class DirectionCell(QtWidgets.QTableWidgetItem):
     """用来显示买卖方向的单元格"""
+    background = None
 
     #----------------------------------------------------------------------
     def __init__(self, text=None, mainEngine=None):
@@ -88,11 +116,22 @@ class DirectionCell(QtWidgets.QTableWidgetItem):
         elif text == DIRECTION_SHORT:
             self.setForeground(QtGui.QColor('green'))
         self.setText(text)
+        
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatContent(text, mainEngine=None):
+        """表格模型中使用的显示内容和前景色"""
+        if text == DIRECTION_LONG or text == DIRECTION_NET:
+            return text, COLOR_RED
+        elif text == DIRECTION_SHORT:
+            return text, COLOR_GREEN
+        return text, None
 
 
 ########################################################################
 class NameCell(QtWidgets.QTableWidgetItem):
     """用来显示合约中文的单元格"""
+    background = None
 
     #----------------------------------------------------------------------
     def __init__(self, text=None, mainEngine=None):
@@ -115,11 +154,22 @@ class NameCell(QtWidgets.QTableWidgetItem):
             # 如果能读取合约信息
             if contract:
                 self.setText(contract.name)
+                
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatContent(text, mainEngine=None):
+        """表格模型中使用的显示内容和前景色"""
+        if mainEngine:
+            contract = mainEngine.getContract(text)
+            if contract:
+                return contract.name, None
+        return '', None
 
 
 ########################################################################
 class BidCell(QtWidgets.QTableWidgetItem):
     """买价单元格"""
+    background = COLOR_BID
 
     #----------------------------------------------------------------------
     def __init__(self, text=None, mainEngine=None):
@@ -137,11 +187,18 @@ class BidCell(QtWidgets.QTableWidgetItem):
     def setContent(self, text):
         """设置内容"""
         self.setText(text)
+        
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatContent(text, mainEngine=None):
+        """表格模型中使用的显示内容和前景色"""
+        return text, COLOR_BLACK
 
 
 ########################################################################
 class AskCell(QtWidgets.QTableWidgetItem):
     """卖价单元格"""
+    background = COLOR_ASK
 
     #----------------------------------------------------------------------
     def __init__(self, text=None, mainEngine=None):
@@ -159,11 +216,18 @@ class AskCell(QtWidgets.QTableWidgetItem):
     def setContent(self, text):
         """设置内容"""
         self.setText(text)
+        
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatContent(text, mainEngine=None):
+        """表格模型中使用的显示内容和前景色"""
+        return text, COLOR_BLACK
 
 
 ########################################################################
 class PnlCell(QtWidgets.QTableWidgetItem):
     """显示盈亏的单元格"""
+    background = None
 
     #----------------------------------------------------------------------
     def __init__(self, text=None, mainEngine=None):
@@ -189,18 +253,229 @@ class PnlCell(QtWidgets.QTableWidgetItem):
                 self.setForeground(COLOR_GREEN)
         except ValueError:
             pass
+            
+    #----------------------------------------------------------------------
+    @staticmethod
+    def formatContent(text, mainEngine=None):
+        """表格模型中使用的显示内容和前景色"""
+        try:
+            if float(text) >= 0:
+                return text, COLOR_RED
+            else:
+                return text, COLOR_GREEN
+        except ValueError:
+            return text, None
+
 
+########################################################################
+class MonitorModel(QtCore.QAbstractTableModel):
+    """
+    监控组件使用的表格数据模型
+    
+    每行保存数据对象、原始字段值、显示值和前景色，更新时只重新格式化
+    原始值发生变化的字段，并且只对变化的单元格发出dataChanged信号。
+    新数据显示在最上方，内部列表按照插入顺序保存，因此新增一行不需要移动已有数据。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, headerDict, dataKey='', mainEngine=None, font=None, maxRow=0, parent=None):
+        """Constructor"""
+        super(MonitorModel, self).__init__(parent)
+        
+        self.headerDict = headerDict
+        self.headerList = list(headerDict.keys())
+        self.labelList = [d['chinese'] for d in headerDict.values()]
+        self.cellTypeList = [d['cellType'] for d in headerDict.values()]
+        self.columnCount_ = len(self.headerList)
+        
+        self.dataKey = dataKey
+        self.mainEngine = mainEngine
+        self.font = font
+        self.maxRow = maxRow            # 最大行数，0表示不限制（只对增量模式有效）
+        
+        self.rowList = []               # 行数据列表，每行为[data, rawList, valueList, foregroundList]
+        self.keyRowDict = {}            # 数据键:rowList中的位置
+    
+    #----------------------------------------------------------------------
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """行数"""
+        if parent.isValid():
+            return 0
+        return len(self.rowList)
+    
+    #----------------------------------------------------------------------
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """列数"""
+        if parent.isValid():
+            return 0
+        return self.columnCount_
+    
+    #----------------------------------------------------------------------
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """单元格数据"""
+        if not index.isValid():
+            return None
+        
+        column = index.column()
+        
+        if role == QtCore.Qt.DisplayRole:
+            return self.rowList[-1-index.row()][2][column]
+        elif role == QtCore.Qt.ForegroundRole:
+            return self.rowList[-1-index.row()][3][column]
+        elif role == QtCore.Qt.BackgroundRole:
+            return self.cellTypeList[column].background
+        elif role == QtCore.Qt.FontRole:
+            return self.font
+        
+        return None
+    
+    #----------------------------------------------------------------------
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        """表头数据"""
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.labelList[section]
+        return None
+    
+    #----------------------------------------------------------------------
+    def createRow(self, data):
+        """创建一行数据"""
+        rawList = []
+        valueList = []
+        foregroundList = []
+        
+        for header, cellType in zip(self.headerList, self.cellTypeList):
+            raw = getattr(data, header)
+            value, foreground = cellType.formatContent(safeUnicode(raw), self.mainEngine)
+            rawList.append(raw)
+            valueList.append(value)
+            foregroundList.append(foreground)
+        
+        return [data, rawList, valueList, foregroundList]
+    
+    #----------------------------------------------------------------------
+    def updateRow(self, rowData, data):
+        """更新一行数据，返回发生变化的第一列和最后一列，没有变化则返回None"""
+        rowData[0] = data
+        rawList, valueList, foregroundList = rowData[1], rowData[2], rowData[3]
+        first = None
+        last = None
+        
+        for n, header in enumerate(self.headerList):
+            raw = getattr(data, header)
+            if raw == rawList[n]:
+                continue
+            
+            rawList[n] = raw
+            value, foreground = self.cellTypeList[n].formatContent(safeUnicode(raw), self.mainEngine)
+            if value == valueList[n] and foreground == foregroundList[n]:
+                continue
+            
+            valueList[n] = value
+            foregroundList[n] = foreground
+            if first is None:
+                first = n
+            last = n
+        
+        if first is None:
+            return None
+        return first, last
+    
+    #----------------------------------------------------------------------
+    def updateDataList(self, dataList):
+        """批量更新数据"""
+        newList = []
+        
+        # 存量更新模式，已有的行直接更新并只通知变化的单元格
+        if self.dataKey:
+            newDict = OrderedDict()
+            
+            for data in dataList:
+                key = getattr(data, self.dataKey)
+                
+                if key in newDict:
+                    newDict[key] = data
+                    continue
+                
+                i = self.keyRowDict.get(key)
+                if i is None:
+                    newDict[key] = data
+                    continue
+                
+                changed = self.updateRow(self.rowList[i], data)
+                if changed:
+                    row = len(self.rowList) - 1 - i
+                    self.dataChanged.emit(self.index(row, changed[0]), self.index(row, changed[1]))
+            
+            for key, data in newDict.items():
+                self.keyRowDict[key] = len(self.rowList) + len(newList)
+                newList.append(self.createRow(data))
+        # 增量模式，所有数据都作为新的行插入
+        else:
+            if self.maxRow:
+                dataList = dataList[-self.maxRow:]
+            newList = [self.createRow(data) for data in dataList]
+        
+        if not newList:
+            return
+        
+        # 新的数据显示在最上方
+        self.beginInsertRows(QtCore.QModelIndex(), 0, len(newList)-1)
+        self.rowList.extend(newList)
+        self.endInsertRows()
+        
+        # 超过最大行数则移除最早的数据
+        if self.maxRow and not self.dataKey and len(self.rowList) > self.maxRow:
+            count = len(self.rowList) - self.maxRow
+            self.beginRemoveRows(QtCore.QModelIndex(), self.maxRow, len(self.rowList)-1)
+            del self.rowList[:count]
+            self.endRemoveRows()
+    
+    #----------------------------------------------------------------------
+    def removeData(self, key):
+        """移除数据键对应的行"""
+        i = self.keyRowDict.pop(key, None)
+        if i is None:
+            return
+        
+        row = len(self.rowList) - 1 - i
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.rowList[i]
+        self.endRemoveRows()
+        
+        for k, n in self.keyRowDict.items():
+            if n > i:
+                self.keyRowDict[k] = n - 1
+    
+    #----------------------------------------------------------------------
+    def setDataList(self, dataList):
+        """重置全部数据，dataList按照从上到下的显示顺序排列"""
+        self.beginResetModel()
+        self.rowList = [self.createRow(data) for data in reversed(dataList)]
+        
+        self.keyRowDict = {}
+        if self.dataKey:
+            for i, rowData in enumerate(self.rowList):
+                self.keyRowDict[getattr(rowData[0], self.dataKey)] = i
+        self.endResetModel()
+    
+    #----------------------------------------------------------------------
+    def getData(self, row):
+        """获取某一行的数据对象"""
+        return self.rowList[-1-row][0]
+    
 
 ########################################################################
-class BasicMonitor(QtWidgets.QTableWidget):
+class BasicMonitor(QtWidgets.QTableView):
     """
     基础监控
     
     headerDict中的值对应的字典格式如下
     {'chinese': u'中文名', 'cellType': BasicCell}
     
+    事件引擎线程中收到的数据先保存在缓冲区，由定时器在GUI线程中批量更新到表格模型，
+    存量更新模式下每个键在一次刷新中只更新最新的数据。
     """
-    signal = QtCore.Signal(type(Event()))
+    dataDoubleClicked = QtCore.Signal(object)   # 双击某一行时发出，参数为该行的数据对象
 
     #----------------------------------------------------------------------
     def __init__(self, mainEngine=None, eventEngine=None, parent=None):
@@ -214,8 +489,8 @@ class BasicMonitor(QtWidgets.QTableWidget):
         self.headerDict = OrderedDict()  # 有序字典，key是英文名，value是对应的配置字典
         self.headerList = []             # 对应self.headerDict.keys()
         
-        # 保存相关数据用
-        self.dataDict = {}  # 字典，key是字段对应的数据，value是保存相关单元格的字典
+        # 表格数据模型
+        self.dataModel = None
         self.dataKey = ''   # 字典键对应的数据字段
         
         # 监控的事件类型
@@ -227,12 +502,27 @@ class BasicMonitor(QtWidgets.QTableWidget):
         # 字体
         self.font = None
         
-        # 保存数据对象到单元格
+        # 双击时是否发出数据对象
         self.saveData = False
         
         # 默认不允许根据表头进行排序，需要的组件可以开启
         self.sorting = False
         
+        # 是否只接收每个键的最新数据（仅对通过putLatest推送的事件有效）
+        self.conflate = False
+        
+        # 增量模式下的最大行数，0表示不限制
+        self.maxRow = 0
+        
+        # 数据缓冲区，由事件引擎线程写入，GUI线程定时读取
+        self.bufferLock = Lock()
+        self.bufferDict = OrderedDict()     # 存量更新模式使用，数据键:最新数据
+        self.bufferList = []                # 增量模式使用
+        
+        # 刷新定时器
+        self.refreshTimer = QtCore.QTimer(self)
+        self.refreshTimer.timeout.connect(self.processBuffer)
+        
         # 初始化右键菜单
         self.initMenu()
         
@@ -252,6 +542,11 @@ class BasicMonitor(QtWidgets.QTableWidget):
         """设置监控的事件类型"""
         self.eventType = eventType
         
+    #----------------------------------------------------------------------
+    def setConflate(self, conflate):
+        """设置是否只接收最新数据"""
+        self.conflate = conflate
+        
     #----------------------------------------------------------------------
     def setFont(self, font):
         """设置字体"""
@@ -259,19 +554,28 @@ class BasicMonitor(QtWidgets.QTableWidget):
     
     #----------------------------------------------------------------------
     def setSaveData(self, saveData):
-        """设置是否要保存数据到单元格"""
+        """设置双击时是否发出数据对象"""
         self.saveData = saveData
         
+    #----------------------------------------------------------------------
+    def setMaxRow(self, maxRow):
+        """设置增量模式下的最大行数"""
+        self.maxRow = maxRow
+        
     #----------------------------------------------------------------------
     def initTable(self):
         """初始化表格"""
-        # 设置表格的列数
-        col = len(self.headerDict)
-        self.setColumnCount(col)
+        # 创建数据模型，允许排序时通过代理模型排序
+        self.dataModel = MonitorModel(self.headerDict, self.dataKey, self.mainEngine,
+                                      self.font, self.maxRow, self)
         
-        # 设置列表头
-        labels = [d['chinese'] for d in self.headerDict.values()]
-        self.setHorizontalHeaderLabels(labels)
+        if self.sorting:
+            proxyModel = QtCore.QSortFilterProxyModel(self)
+            proxyModel.setSourceModel(self.dataModel)
+            proxyModel.setDynamicSortFilter(True)
+            self.setModel(proxyModel)
+        else:
+            self.setModel(self.dataModel)
         
         # 关闭左边的垂直表头
         self.verticalHeader().setVisible(False)
@@ -284,81 +588,84 @@ class BasicMonitor(QtWidgets.QTableWidget):
         
         # 设置允许排序
         self.setSortingEnabled(self.sorting)
+        
+        # 双击发出数据对象
+        self.doubleClicked.connect(self.processDoubleClick)
 
     #----------------------------------------------------------------------
     def registerEvent(self):
         """注册GUI更新相关的事件监听"""
-        self.signal.connect(self.updateEvent)
-        self.eventEngine.register(self.eventType, self.signal.emit)
+        if self.conflate:
+            self.eventEngine.registerConflated(self.eventType, self.updateEvent)
+        else:
+            self.eventEngine.register(self.eventType, self.updateEvent)
+        
+        self.refreshTimer.start(MONITOR_REFRESH_INTERVAL)
         
     #----------------------------------------------------------------------
     def updateEvent(self, event):
-        """收到事件更新"""
+        """收到事件更新，在事件引擎线程中调用，只保存到缓冲区"""
         data = event.dict_['data']
-        self.updateData(data)
+        
+        with self.bufferLock:
+            if self.dataKey:
+                self.bufferDict[getattr(data, self.dataKey)] = data
+            else:
+                self.bufferList.append(data)
+    
+    #----------------------------------------------------------------------
+    def processBuffer(self):
+        """将缓冲区中的数据批量更新到表格中"""
+        with self.bufferLock:
+            if not self.bufferDict and not self.bufferList:
+                return
+            
+            if self.dataKey:
+                dataList = list(self.bufferDict.values())
+                self.bufferDict = OrderedDict()
+            else:
+                dataList = self.bufferList
+                self.bufferList = []
+        
+        self.updateDataList(dataList)
     
     #----------------------------------------------------------------------
     def updateData(self, data):
         """将数据更新到表格中"""
-        # 如果允许了排序功能，则插入数据前必须关闭，否则插入新的数据会变乱
-        if self.sorting:
-            self.setSortingEnabled(False)
+        self.updateDataList([data])
+    
+    #----------------------------------------------------------------------
+    def updateDataList(self, dataList):
+        """将一批数据更新到表格中"""
+        self.dataModel.updateDataList(dataList)
         
-        # 如果设置了dataKey，则采用存量更新模式
-        if self.dataKey:
-            key = data.__getattribute__(self.dataKey)
-            # 如果键在数据字典中不存在，则先插入新的一行，并创建对应单元格
-            if key not in self.dataDict:
-                self.insertRow(0)     
-                d = {}
-                for n, header in enumerate(self.headerList):                  
-                    content = safeUnicode(data.__getattribute__(header))
-                    cellType = self.headerDict[header]['cellType']
-                    cell = cellType(content, self.mainEngine)
-                    
-                    if self.font:
-                        cell.setFont(self.font)  # 如果设置了特殊字体，则进行单元格设置
-                    
-                    if self.saveData:            # 如果设置了保存数据对象，则进行对象保存
-                        cell.data = data
-                        
-                    self.setItem(0, n, cell)
-                    d[header] = cell
-                self.dataDict[key] = d
-            # 否则如果已经存在，则直接更新相关单元格
-            else:
-                d = self.dataDict[key]
-                for header in self.headerList:
-                    content = safeUnicode(data.__getattribute__(header))
-                    cell = d[header]
-                    cell.setContent(content)
-                    
-                    if self.saveData:            # 如果设置了保存数据对象，则进行对象保存
-                        cell.data = data                    
-        # 否则采用增量更新模式
-        else:
-            self.insertRow(0)  
-            for n, header in enumerate(self.headerList):
-                content = safeUnicode(data.__getattribute__(header))
-                cellType = self.headerDict[header]['cellType']
-                cell = cellType(content, self.mainEngine)
-                
-                if self.font:
-                    cell.setFont(self.font)
-
-                if self.saveData:
-                    cell.data = data                
-
-                self.setItem(0, n, cell)                        
-                
         # 调整列宽
-        if not self.columnResized:
+        if not self.columnResized and self.dataModel.rowCount():
             self.resizeColumns()
             self.columnResized = True
-        
-        # 重新打开排序
+    
+    #----------------------------------------------------------------------
+    def getData(self, index):
+        """获取表格中某个位置的数据对象"""
         if self.sorting:
-            self.setSortingEnabled(True)
+            index = self.model().mapToSource(index)
+        return self.dataModel.getData(index.row())
+    
+    #----------------------------------------------------------------------
+    def processDoubleClick(self, index):
+        """双击单元格"""
+        if self.saveData:
+            self.dataDoubleClicked.emit(self.getData(index))
+    
+    #----------------------------------------------------------------------
+    def rowCount(self):
+        """表格行数"""
+        return self.model().rowCount()
+    
+    #----------------------------------------------------------------------
+    def columnCount(self):
+        """表格列数"""
+        return len(self.headerDict)
     
     #----------------------------------------------------------------------
     def resizeColumns(self):
@@ -389,16 +696,13 @@ class BasicMonitor(QtWidgets.QTableWidget):
                     headers = [header.encode('gbk') for header in self.headerList]
                     writer.writerow(headers)
                     
-                    # 保存每行内容
-                    for row in range(self.rowCount()):
+                    # 保存每行内容，按照当前显示的顺序
+                    model = self.model()
+                    for row in range(model.rowCount()):
                         rowdata = []
-                        for column in range(self.columnCount()):
-                            item = self.item(row, column)
-                            if item is not None:
-                                rowdata.append(
-                                    text_type(item.text()).encode('gbk'))
-                            else:
-                                rowdata.append('')
+                        for column in range(model.columnCount()):
+                            value = model.data(model.index(row, column))
+                            rowdata.append(text_type(value).encode('gbk'))
                         writer.writerow(rowdata)     
         except IOError:
             pass
@@ -457,6 +761,9 @@ class MarketMonitor(BasicMonitor):
         # 设置监控事件类型
         self.setEventType(EVENT_TICK)
         
+        # 行情只需显示最新数据
+        self.setConflate(True)
+        
         # 设置字体
         self.setFont(BASIC_FONT)
         
@@ -486,7 +793,8 @@ class LogMonitor(BasicMonitor):
         self.setHeaderDict(d)
         
         self.setEventType(EVENT_LOG)
-        self.setFont(BASIC_FONT)        
+        self.setFont(BASIC_FONT)
+        self.setMaxRow(MONITOR_MAX_ROW)
         self.initTable()
         self.registerEvent()
 
@@ -509,6 +817,7 @@ class ErrorMonitor(BasicMonitor):
         
         self.setEventType(EVENT_ERROR)
         self.setFont(BASIC_FONT)
+        self.setMaxRow(MONITOR_MAX_ROW)
         self.initTable()
         self.registerEvent()
 
@@ -585,13 +894,11 @@ class OrderMonitor(BasicMonitor):
     def connectSignal(self):
         """连接信号"""
         # 双击单元格撤单
-        self.itemDoubleClicked.connect(self.cancelOrder) 
+        self.dataDoubleClicked.connect(self.cancelOrder) 
     
     #----------------------------------------------------------------------
-    def cancelOrder(self, cell):
-        """根据单元格的数据撤单"""
-        order = cell.data
-        
+    def cancelOrder(self, order):
+        """根据双击行的委托数据撤单"""
         req = VtCancelOrderReq()
         req.symbol = order.symbol
         req.exchange = order.exchange
@@ -1028,7 +1335,7 @@ class TradingWidget(QtWidgets.QFrame):
     def registerEvent(self):
         """注册事件监听"""
         self.signal.connect(self.updateTick)
-        self.eventEngine.register(EVENT_TICK, self.signal.emit)        
+        self.eventEngine.registerConflated(EVENT_TICK, self.signal.emit)        
 
     #----------------------------------------------------------------------
     def sendOrder(self):
@@ -1098,10 +1405,9 @@ class TradingWidget(QtWidgets.QFrame):
             self.mainEngine.cancelOrder(req, order.gatewayName)
             
     #----------------------------------------------------------------------
-    def closePosition(self, cell):
+    def closePosition(self, pos):
         """根据持仓信息自动填写交易组件"""
-        # 读取持仓数据，cell是一个表格中的单元格对象
-        pos = cell.data
+        # pos是持仓监控中双击行的持仓数据对象
         symbol = pos.symbol
         
         # 更新交易组件的显示合约
@@ -1167,35 +1473,17 @@ class ContractMonitor(BasicMonitor):
         d = {'.'.join([contract.exchange, contract.symbol]):contract for contract in l}
         l2 = list(d.keys())
         l2.sort(reverse=True)
-
-        self.setRowCount(len(l2))
-        row = 0
         
-        for key in l2:
-            # 如果设置了过滤信息且合约代码中不含过滤信息，则不显示
-            if self.filterContent and self.filterContent not in key:
-                continue
-            
-            contract = d[key]
-            
-            for n, header in enumerate(self.headerList):
-                content = safeUnicode(contract.__getattribute__(header))
-                cellType = self.headerDict[header]['cellType']
-                cell = cellType(content)
-                
-                if self.font:
-                    cell.setFont(self.font)  # 如果设置了特殊字体，则进行单元格设置
-                    
-                self.setItem(row, n, cell)          
-            
-            row = row + 1        
+        # 如果设置了过滤信息且合约代码中不含过滤信息，则不显示
+        if self.filterContent:
+            l2 = [key for key in l2 if self.filterContent in key]
+        
+        self.dataModel.setDataList([d[key] for key in l2])
     
     #----------------------------------------------------------------------
     def refresh(self):
         """刷新"""
         self.menu.close()   # 关闭菜单
-        self.clearContents()
-        self.setRowCount(0)
         self.showAllContracts()
     
     #----------------------------------------------------------------------
@@ -1272,17 +1560,18 @@ class WorkingOrderMonitor(OrderMonitor):
         super(WorkingOrderMonitor, self).__init__(mainEngine, eventEngine, parent)
         
     #----------------------------------------------------------------------
-    def updateData(self, data):
+    def updateDataList(self, dataList):
         """更新数据"""
-        super(WorkingOrderMonitor, self).updateData(data)
-
-        # 如果该委托已完成，则隐藏该行
-        if data.status in self.STATUS_COMPLETED:
-            vtOrderID = data.vtOrderID
-            cellDict = self.dataDict[vtOrderID]
-            cell = cellDict['status']
-            row = self.row(cell)
-            self.hideRow(row)    
+        workingList = []
+        
+        # 如果该委托已完成，则从表格中移除
+        for data in dataList:
+            if data.status in self.STATUS_COMPLETED:
+                self.dataModel.removeData(data.vtOrderID)
+            else:
+                workingList.append(data)
+        
+        super(WorkingOrderMonitor, self).updateDataList(workingList)
     
 
 ########################################################################
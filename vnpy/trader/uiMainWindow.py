@@ -63,7 +63,7 @@ class MainWindow(QtWidgets.QMainWindow):
         dockPositionM.raise_()
     
         # 连接组件之间的信号
-        widgetPositionM.itemDoubleClicked.connect(widgetTradingW.closePosition)
+        widgetPositionM.dataDoubleClicked.connect(widgetTradingW.closePosition)
         
         # 保存默认设置
         self.saveWindowSettings('default')
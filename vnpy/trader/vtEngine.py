@@ -18,6 +18,7 @@ from vnpy.trader.vtEvent import *
 from vnpy.trader.vtGateway import *
 from vnpy.trader.language import text
 from vnpy.trader.vtFunction import getTempPath
+from vnpy.trader.vtLatency import latencyMonitor, STAGE_RISK_CHECKED
 
 
 
@@ -55,6 +56,18 @@ class MainEngine(object):
         # 日志引擎实例
         self.logEngine = None
         self.initLogEngine()
+        
+        # 延时统计相关
+        self.latencyLogInterval = 0     # 延时统计的输出间隔（秒），0为不输出
+        self.latencyCsvFile = ''        # 延时统计输出的CSV文件，为空则只输出到日志
+        self.latencyTimerCount = 0
+        
+        if globalSetting.get('latencyMonitor', False):
+            self.enableLatencyMonitor(globalSetting.get('latencyLogInterval', 60),
+                                      globalSetting.get('latencyCsvFile', ''))
+        
+        # 事件引擎性能分析模式下的慢处理警告输出到日志
+        self.eventEngine.register(EVENT_SLOW_HANDLER, self.processSlowHandlerEvent)
 
     #----------------------------------------------------------------------
     def addGateway(self, gatewayModule):
@@ -128,6 +141,9 @@ class MainEngine(object):
     #----------------------------------------------------------------------
     def sendOrder(self, orderReq, gatewayName):
         """对特定接口发单"""
+        if latencyMonitor.enabled:
+            latencyMonitor.beginOrder()
+        
         # 如果创建了风控引擎，且风控检查失败则不发单
         if self.rmEngine and not self.rmEngine.checkRisk(orderReq, gatewayName):
             return ''
@@ -135,8 +151,18 @@ class MainEngine(object):
         gateway = self.getGateway(gatewayName)
         
         if gateway:
+            if latencyMonitor.enabled:
+                latencyMonitor.mark(STAGE_RISK_CHECKED)
+            
             vtOrderID = gateway.sendOrder(orderReq)
+            
+            if latencyMonitor.enabled:
+                latencyMonitor.finishOrder()
+            
             self.dataEngine.updateOrderReq(orderReq, vtOrderID)     # 更新发出的委托请求到数据引擎中
+            
+            if self.rmEngine:
+                self.rmEngine.updateOrderSent(orderReq, gatewayName, vtOrderID)     # 更新风控引擎的活动委托计数
             return vtOrderID
         else:
             return ''
@@ -223,6 +249,21 @@ class MainEngine(object):
         else:
             self.writeLog(text.DATA_INSERT_FAILED)
     
+    #----------------------------------------------------------------------
+    def dbInsertMany(self, dbName, collectionName, documents, ordered=True):
+        """
+        向MongoDB中批量插入数据，documents是数据列表，ordered为False时单条失败不影响其他数据
+        返回是否执行了插入（数据库未连接时返回False）
+        """
+        if self.dbClient:
+            db = self.dbClient[dbName]
+            collection = db[collectionName]
+            collection.insert_many(documents, ordered=ordered)
+            return True
+        else:
+            self.writeLog(text.DATA_INSERT_FAILED)
+            return False
+    
     #----------------------------------------------------------------------
     def dbQuery(self, dbName, collectionName, d, sortKey='', sortDirection=ASCENDING):
         """从MongoDB中读取数据，d是查询要求，返回的是数据库查询的指针"""
@@ -380,6 +421,61 @@ class MainEngine(object):
         if self.logEngine:
             self.eventEngine.register(eventType, self.logEngine.processLogEvent)
     
+    #----------------------------------------------------------------------
+    def enableLatencyMonitor(self, logInterval=60, csvFile=''):
+        """
+        启用行情到委托的全链路延时统计
+        logInterval：统计结果输出到日志的间隔（秒），0为不输出
+        csvFile：同时追加写入的CSV文件路径，为空则不写入
+        """
+        latencyMonitor.setEnabled(True)
+        
+        self.latencyLogInterval = logInterval
+        self.latencyCsvFile = csvFile
+        
+        if logInterval:
+            self.eventEngine.register(EVENT_TIMER, self.processLatencyTimer)
+    
+    #----------------------------------------------------------------------
+    def disableLatencyMonitor(self):
+        """停用延时统计"""
+        latencyMonitor.setEnabled(False)
+        self.eventEngine.unregister(EVENT_TIMER, self.processLatencyTimer)
+    
+    #----------------------------------------------------------------------
+    def getLatencyStats(self):
+        """获取延时统计结果，返回(阶段, 统计字典)的列表，时间单位为微秒"""
+        return latencyMonitor.getStats()
+    
+    #----------------------------------------------------------------------
+    def resetLatencyStats(self):
+        """清空延时统计结果"""
+        latencyMonitor.reset()
+    
+    #----------------------------------------------------------------------
+    def processLatencyTimer(self, event):
+        """定时输出延时统计结果"""
+        self.latencyTimerCount += 1
+        if self.latencyTimerCount < self.latencyLogInterval:
+            return
+        self.latencyTimerCount = 0
+        
+        content = latencyMonitor.formatStats()
+        if content:
+            self.writeLog(text.LATENCY_STATS.format(stats=content))
+        
+        if self.latencyCsvFile:
+            latencyMonitor.saveCsv(self.latencyCsvFile)
+    
+    #----------------------------------------------------------------------
+    def processSlowHandlerEvent(self, event):
+        """处理事件引擎的慢处理警告"""
+        d = event.dict_['data']
+        self.writeLog(text.SLOW_HANDLER_WARNING.format(handler=d['handler'],
+                                                       type=d['type'],
+                                                       cost=d['cost']*1000,
+                                                       budget=d['budget']*1000))
+    
     #----------------------------------------------------------------------
     def convertOrderReq(self, req):
         """转换委托请求"""
@@ -433,7 +529,7 @@ class DataEngine(object):
     #----------------------------------------------------------------------
     def registerEvent(self):
         """注册事件监听"""
-        self.eventEngine.register(EVENT_TICK, self.processTickEvent)
+        self.eventEngine.registerConflated(EVENT_TICK, self.processTickEvent)     # 只需保存最新行情
         self.eventEngine.register(EVENT_CONTRACT, self.processContractEvent)
         self.eventEngine.register(EVENT_ORDER, self.processOrderEvent)
         self.eventEngine.register(EVENT_TRADE, self.processTradeEvent)
@@ -755,6 +851,10 @@ class PositionDetail(object):
     MODE_NORMAL = 'normal'          # 普通模式
     MODE_SHFE = 'shfe'              # 上期所今昨分别平仓
     MODE_TDPENALTY = 'tdpenalty'    # 平今惩罚
+    
+    # 冻结量一致性检查模式，开启后每次增量更新冻结量都会和全量重新计算的结果比对，
+    # 不一致时抛出异常，仅用于测试
+    consistencyCheck = False
 
     #----------------------------------------------------------------------
     def __init__(self, vtSymbol, contract=None):
@@ -796,6 +896,10 @@ class PositionDetail(object):
         
         self.workingOrderDict = {}
         
+        # 增量维护的冻结量，key为(委托方向, 委托开平)，value为该类平仓委托的剩余数量之和
+        self.frozenDict = self.createFrozenDict()
+        self.orderFrozenDict = {}       # vtOrderID:(冻结key, 已计入的剩余数量)
+        
     #----------------------------------------------------------------------
     def updateTrade(self, trade):
         """成交更新"""
@@ -850,6 +954,7 @@ class PositionDetail(object):
         self.calculatePrice(trade)
         self.calculatePosition()
         self.calculatePnl()
+        self.calculateFrozenSummary()
     
     #----------------------------------------------------------------------
     def updateOrder(self, order):
@@ -863,8 +968,11 @@ class PositionDetail(object):
             if order.vtOrderID in self.workingOrderDict:
                 del self.workingOrderDict[order.vtOrderID]
                 
-        # 计算冻结
-        self.calculateFrozen()
+        # 基于剩余数量的变化增量计算冻结
+        if order.status in self.WORKING_STATUS:
+            self.updateFrozen(order.vtOrderID, order, order.totalVolume - order.tradedVolume)
+        else:
+            self.updateFrozen(order.vtOrderID, order, 0)
     
     #----------------------------------------------------------------------
     def updatePosition(self, pos):
@@ -881,6 +989,9 @@ class PositionDetail(object):
             self.shortTd = self.shortPos - self.shortYd
             self.shortPnl = pos.positionProfit
             self.shortPrice = pos.price
+        
+        # 今仓变化会影响平仓委托在今昨仓之间的分配
+        self.calculateFrozenSummary()
             
     #----------------------------------------------------------------------
     def updateOrderReq(self, req, vtOrderID):
@@ -901,7 +1012,7 @@ class PositionDetail(object):
         self.workingOrderDict[vtOrderID] = order
         
         # 计算冻结量
-        self.calculateFrozen()
+        self.updateFrozen(vtOrderID, order, order.totalVolume)
         
     #----------------------------------------------------------------------
     def updateTick(self, tick):
@@ -943,56 +1054,104 @@ class PositionDetail(object):
         self.longPos = self.longTd + self.longYd
         self.shortPos = self.shortTd + self.shortYd      
         
+    #----------------------------------------------------------------------
+    def createFrozenDict(self):
+        """创建冻结量统计字典"""
+        d = {}
+        for direction in [DIRECTION_LONG, DIRECTION_SHORT]:
+            for offset in [OFFSET_CLOSETODAY, OFFSET_CLOSEYESTERDAY, OFFSET_CLOSE]:
+                d[(direction, offset)] = EMPTY_INT
+        return d
+    
+    #----------------------------------------------------------------------
+    def updateFrozen(self, vtOrderID, order, frozenVolume):
+        """根据委托剩余数量的变化增量更新冻结量"""
+        # 扣除该委托之前计入的剩余数量
+        if vtOrderID in self.orderFrozenDict:
+            key, oldVolume = self.orderFrozenDict.pop(vtOrderID)
+            self.frozenDict[key] -= oldVolume
+        
+        # 计入最新的剩余数量
+        self.addFrozen(vtOrderID, order, frozenVolume)
+        
+        self.calculateFrozenSummary()
+        
+        # 一致性检查
+        if self.consistencyCheck and not self.checkFrozen():
+            raise ValueError(u'%s增量计算的冻结量和全量计算结果不一致' %self.vtSymbol)
+    
+    #----------------------------------------------------------------------
+    def calculateFrozenSummary(self):
+        """基于各类平仓委托的冻结量汇总今昨冻结"""
+        d = self.frozenDict
+        
+        # 空头委托冻结多头持仓
+        self.longTdFrozen, self.longYdFrozen = self.allocateFrozen(d[(DIRECTION_SHORT, OFFSET_CLOSETODAY)],
+                                                                   d[(DIRECTION_SHORT, OFFSET_CLOSEYESTERDAY)],
+                                                                   d[(DIRECTION_SHORT, OFFSET_CLOSE)],
+                                                                   self.longTd)
+        
+        # 多头委托冻结空头持仓
+        self.shortTdFrozen, self.shortYdFrozen = self.allocateFrozen(d[(DIRECTION_LONG, OFFSET_CLOSETODAY)],
+                                                                     d[(DIRECTION_LONG, OFFSET_CLOSEYESTERDAY)],
+                                                                     d[(DIRECTION_LONG, OFFSET_CLOSE)],
+                                                                     self.shortTd)
+        
+        # 汇总今昨冻结
+        self.longPosFrozen = self.longYdFrozen + self.longTdFrozen
+        self.shortPosFrozen = self.shortYdFrozen + self.shortTdFrozen
+    
+    #----------------------------------------------------------------------
+    def allocateFrozen(self, tdFrozen, ydFrozen, closeFrozen, td):
+        """计算今昨冻结，平仓委托优先冻结今仓，超出今仓的部分冻结昨仓"""
+        tdFrozen += closeFrozen
+        
+        if closeFrozen and tdFrozen > td:
+            ydFrozen += (tdFrozen - td)
+            tdFrozen = td
+        
+        return tdFrozen, ydFrozen
+    
     #----------------------------------------------------------------------
     def calculateFrozen(self):
-        """计算冻结情况"""
-        # 清空冻结数据
-        self.longPosFrozen = EMPTY_INT
-        self.longYdFrozen = EMPTY_INT
-        self.longTdFrozen = EMPTY_INT
-        self.shortPosFrozen = EMPTY_INT
-        self.shortYdFrozen = EMPTY_INT
-        self.shortTdFrozen = EMPTY_INT     
+        """全量重新计算冻结情况"""
+        self.frozenDict = self.createFrozenDict()
+        self.orderFrozenDict = {}
         
         # 遍历统计
-        for order in self.workingOrderDict.values():
-            # 计算剩余冻结量
-            frozenVolume = order.totalVolume - order.tradedVolume
+        for vtOrderID, order in self.workingOrderDict.items():
+            self.addFrozen(vtOrderID, order, order.totalVolume - order.tradedVolume)
             
-            # 多头委托
-            if order.direction is DIRECTION_LONG:
-                # 平今
-                if order.offset is OFFSET_CLOSETODAY:
-                    self.shortTdFrozen += frozenVolume
-                # 平昨
-                elif order.offset is OFFSET_CLOSEYESTERDAY:
-                    self.shortYdFrozen += frozenVolume
-                # 平仓
-                elif order.offset is OFFSET_CLOSE:
-                    self.shortTdFrozen += frozenVolume
-                    
-                    if self.shortTdFrozen > self.shortTd:
-                        self.shortYdFrozen += (self.shortTdFrozen - self.shortTd)
-                        self.shortTdFrozen = self.shortTd
-            # 空头委托
-            elif order.direction is DIRECTION_SHORT:
-                # 平今
-                if order.offset is OFFSET_CLOSETODAY:
-                    self.longTdFrozen += frozenVolume
-                # 平昨
-                elif order.offset is OFFSET_CLOSEYESTERDAY:
-                    self.longYdFrozen += frozenVolume
-                # 平仓
-                elif order.offset is OFFSET_CLOSE:
-                    self.longTdFrozen += frozenVolume
-                    
-                    if self.longTdFrozen > self.longTd:
-                        self.longYdFrozen += (self.longTdFrozen - self.longTd)
-                        self.longTdFrozen = self.longTd
-                        
-            # 汇总今昨冻结
-            self.longPosFrozen = self.longYdFrozen + self.longTdFrozen
-            self.shortPosFrozen = self.shortYdFrozen + self.shortTdFrozen
+        self.calculateFrozenSummary()
+    
+    #----------------------------------------------------------------------
+    def addFrozen(self, vtOrderID, order, frozenVolume):
+        """将委托的剩余数量计入冻结统计，开仓委托不冻结持仓"""
+        key = (order.direction, order.offset)
+        if frozenVolume and key in self.frozenDict:
+            self.frozenDict[key] += frozenVolume
+            self.orderFrozenDict[vtOrderID] = (key, frozenVolume)
+    
+    #----------------------------------------------------------------------
+    def checkFrozen(self):
+        """检查增量计算的冻结量和全量重新计算的结果是否一致"""
+        frozenDict = self.frozenDict
+        orderFrozenDict = self.orderFrozenDict
+        result = (self.longTdFrozen, self.longYdFrozen, self.longPosFrozen,
+                  self.shortTdFrozen, self.shortYdFrozen, self.shortPosFrozen)
+        
+        self.calculateFrozen()
+        
+        consistent = (frozenDict == self.frozenDict and 
+                      result == (self.longTdFrozen, self.longYdFrozen, self.longPosFrozen,
+                                 self.shortTdFrozen, self.shortYdFrozen, self.shortPosFrozen))
+        
+        # 恢复增量计算的结果
+        self.frozenDict = frozenDict
+        self.orderFrozenDict = orderFrozenDict
+        self.calculateFrozenSummary()
+        
+        return consistent
             
     #----------------------------------------------------------------------
     def convertOrderReq(self, req):
@@ -7,6 +7,7 @@ from vnpy.event import *
 from vnpy.trader.vtEvent import *
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import *
+from vnpy.trader.vtLatency import latencyMonitor, TRACE_KEY
 
 
 ########################################################################
@@ -21,16 +22,28 @@ class VtGateway(object):
         
     #----------------------------------------------------------------------
     def onTick(self, tick):
-        """市场行情推送"""
+        """
+        市场行情推送
+        
+        行情事件使用vtSymbol作为合并键推送，通过register注册的处理函数收到每一个
+        Tick，通过registerConflated注册的处理函数只收到该合约的最新Tick
+        """
         # 通用事件
         event1 = Event(type_=EVENT_TICK)
         event1.dict_['data'] = tick
-        self.eventEngine.put(event1)
         
         # 特定合约代码的事件
         event2 = Event(type_=EVENT_TICK+tick.vtSymbol)
         event2.dict_['data'] = tick
-        self.eventEngine.put(event2)
+        
+        # 记录延时统计的时间戳
+        if latencyMonitor.enabled:
+            trace = latencyMonitor.createTrace()
+            event1.dict_[TRACE_KEY] = trace
+            event2.dict_[TRACE_KEY] = trace
+        
+        self.eventEngine.putLatest(event1, tick.vtSymbol)
+        self.eventEngine.putLatest(event2, tick.vtSymbol)
     
     #----------------------------------------------------------------------
     def onTrade(self, trade):
@@ -0,0 +1,263 @@
+# encoding: UTF-8
+
+'''
+本文件中实现了从收到行情到发出委托的全链路延时统计。
+
+链路中的各个环节调用latencyMonitor打上高精度时间戳：
+
+1. mdReceive：接口收到行情（如CtpMdApi.onRtnDepthMarketData）
+2. tickPut：行情对象创建完成，放入事件队列（VtGateway.onTick）
+3. tickDispatch：CTA引擎开始处理行情事件（CtaEngine.processTickEvent）
+4. strategy：行情复制和本地停止单处理完成，开始调用策略
+5. orderSend：主引擎收到委托请求（MainEngine.sendOrder）
+6. riskChecked：风控检查完成
+7. apiSend：接口调用底层API发单（如CtpTdApi.sendOrder）
+8. orderSent：接口发单函数返回
+
+每个阶段的直方图统计的是上一个时间戳到该阶段时间戳的耗时，total为整条链路的耗时。
+行情在接口线程中打上时间戳后随事件对象传递，进入事件引擎线程后保存在线程局部变量中，
+因此策略在onTick中同步发出的委托可以关联到对应的行情。
+
+未启用时各个环节只需要判断一次latencyMonitor.enabled，几乎没有额外开销。
+'''
+from __future__ import division
+
+import os
+import math
+from threading import local, Lock
+from timeit import default_timer
+from datetime import datetime
+
+
+# 链路中的各个阶段
+STAGE_MD_RECEIVE = 'mdReceive'
+STAGE_TICK_PUT = 'tickPut'
+STAGE_TICK_DISPATCH = 'tickDispatch'
+STAGE_STRATEGY = 'strategy'
+STAGE_ORDER_SEND = 'orderSend'
+STAGE_RISK_CHECKED = 'riskChecked'
+STAGE_API_SEND = 'apiSend'
+STAGE_ORDER_SENT = 'orderSent'
+STAGE_TOTAL = 'total'
+
+STAGE_LIST = [STAGE_TICK_PUT, STAGE_TICK_DISPATCH, STAGE_STRATEGY, STAGE_ORDER_SEND,
+              STAGE_RISK_CHECKED, STAGE_API_SEND, STAGE_ORDER_SENT, STAGE_TOTAL]
+
+# 事件字典中保存时间戳的键
+TRACE_KEY = 'latencyTrace'
+
+# 直方图精度：每个自然对数单位分为100个区间，即相对误差约1%
+BUCKETS_PER_LN = 100
+
+# 统计结果的字段
+STATS_FIELDS = ['count', 'mean', 'p50', 'p99', 'max']
+
+
+########################################################################
+class LatencyHistogram(object):
+    """对数分桶的延时直方图，数值单位为微秒"""
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.bucketDict = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    #----------------------------------------------------------------------
+    def add(self, value):
+        """添加一个数据点（秒）"""
+        us = max(value * 1000000, 0)
+
+        bucket = int(math.log1p(us) * BUCKETS_PER_LN)
+        self.bucketDict[bucket] = self.bucketDict.get(bucket, 0) + 1
+
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    #----------------------------------------------------------------------
+    def getPercentile(self, percent):
+        """获取百分位数（微秒），返回所在区间的上界"""
+        if not self.count:
+            return 0
+
+        threshold = self.count * percent / 100
+        n = 0
+
+        for bucket in sorted(self.bucketDict.keys()):
+            n += self.bucketDict[bucket]
+            if n >= threshold:
+                return min(math.expm1((bucket + 1) / BUCKETS_PER_LN), self.max)
+
+        return self.max
+
+    #----------------------------------------------------------------------
+    def getStats(self):
+        """获取统计结果（微秒）"""
+        if self.count:
+            mean = self.total / self.count
+        else:
+            mean = 0
+
+        d = {
+            'count': self.count,
+            'mean': mean,
+            'p50': self.getPercentile(50),
+            'p99': self.getPercentile(99),
+            'max': self.max
+        }
+        return d
+
+
+########################################################################
+class LatencyMonitor(object):
+    """全链路延时统计"""
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.enabled = False
+
+        self.local = local()        # 当前线程正在跟踪的时间戳列表
+        self.lock = Lock()
+        self.histogramDict = {}
+
+    #----------------------------------------------------------------------
+    def setEnabled(self, enabled):
+        """启用或停用"""
+        self.enabled = enabled
+
+    #----------------------------------------------------------------------
+    def startTrace(self):
+        """接口收到行情时调用"""
+        self.local.mdTime = default_timer()
+
+    #----------------------------------------------------------------------
+    def createTrace(self):
+        """行情放入事件队列前调用，返回的时间戳列表需要保存到事件字典的TRACE_KEY中"""
+        now = default_timer()
+
+        mdTime = getattr(self.local, 'mdTime', None)
+        self.local.mdTime = None
+
+        if mdTime:
+            return [(STAGE_MD_RECEIVE, mdTime), (STAGE_TICK_PUT, now)]
+        else:
+            return [(STAGE_TICK_PUT, now)]
+
+    #----------------------------------------------------------------------
+    def beginTrace(self, event):
+        """开始处理行情事件时调用，之后当前线程中的时间戳都关联到该行情"""
+        trace = event.dict_.get(TRACE_KEY)
+
+        if trace:
+            # 同一个行情会推送多个事件，因此复制一份
+            trace = list(trace)
+            trace.append((STAGE_TICK_DISPATCH, default_timer()))
+
+        self.local.trace = trace
+        self.local.orderStart = None
+
+    #----------------------------------------------------------------------
+    def endTrace(self):
+        """行情事件处理结束时调用"""
+        self.local.trace = None
+
+    #----------------------------------------------------------------------
+    def mark(self, stage):
+        """记录某个阶段的时间戳，当前线程没有正在跟踪的行情时忽略"""
+        trace = getattr(self.local, 'trace', None)
+        if trace:
+            trace.append((stage, default_timer()))
+
+    #----------------------------------------------------------------------
+    def beginOrder(self):
+        """主引擎收到委托请求时调用"""
+        trace = getattr(self.local, 'trace', None)
+        if trace:
+            # 删除上一个未完成委托（如风控拒单）的时间戳
+            if self.local.orderStart is not None:
+                del trace[self.local.orderStart:]
+
+            self.local.orderStart = len(trace)
+            trace.append((STAGE_ORDER_SEND, default_timer()))
+
+    #----------------------------------------------------------------------
+    def finishOrder(self):
+        """委托发出后调用，统计本次委托的链路延时"""
+        trace = getattr(self.local, 'trace', None)
+        if not trace or self.local.orderStart is None:
+            return
+
+        trace.append((STAGE_ORDER_SENT, default_timer()))
+        self.record(trace)
+
+        # 删除本次委托的时间戳，同一个行情触发的下一个委托从策略开始重新计算
+        del trace[self.local.orderStart:]
+        self.local.orderStart = None
+
+    #----------------------------------------------------------------------
+    def record(self, trace):
+        """统计时间戳列表中各个阶段的耗时"""
+        with self.lock:
+            for (_, startTime), (stage, endTime) in zip(trace[:-1], trace[1:]):
+                self.getHistogram(stage).add(endTime - startTime)
+
+            self.getHistogram(STAGE_TOTAL).add(trace[-1][1] - trace[0][1])
+
+    #----------------------------------------------------------------------
+    def getHistogram(self, stage):
+        """获取某个阶段的直方图"""
+        histogram = self.histogramDict.get(stage)
+        if not histogram:
+            histogram = LatencyHistogram()
+            self.histogramDict[stage] = histogram
+        return histogram
+
+    #----------------------------------------------------------------------
+    def getStats(self):
+        """获取各个阶段的统计结果，返回列表，每个元素为(阶段, 统计字典)，时间单位为微秒"""
+        with self.lock:
+            stages = [stage for stage in STAGE_LIST if stage in self.histogramDict]
+            stages.extend(stage for stage in self.histogramDict if stage not in STAGE_LIST)
+            return [(stage, self.histogramDict[stage].getStats()) for stage in stages]
+
+    #----------------------------------------------------------------------
+    def reset(self):
+        """清空统计数据"""
+        with self.lock:
+            self.histogramDict.clear()
+
+    #----------------------------------------------------------------------
+    def formatStats(self):
+        """将统计结果格式化为日志字符串"""
+        l = []
+        for stage, d in self.getStats():
+            l.append(u'%s[n=%s p50=%.1f p99=%.1f max=%.1f]' %(stage, d['count'], d['p50'],
+                                                             d['p99'], d['max']))
+        return u' '.join(l)
+
+    #----------------------------------------------------------------------
+    def saveCsv(self, fileName):
+        """将当前统计结果追加写入CSV文件"""
+        stats = self.getStats()
+        if not stats:
+            return
+
+        newFile = not os.path.exists(fileName)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        with open(fileName, 'a') as f:
+            if newFile:
+                f.write(','.join(['datetime', 'stage'] + STATS_FIELDS) + '\n')
+
+            for stage, d in stats:
+                values = [now, stage] + [str(d[k]) for k in STATS_FIELDS]
+                f.write(','.join(values) + '\n')
+
+
+# 全局唯一的延时统计对象
+latencyMonitor = LatencyMonitor()
@@ -2,6 +2,7 @@
 
 import time
 from logging import INFO
+from operator import itemgetter
 
 from vnpy.trader.vtConstant import (EMPTY_STRING, EMPTY_UNICODE, 
                                     EMPTY_FLOAT, EMPTY_INT)
@@ -102,6 +103,240 @@ class VtBarData(VtBaseData):
         self.openInterest = EMPTY_INT       # 持仓量    
     
 
+########################################################################
+class VtCompactTickData(object):
+    """
+    紧凑型Tick行情数据类
+    
+    字段和VtTickData完全一致，使用__slots__保存数据以减少内存占用并加快创建速度，
+    适用于回测、数据加载等需要大量创建对象的场合。
+    
+    通过__dict__属性兼容原有代码：读取时返回包含所有字段的新字典，
+    赋值时使用字典中的数据更新对应字段。
+    
+    注意和VtTickData不同，对象上不能添加新的属性（会抛出AttributeError），
+    修改读取到的__dict__字典也不会影响对象，因此不适合需要在数据对象上
+    保存自定义属性的代码（如部分策略），回测引擎默认不使用。
+    """
+    __slots__ = ('gatewayName', 'rawData', 'symbol', 'exchange', 'vtSymbol',
+                 'lastPrice', 'lastVolume', 'volume', 'openInterest', 'time', 'date',
+                 'datetime', 'openPrice', 'highPrice', 'lowPrice', 'preClosePrice',
+                 'upperLimit', 'lowerLimit', 'bidPrice1', 'bidPrice2', 'bidPrice3',
+                 'bidPrice4', 'bidPrice5', 'askPrice1', 'askPrice2', 'askPrice3',
+                 'askPrice4', 'askPrice5', 'bidVolume1', 'bidVolume2', 'bidVolume3',
+                 'bidVolume4', 'bidVolume5', 'askVolume1', 'askVolume2', 'askVolume3',
+                 'askVolume4', 'askVolume5')
+
+    fieldGetter = itemgetter(*__slots__)        # 按__slots__顺序从字典中取出数据
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.gatewayName = EMPTY_STRING         # Gateway名称
+        self.rawData = None                     # 原始数据
+        self.symbol = EMPTY_STRING              # 合约代码
+        self.exchange = EMPTY_STRING            # 交易所代码
+        self.vtSymbol = EMPTY_STRING            # 合约在vt系统中的唯一代码
+        self.lastPrice = EMPTY_FLOAT            # 最新成交价
+        self.lastVolume = EMPTY_INT             # 最新成交量
+        self.volume = EMPTY_INT                 # 今天总成交量
+        self.openInterest = EMPTY_INT           # 持仓量
+        self.time = EMPTY_STRING                # 时间 11:20:56.5
+        self.date = EMPTY_STRING                # 日期 20151009
+        self.datetime = None                    # python的datetime时间对象
+        self.openPrice = EMPTY_FLOAT            # 今日开盘价
+        self.highPrice = EMPTY_FLOAT            # 今日最高价
+        self.lowPrice = EMPTY_FLOAT             # 今日最低价
+        self.preClosePrice = EMPTY_FLOAT        # 昨收盘价
+        self.upperLimit = EMPTY_FLOAT           # 涨停价
+        self.lowerLimit = EMPTY_FLOAT           # 跌停价
+        self.bidPrice1 = EMPTY_FLOAT            # 五档行情
+        self.bidPrice2 = EMPTY_FLOAT
+        self.bidPrice3 = EMPTY_FLOAT
+        self.bidPrice4 = EMPTY_FLOAT
+        self.bidPrice5 = EMPTY_FLOAT
+        self.askPrice1 = EMPTY_FLOAT
+        self.askPrice2 = EMPTY_FLOAT
+        self.askPrice3 = EMPTY_FLOAT
+        self.askPrice4 = EMPTY_FLOAT
+        self.askPrice5 = EMPTY_FLOAT
+        self.bidVolume1 = EMPTY_INT
+        self.bidVolume2 = EMPTY_INT
+        self.bidVolume3 = EMPTY_INT
+        self.bidVolume4 = EMPTY_INT
+        self.bidVolume5 = EMPTY_INT
+        self.askVolume1 = EMPTY_INT
+        self.askVolume2 = EMPTY_INT
+        self.askVolume3 = EMPTY_INT
+        self.askVolume4 = EMPTY_INT
+        self.askVolume5 = EMPTY_INT
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromDict(cls, d):
+        """从字典创建（如数据库中读取的文档），字典中多余的键会被忽略"""
+        # 回测加载数据的热点路径，直接解包赋值，不再经过fromTuple的额外调用
+        obj = cls.__new__(cls)
+        
+        try:
+            (obj.gatewayName, obj.rawData, obj.symbol, obj.exchange, obj.vtSymbol,
+             obj.lastPrice, obj.lastVolume, obj.volume, obj.openInterest, obj.time,
+             obj.date, obj.datetime, obj.openPrice, obj.highPrice, obj.lowPrice,
+             obj.preClosePrice, obj.upperLimit, obj.lowerLimit, obj.bidPrice1,
+             obj.bidPrice2, obj.bidPrice3, obj.bidPrice4, obj.bidPrice5, obj.askPrice1,
+             obj.askPrice2, obj.askPrice3, obj.askPrice4, obj.askPrice5, obj.bidVolume1,
+             obj.bidVolume2, obj.bidVolume3, obj.bidVolume4, obj.bidVolume5,
+             obj.askVolume1, obj.askVolume2, obj.askVolume3, obj.askVolume4,
+             obj.askVolume5) = cls.fieldGetter(d)
+        # 字典中缺少部分字段时，缺少的字段使用默认值
+        except KeyError:
+            obj = cls()
+            obj.updateFromDict(d)
+        
+        return obj
+    
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromTuple(cls, t):
+        """从元组创建，元组中数据的顺序和__slots__保持一致"""
+        obj = cls.__new__(cls)
+        
+        (obj.gatewayName, obj.rawData, obj.symbol, obj.exchange, obj.vtSymbol,
+         obj.lastPrice, obj.lastVolume, obj.volume, obj.openInterest, obj.time,
+         obj.date, obj.datetime, obj.openPrice, obj.highPrice, obj.lowPrice,
+         obj.preClosePrice, obj.upperLimit, obj.lowerLimit, obj.bidPrice1,
+         obj.bidPrice2, obj.bidPrice3, obj.bidPrice4, obj.bidPrice5, obj.askPrice1,
+         obj.askPrice2, obj.askPrice3, obj.askPrice4, obj.askPrice5, obj.bidVolume1,
+         obj.bidVolume2, obj.bidVolume3, obj.bidVolume4, obj.bidVolume5,
+         obj.askVolume1, obj.askVolume2, obj.askVolume3, obj.askVolume4,
+         obj.askVolume5) = t
+        
+        return obj
+    
+    #----------------------------------------------------------------------
+    def toDict(self):
+        """转换为字典，用于数据库存储等"""
+        return {k: getattr(self, k) for k in self.__slots__}
+    
+    #----------------------------------------------------------------------
+    def toTuple(self):
+        """转换为元组，顺序和__slots__保持一致"""
+        return tuple([getattr(self, k) for k in self.__slots__])
+    
+    #----------------------------------------------------------------------
+    def updateFromDict(self, d):
+        """使用字典中的数据更新，字典中多余的键会被忽略"""
+        for k in self.__slots__:
+            if k in d:
+                setattr(self, k, d[k])
+    
+    # 兼容读写obj.__dict__的已有代码：读取时返回的是新生成的字典，对其修改不会影响对象，
+    # 给__dict__整体赋值时只更新已有字段；对象不支持添加__slots__之外的新属性
+    __dict__ = property(toDict, updateFromDict)
+    
+    #----------------------------------------------------------------------
+    def __getstate__(self):
+        """pickle和copy使用"""
+        return self.toTuple()
+    
+    #----------------------------------------------------------------------
+    def __setstate__(self, state):
+        """pickle和copy使用"""
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+
+########################################################################
+class VtCompactBarData(object):
+    """
+    紧凑型K线数据类，字段和VtBarData完全一致，说明参考VtCompactTickData
+    """
+    __slots__ = ('gatewayName', 'rawData', 'vtSymbol', 'symbol', 'exchange', 'open',
+                 'high', 'low', 'close', 'date', 'time', 'datetime', 'volume',
+                 'openInterest')
+
+    fieldGetter = itemgetter(*__slots__)        # 按__slots__顺序从字典中取出数据
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.gatewayName = EMPTY_STRING         # Gateway名称
+        self.rawData = None                     # 原始数据
+        self.vtSymbol = EMPTY_STRING            # vt系统代码
+        self.symbol = EMPTY_STRING              # 代码
+        self.exchange = EMPTY_STRING            # 交易所
+        self.open = EMPTY_FLOAT                 # OHLC
+        self.high = EMPTY_FLOAT
+        self.low = EMPTY_FLOAT
+        self.close = EMPTY_FLOAT
+        self.date = EMPTY_STRING                # bar开始的时间，日期
+        self.time = EMPTY_STRING                # 时间
+        self.datetime = None                    # python的datetime时间对象
+        self.volume = EMPTY_INT                 # 成交量
+        self.openInterest = EMPTY_INT           # 持仓量
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromDict(cls, d):
+        """从字典创建（如数据库中读取的文档），字典中多余的键会被忽略"""
+        # 回测加载数据的热点路径，直接解包赋值，不再经过fromTuple的额外调用
+        obj = cls.__new__(cls)
+        
+        try:
+            (obj.gatewayName, obj.rawData, obj.vtSymbol, obj.symbol, obj.exchange,
+             obj.open, obj.high, obj.low, obj.close, obj.date, obj.time, obj.datetime,
+             obj.volume, obj.openInterest) = cls.fieldGetter(d)
+        # 字典中缺少部分字段时，缺少的字段使用默认值
+        except KeyError:
+            obj = cls()
+            obj.updateFromDict(d)
+        
+        return obj
+    
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromTuple(cls, t):
+        """从元组创建，元组中数据的顺序和__slots__保持一致"""
+        obj = cls.__new__(cls)
+        
+        (obj.gatewayName, obj.rawData, obj.vtSymbol, obj.symbol, obj.exchange,
+         obj.open, obj.high, obj.low, obj.close, obj.date, obj.time, obj.datetime,
+         obj.volume, obj.openInterest) = t
+        
+        return obj
+    
+    #----------------------------------------------------------------------
+    def toDict(self):
+        """转换为字典，用于数据库存储等"""
+        return {k: getattr(self, k) for k in self.__slots__}
+    
+    #----------------------------------------------------------------------
+    def toTuple(self):
+        """转换为元组，顺序和__slots__保持一致"""
+        return tuple([getattr(self, k) for k in self.__slots__])
+    
+    #----------------------------------------------------------------------
+    def updateFromDict(self, d):
+        """使用字典中的数据更新，字典中多余的键会被忽略"""
+        for k in self.__slots__:
+            if k in d:
+                setattr(self, k, d[k])
+    
+    # 兼容读写obj.__dict__的已有代码：读取时返回的是新生成的字典，对其修改不会影响对象，
+    # 给__dict__整体赋值时只更新已有字段；对象不支持添加__slots__之外的新属性
+    __dict__ = property(toDict, updateFromDict)
+    
+    #----------------------------------------------------------------------
+    def __getstate__(self):
+        """pickle和copy使用"""
+        return self.toTuple()
+    
+    #----------------------------------------------------------------------
+    def __setstate__(self, state):
+        """pickle和copy使用"""
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
 ########################################################################
 class VtTradeData(VtBaseData):
     """成交数据类"""
@@ -309,6 +544,9 @@ class VtOrderReq(object):
         self.lastTradeDateOrContractMonth = EMPTY_STRING   # 合约月,IB专用
         self.multiplier = EMPTY_STRING                     # 乘数,IB专用
         
+        # 以下为风控相关
+        self.strategyName = EMPTY_UNICODE       # 发出委托的策略名称，用于单策略风控
+        
 
 ########################################################################
 class VtCancelOrderReq(object):